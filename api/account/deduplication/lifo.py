@@ -1,115 +1,102 @@
-import copy
-from typing import Tuple
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
 
 import api_logging as logging
 from account.models import Community
-from django.conf import settings
-from django.db import IntegrityError
-from registry.models import Event, HashScorerLink, Stamp
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from registry.hash_filter import aadd_hashes
+from registry.models import Event, HashScorerLink
 from registry.utils import get_utc_time
 
 log = logging.getLogger(__name__)
 
 
-class HashScorerLinkIntegrityError(Exception):
-    def __init__(self, message):
-        self.message = message or "Issue saving hash scorer links"
-        super().__init__(self.message)
+def claim_hash_links(
+    community: Community, address: str, expires_at_by_hash: Dict[str, datetime]
+) -> Set[str]:
+    """
+    Claim the hashes in the community for the address, and return the hashes that
+    have been claimed.
+
+    A hash is claimed if it is not linked yet, if it is already linked to the
+    address (the expiration is then updated), or if the link of another address has
+    expired. Hashes linked to another address that has not expired are not claimed.
+
+    This is done in a single `INSERT ... ON CONFLICT DO UPDATE ... RETURNING`
+    statement, so that concurrent requests claiming the same hashes are resolved
+    atomically by the DB: exactly one of them claims each hash.
+    """
+    if not expires_at_by_hash:
+        return set()
+
+    meta = HashScorerLink._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    hash_column = qn(meta.get_field("hash").column)
+    community_column = qn(meta.get_field("community").column)
+    address_column = qn(meta.get_field("address").column)
+    expires_at_field = meta.get_field("expires_at")
+    expires_at_column = qn(expires_at_field.column)
+
+    params = []
+    # The rows are locked in the order of the VALUES: sorted, so that concurrent
+    # claims of the same hashes cannot deadlock
+    for hash in sorted(expires_at_by_hash):
+        params += [
+            hash,
+            community.pk,
+            address,
+            expires_at_field.get_db_prep_value(expires_at_by_hash[hash], connection),
+        ]
+    params.append(expires_at_field.get_db_prep_value(get_utc_time(), connection))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({hash_column}, {community_column}, {address_column}, {expires_at_column})
+            VALUES {", ".join(["(%s, %s, %s, %s)"] * len(expires_at_by_hash))}
+            ON CONFLICT ({hash_column}, {community_column}) DO UPDATE
+            SET
+                {address_column} = EXCLUDED.{address_column},
+                {expires_at_column} = EXCLUDED.{expires_at_column}
+            WHERE
+                {table}.{address_column} = EXCLUDED.{address_column}
+                OR {table}.{expires_at_column} <= %s
+            RETURNING {hash_column}
+            """,
+            params,
+        )
+        return {hash for (hash,) in cursor.fetchall()}
+
+
+aclaim_hash_links = sync_to_async(claim_hash_links)
 
 
 async def alifo(
     community: Community, lifo_passport: dict, address: str
 ) -> Tuple[dict, list | None]:
-    tries_remaining = 5
-    while True:
-        try:
-            return await arun_lifo_dedup(community, lifo_passport, address)
-        except HashScorerLinkIntegrityError:
-            tries_remaining -= 1
-            # If we get integrity errors from trying to create
-            # unique hash links, then we had 2 competing requests
-            # and the other one won, so we'll just try again
-            # and there should be additional deduplication
-            if tries_remaining <= 0:
-                raise
-
-
-async def arun_lifo_dedup(
-    community: Community, lifo_passport: dict, address: str
-) -> Tuple[dict, list | None]:
-    deduped_passport = copy.deepcopy(lifo_passport)
-    deduped_passport["stamps"] = []
+    # The stamps are shared with the input, not copied (see `avalidate_credentials`)
+    deduped_passport = {**lifo_passport, "stamps": []}
 
-    now = get_utc_time()
     if "stamps" in lifo_passport:
-        stamp_hashes = [
-            stamp["credential"]["credentialSubject"]["hash"]
-            for stamp in lifo_passport["stamps"]
-        ]
-
-        existing_hash_links = HashScorerLink.objects.filter(
-            hash__in=stamp_hashes, community=community
-        )
-
-        this_users_hash_links, clashing_hashes, forfeited_hash_links = [], [], []
-        async for hash_link in existing_hash_links:
-            if hash_link.address == address:
-                # Already claimed by this user,
-                this_users_hash_links.append(hash_link)
-            elif hash_link.expires_at > now:
-                # Already claimed by another user,
-                clashing_hashes.append(hash_link.hash)
-            else:
-                # Already claimed by another user, but
-                # it's expired so we'll give it to this user
-                forfeited_hash_links.append(hash_link)
+        expires_at_by_hash: Dict[str, datetime] = {}
+        for stamp in lifo_passport["stamps"]:
+            expires_at_by_hash[stamp["credential"]["credentialSubject"]["hash"]] = (
+                parse_datetime(stamp["credential"]["expirationDate"])
+            )
 
-        hash_links_to_create = []
-        hash_links_to_update = []
-        clashing_stamps = []
+        claimed_hashes = await aclaim_hash_links(community, address, expires_at_by_hash)
+        await aadd_hashes(community.pk, claimed_hashes)
 
+        clashing_stamps: List[dict] = []
         for stamp in lifo_passport["stamps"]:
-            hash = stamp["credential"]["credentialSubject"]["hash"]
-            expires_at = stamp["credential"]["expirationDate"]
-
-            if hash not in clashing_hashes:
-                deduped_passport["stamps"].append(copy.deepcopy(stamp))
-
-                done = False
-
-                for hash_link in this_users_hash_links:
-                    if hash_link.hash == hash:
-                        done = True
-                        if hash_link.expires_at != expires_at:
-                            hash_link.expires_at = expires_at
-                            hash_links_to_update.append(hash_link)
-                        break
-
-                if not done:
-                    for hash_link in forfeited_hash_links:
-                        if hash_link.hash == hash:
-                            done = True
-                            hash_link.address = address
-                            hash_link.expires_at = expires_at
-                            hash_links_to_update.append(hash_link)
-                            break
-
-                if not done:
-                    hash_links_to_create.append(
-                        HashScorerLink(
-                            hash=hash,
-                            address=address,
-                            community=community,
-                            expires_at=stamp["credential"]["expirationDate"],
-                        )
-                    )
+            if stamp["credential"]["credentialSubject"]["hash"] in claimed_hashes:
+                deduped_passport["stamps"].append(stamp)
             else:
                 clashing_stamps.append(stamp)
 
-        await save_hash_links(
-            hash_links_to_create, hash_links_to_update, address, community
-        )
-
         if clashing_stamps:
             await Event.objects.abulk_create(
                 [
@@ -130,35 +117,3 @@ async def arun_lifo_dedup(
             )
 
     return (deduped_passport, None)
-
-
-async def save_hash_links(
-    hash_links_to_create: list[HashScorerLink],
-    hash_links_to_update: list[HashScorerLink],
-    address: str,
-    community: Community,
-):
-    if hash_links_to_create or hash_links_to_update:
-        try:
-            # Could have IntegrityError if there are conflicting requests
-            # running concurrently
-            if hash_links_to_create:
-                await HashScorerLink.objects.abulk_create(hash_links_to_create)
-
-            if hash_links_to_update:
-                await HashScorerLink.objects.abulk_update(
-                    hash_links_to_update, fields=["expires_at", "address"]
-                )
-        except IntegrityError:
-            raise HashScorerLinkIntegrityError("Failed to save HashScorerLinks")
-
-        # After updating, double check that there was not a conflicting
-        # request that tried to update the same object
-        updated_hashes = [hash_link.hash for hash_link in hash_links_to_update]
-        created_hashes = [hash_link.hash for hash_link in hash_links_to_create]
-        if await HashScorerLink.objects.filter(
-            address=address,
-            community=community,
-            hash__in=(updated_hashes + created_hashes),
-        ).acount() != len(hash_links_to_update) + len(hash_links_to_create):
-            raise HashScorerLinkIntegrityError("Unexpected number of HashScorerLinks")
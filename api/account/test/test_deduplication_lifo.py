@@ -1,14 +1,19 @@
-from unittest import mock
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest import skipUnless
 
 from account.deduplication import Rules
-from account.deduplication.lifo import HashScorerLinkIntegrityError, alifo
+from account.deduplication.lifo import alifo
 from account.models import Account, Community
 from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection, connections
 from django.test import TransactionTestCase
+from django.utils.dateparse import parse_datetime
 from ninja_jwt.schema import RefreshToken
-from registry.models import HashScorerLink, Passport, Stamp
+from registry.models import Event, HashScorerLink, Passport, Stamp
 from scorer_weighted.models import Scorer, WeightedScorer
 
 User = get_user_model()
@@ -165,34 +170,116 @@ class LifoDeduplicationTestCase(TransactionTestCase):
         # no stamps
         self.assertEqual(len(deduped_passport["stamps"]), 0)
 
-    def test_retry_on_clash(self):
+    def test_duplicate_stamps_in_payload(self):
         """
-        This tests functionality that causes the deduplication method to retry
-        when there is a collision with another deduplication happening at the
-        same time. It's not possible to test this directly, so instead we're
-        sending in a payload with two stamps with the same credential, which
-        wouldn't make it past the previous validation step in the real flow.
+        Two stamps with the same hash (which wouldn't make it past the validation
+        in the real flow) result in a single hash link, and are both kept
         """
-
         passport = Passport.objects.create(
             address="0xaddress_1", community=self.community1
         )
 
-        call_count = 0
+        deduped_passport, _ = async_to_sync(alifo)(
+            passport.community, {"stamps": [credential, credential]}, passport.address
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 2)
+        self.assertEqual(
+            list(HashScorerLink.objects.values_list("hash", "address")),
+            [("test_hash", passport.address)],
+        )
+
+    def test_expired_hash_link_is_claimed(self):
+        HashScorerLink.objects.create(
+            hash="test_hash",
+            address="0xaddress_2",
+            community=self.community1,
+            expires_at=datetime.now(timezone.utc) - timedelta(days=1),
+        )
+
+        deduped_passport, _ = async_to_sync(alifo)(
+            self.community1, {"stamps": [credential]}, "0xaddress_1"
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 1)
+        link = HashScorerLink.objects.get(hash="test_hash")
+        self.assertEqual(link.address, "0xaddress_1")
+        self.assertEqual(link.expires_at, parse_datetime("2099-02-21T15:30:51.720Z"))
+
+    @skipUnless(
+        connection.vendor == "postgresql",
+        "SQLite serializes the writes of the connections",
+    )
+    def test_concurrent_claims_of_overlapping_hashes(self):
+        """
+        Many concurrent deduplications (in threads, each with its own DB connection)
+        of passports sharing stamps: each hash is claimed by exactly one address, and
+        the stamps of that hash are only kept in the passport of that address
+        """
+        num_addresses = 25
+        num_hashes = 40
+        rng = random.Random(42)
+        # Some of the hashes are already claimed, but the claims have expired
+        for idx in range(0, num_hashes, 4):
+            HashScorerLink.objects.create(
+                hash=f"hash_{idx}",
+                address="0xexpired",
+                community=self.community1,
+                expires_at=datetime.now(timezone.utc) - timedelta(days=1),
+            )
+
+        passports = {
+            f"0xaddress_{a}": {
+                "stamps": [
+                    {
+                        "credential": {
+                            "credentialSubject": {
+                                "hash": f"hash_{idx}",
+                                "provider": f"provider_{idx}",
+                            },
+                            "expirationDate": "2099-02-21T15:30:51.720Z",
+                        }
+                    }
+                    for idx in rng.sample(range(num_hashes), 15)
+                ]
+            }
+            for a in range(num_addresses)
+        }
 
-        def increment_call_count(*args, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            return HashScorerLink.objects.none()
+        def run(address):
+            try:
+                return async_to_sync(alifo)(
+                    self.community1, passports[address], address
+                )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=num_addresses) as executor:
+            results = list(executor.map(run, passports))
+
+        kept_by = {}
+        for address, (deduped_passport, _) in zip(passports, results):
+            for stamp in deduped_passport["stamps"]:
+                hash = stamp["credential"]["credentialSubject"]["hash"]
+                self.assertNotIn(hash, kept_by)
+                kept_by[hash] = address
 
-        with mock.patch(
-            "account.deduplication.lifo.HashScorerLink.objects.filter",
-            side_effect=increment_call_count,
-        ):
-            with self.assertRaises(HashScorerLinkIntegrityError):
-                async_to_sync(alifo)(
-                    passport.community,
-                    {"stamps": [credential, credential]},
-                    passport.address,
+        submitted_hashes = {
+            stamp["credential"]["credentialSubject"]["hash"]
+            for passport in passports.values()
+            for stamp in passport["stamps"]
+        }
+        self.assertEqual(set(kept_by), submitted_hashes)
+        self.assertEqual(
+            dict(
+                HashScorerLink.objects.filter(hash__in=submitted_hashes).values_list(
+                    "hash", "address"
                 )
-        self.assertEqual(call_count, 5)
+            ),
+            kept_by,
+        )
+        self.assertEqual(
+            Event.objects.filter(action=Event.Action.LIFO_DEDUPLICATION).count(),
+            sum(len(passport["stamps"]) for passport in passports.values())
+            - len(kept_by),
+        )
@@ -6,6 +6,8 @@ isort:skip_file
 
 from sys import stdout
 
+import boto3
+
 # needs to be imported before django models
 from aws_lambdas.utils import (
     format_response,
@@ -13,16 +15,59 @@ from aws_lambdas.utils import (
 )
 
 from account.models import Community
-from registry.management.commands.recalculate_scores import recalculate_scores
+from django.conf import settings
+from registry.management.commands.recalculate_scores import (
+    recalculate_scores,
+    rescore_range,
+)
+
+RESCORE_RANGE_MESSAGE_TYPE = "rescore_range"
+
+
+def send_rescore_range_messages(range_ids):
+    """
+    Send one message per range to the rescore queue, so that the ranges are
+    rescored in parallel by separate invocations of this handler
+    """
+    sqs = boto3.client("sqs", region_name="us-west-2")
+    # SQS accepts at most 10 messages per batch
+    for idx in range(0, len(range_ids), 10):
+        sqs.send_message_batch(
+            QueueUrl=settings.RESCORE_QUEUE_URL,
+            Entries=[
+                {
+                    "Id": str(range_id),
+                    "MessageBody": str(range_id),
+                    "MessageAttributes": {
+                        "type": {
+                            "DataType": "String",
+                            "StringValue": RESCORE_RANGE_MESSAGE_TYPE,
+                        },
+                    },
+                }
+                for range_id in range_ids[idx : idx + 10]
+            ],
+        )
+
+
+def get_message_type(message):
+    return message.get("messageAttributes", {}).get("type", {}).get("stringValue")
 
 
 @with_request_exception_handling
 def handler(event, _context):
     """
-    Handler for rescore messages from an SQS trigger
+    Handler for rescore messages from an SQS trigger. A "rescore" message holds
+    the ids of the communities to rescore, which are split into ranges that are
+    sent back to the queue as "rescore_range" messages (if the queue is configured).
     """
 
     for message in event["Records"]:
+        if get_message_type(message) == RESCORE_RANGE_MESSAGE_TYPE:
+            for range_id in message["body"].split(","):
+                rescore_range(int(range_id), batch_size=1000)
+            continue
+
         community_ids = message["body"].split(",")
         communities = Community.objects.filter(id__in=community_ids)
 
@@ -30,6 +75,9 @@ def handler(event, _context):
             communities,
             batch_size=1000,
             outstream=stdout,
+            dispatch_ranges=(
+                send_rescore_range_messages if settings.RESCORE_QUEUE_URL else None
+            ),
         )
 
     return format_response({"status": "success"})
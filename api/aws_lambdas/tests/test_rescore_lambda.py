@@ -2,6 +2,8 @@ import json
 
 import pytest
 from aws_lambdas.scorer_api_passport.tests.helpers import MockContext
+from registry.models import Passport, Score
+from scorer_weighted.models import RescoreRange, RescoreRequest
 
 from ..rescore import handler
 
@@ -66,3 +68,32 @@ def test_successful_processing(
     assert recalc_mock.call_args_list[0][0][0].count() == len(community_ids)
     assert recalc_mock.call_args_list[0][0][0][0].id in community_ids
     assert recalc_mock.call_args_list[0][0][0][1].id in community_ids
+
+
+def test_rescore_range_messages(scorer_community, mocker, settings):
+    """
+    Tests that the ranges are sent back to the queue, and that the range
+    messages are rescored
+    """
+    settings.RESCORE_QUEUE_URL = "https://sqs/rescore"
+    Passport.objects.create(address="0x1", community=scorer_community)
+    sqs = mocker.patch("aws_lambdas.rescore.boto3.client").return_value
+
+    handler(make_test_event([scorer_community.id]), MockContext())
+
+    rescore_request = RescoreRequest.objects.get()
+    rescore_range = rescore_request.ranges.get()
+    assert rescore_range.status == RescoreRange.Status.PENDING
+    entries = sqs.send_message_batch.call_args.kwargs["Entries"]
+    assert [entry["MessageBody"] for entry in entries] == [str(rescore_range.id)]
+
+    range_event = make_test_event([rescore_range.id])
+    range_event["Records"][0]["messageAttributes"]["type"]["stringValue"] = entries[0][
+        "MessageAttributes"
+    ]["type"]["StringValue"]
+    response = handler(range_event, MockContext())
+
+    assert json.loads(response["body"])["status"] == "success"
+    rescore_request.refresh_from_db()
+    assert rescore_request.status == RescoreRequest.Status.SUCCESS
+    assert Score.objects.get().status == Score.Status.DONE
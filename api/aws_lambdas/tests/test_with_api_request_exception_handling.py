@@ -1,6 +1,8 @@
 import json
 
 import pytest
+from django.test import override_settings
+from registry.instrumentation import stage
 from registry.test.test_passport_submission import mock_passport
 
 from aws_lambdas.exceptions import InvalidRequest
@@ -8,7 +10,7 @@ from aws_lambdas.scorer_api_passport.tests.helpers import MockContext
 from aws_lambdas.submit_passport.tests.test_submit_passport_lambda import (
     make_test_event,
 )
-from aws_lambdas.utils import with_api_request_exception_handling
+from aws_lambdas.utils import RESPONSE_HEADERS, with_api_request_exception_handling
 
 pytestmark = pytest.mark.django_db
 
@@ -17,6 +19,11 @@ def func_to_test(*args, **kwargs):
     return {"greet": "hello world"}
 
 
+def func_to_test_with_stage(*args, **kwargs):
+    with stage("greeting"):
+        return {"greet": "hello world"}
+
+
 def func_to_test_bad_request(*args, **kwargs):
     raise InvalidRequest("bad request")
 
@@ -151,3 +158,24 @@ def test_with_api_request_exception_handling_bad_event(
 
             assert ret["statusCode"] == 500
             assert ret["body"] == '{"error": "An error has occurred"}'
+
+
+@override_settings(FF_STAGE_TIMING="on")
+def test_with_api_request_exception_handling_server_timing(
+    scorer_api_key,
+    scorer_community_with_binary_scorer,
+    passport_holder_addresses,
+):
+    wrapped_func = with_api_request_exception_handling(func_to_test_with_stage)
+
+    address = passport_holder_addresses[0]["address"].lower()
+    test_event = make_test_event(
+        scorer_api_key, address, scorer_community_with_binary_scorer.id
+    )
+
+    ret = wrapped_func(test_event, MockContext())
+
+    assert ret["statusCode"] == 200
+    assert ret["headers"]["Server-Timing"].startswith("greeting;dur=")
+    # The shared response headers are not modified
+    assert "Server-Timing" not in RESPONSE_HEADERS
@@ -89,6 +89,11 @@ from registry.exceptions import (  # noqa: E402
     NotFoundApiException,
     Unauthorized,
 )
+from registry.instrumentation import (  # noqa: E402
+    SERVER_TIMING_HEADER,
+    collect_timings,
+    get_server_timing_header,
+)
 
 RESPONSE_HEADERS = {
     "Content-Type": "application/json",
@@ -143,6 +148,14 @@ def format_response(ret: Any):
     }
 
 
+def add_server_timing_header(response: dict, timings) -> dict:
+    """Return the timings of the stages run by the handler in `Server-Timing`"""
+    header = get_server_timing_header(timings)
+    if header:
+        response["headers"] = {**response["headers"], SERVER_TIMING_HEADER: header}
+    return response
+
+
 def with_request_exception_handling(func):
     @wraps(func)
     def wrapper(event, context, *args):
@@ -151,7 +164,9 @@ def with_request_exception_handling(func):
 
             logger.info("Received event: %s", event)
 
-            return func(event, context, *args)
+            with collect_timings() as timings:
+                response = func(event, context, *args)
+            return add_server_timing_header(response, timings)
         except Exception as e:
             if isinstance(e, APIException):
                 status = e.status_code
@@ -235,9 +250,9 @@ def with_api_request_exception_handling(func):
             # Parse the body and call the function
             body = parse_body(event)
 
-            response = format_response(
-                func(event, context, request, user_account, body)
-            )
+            with collect_timings() as timings:
+                ret = func(event, context, request, user_account, body)
+            response = add_server_timing_header(format_response(ret), timings)
         except Exception as e:
             error_msg = str(e)
 
@@ -52,6 +52,7 @@ from ..exceptions import (
 )
 from ..models import CeramicCache
 from ..utils import validate_dag_jws_payload
+from ..verification import verify_stamps_on_write
 from .schema import (
     AccessTokenResponse,
     CacaoVerifySubmit,
@@ -173,6 +174,7 @@ def handle_add_stamps(
     ]
 
     CeramicCache.objects.bulk_create(new_stamp_objects)
+    verify_stamps_on_write(new_stamp_objects)
 
     updated_passport_state = CeramicCache.objects.filter(
         address=address, type=CeramicCache.StampType.V1, deleted_at__isnull=True
@@ -247,6 +249,7 @@ def handle_patch_stamps(
 
     if new_stamp_objects:
         CeramicCache.objects.bulk_create(new_stamp_objects)
+        verify_stamps_on_write(new_stamp_objects)
 
     updated_passport_state = CeramicCache.objects.filter(
         address=address, type=CeramicCache.StampType.V1, deleted_at__isnull=True
@@ -263,7 +266,11 @@ def handle_patch_stamps(
             )
             for stamp in updated_passport_state
         ],
-        score=get_detailed_score_response_for_address(address),
+        # Only the stamps of the patched providers have changed, this allows
+        # updating the score incrementally
+        score=get_detailed_score_response_for_address(
+            address, changed_providers=providers_to_delete
+        ),
     )
 
 
@@ -601,7 +608,9 @@ def handle_authenticate(payload: CacaoVerifySubmit) -> AccessTokenResponse:
 
 
 def get_detailed_score_response_for_address(
-    address: str, alternate_scorer_id: Optional[int] = None
+    address: str,
+    alternate_scorer_id: Optional[int] = None,
+    changed_providers: Optional[List[str]] = None,
 ) -> DetailedScoreResponse:
     scorer_id = alternate_scorer_id or settings.CERAMIC_CACHE_SCORER_ID
     if not scorer_id:
@@ -614,7 +623,9 @@ def get_detailed_score_response_for_address(
         scorer_id=scorer_id,
     )
 
-    score = async_to_sync(ahandle_submit_passport)(submit_passport_payload, account)
+    score = async_to_sync(ahandle_submit_passport)(
+        submit_passport_payload, account, changed_providers
+    )
 
     return score
 
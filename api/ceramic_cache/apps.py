@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CeramicCacheConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ceramic_cache"
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import signals
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ceramic_cache", "0024_alter_revocation_proof_value"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ceramiccache",
+            name="verification_status",
+            field=models.CharField(
+                blank=True,
+                choices=[("valid", "Valid"), ("invalid", "Invalid")],
+                default="",
+                help_text="Result of verifying the credential when it was written (see `ceramic_cache.verification`). Empty if it has not been verified.",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="ceramiccache",
+            name="verified_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="This is the timestamp that the credential was verified",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="ceramiccache",
+            name="verified_issuers",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Digest of the TRUSTED_IAM_ISSUERS the issuer of the credential was checked against. The credential needs to be verified again if this does not match the current setting.",
+                max_length=64,
+            ),
+        ),
+    ]
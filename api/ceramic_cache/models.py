@@ -18,6 +18,10 @@ class CeramicCache(models.Model):
         SAVED = "saved"
         FAILED = "failed"
 
+    class VerificationStatus(models.TextChoices):
+        VALID = "valid"
+        INVALID = "invalid"
+
     address = EthAddressField(null=True, blank=False, max_length=100, db_index=True)
     provider = models.CharField(
         null=False, blank=False, default="", max_length=256, db_index=True
@@ -78,6 +82,35 @@ class CeramicCache(models.Model):
         null=True, db_index=True
     )  # stamp['expirationDate']
 
+    verification_status = models.CharField(
+        max_length=10,
+        choices=VerificationStatus.choices,
+        default="",
+        blank=True,
+        help_text="Result of verifying the credential when it was written (see `ceramic_cache.verification`). Empty if it has not been verified.",
+    )
+    verified_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="This is the timestamp that the credential was verified",
+    )
+    verified_issuers = models.CharField(
+        max_length=64,
+        default="",
+        blank=True,
+        help_text="Digest of the TRUSTED_IAM_ISSUERS the issuer of the credential was checked against. The credential needs to be verified again if this does not match the current setting.",
+    )
+
+    def is_verified(self, issuers_version: str) -> bool:
+        """
+        Check if the credential has been successfully verified, against the trusted
+        issuers with the given version (see `ceramic_cache.utils.trusted_issuers_version`)
+        """
+        return (
+            self.verification_status == CeramicCache.VerificationStatus.VALID
+            and self.verified_issuers == issuers_version
+        )
+
     class Meta:
         unique_together = ["type", "address", "provider", "deleted_at"]
 
@@ -0,0 +1,19 @@
+"""
+Purge the revoked credentials from the verified credential cache
+(see `registry.verification_cache`).
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from reader.passport_reader import get_did
+from registry.verification_cache import forget_verified_credential
+
+from .models import Revocation
+
+
+@receiver(post_save, sender=Revocation)
+def credential_revoked(sender, instance, created, **kwargs):
+    if created:
+        forget_verified_credential(
+            get_did(instance.ceramic_cache.address), instance.proof_value
+        )
@@ -0,0 +1,13 @@
+from asgiref.sync import async_to_sync
+from celery import shared_task
+
+from .models import CeramicCache
+from .verification import averify_stamps
+
+
+@shared_task
+def verify_stamps(stamp_ids):
+    stamps = list(
+        CeramicCache.objects.filter(pk__in=stamp_ids, deleted_at__isnull=True)
+    )
+    async_to_sync(averify_stamps)(stamps)
@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from django.conf import settings as django_settings
+from django.test import Client, override_settings
+
+from ceramic_cache.models import CeramicCache
+from reader.passport_reader import get_passport
+
+pytestmark = pytest.mark.django_db
+
+client = Client()
+
+
+def make_stamp(address, provider, trusted=True):
+    return {
+        "provider": provider,
+        "stamp": {
+            "issuer": (
+                django_settings.TRUSTED_IAM_ISSUERS[0] if trusted else "did:key:x"
+            ),
+            "expirationDate": (
+                datetime.now(timezone.utc) + timedelta(days=30)
+            ).isoformat(),
+            "credentialSubject": {
+                "id": f"did:pkh:eip155:1:{address.lower()}",
+                "hash": f"0x{provider}",
+                "provider": provider,
+            },
+            "proof": {"proofValue": f"proof-{provider}"},
+        },
+    }
+
+
+class TestVerifyOnWrite:
+    def add_stamps(self, sample_address, sample_token):
+        return client.post(
+            "/ceramic-cache/stamps/bulk",
+            json.dumps(
+                [
+                    make_stamp(sample_address, "Google"),
+                    make_stamp(sample_address, "Ens", trusted=False),
+                ]
+            ),
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": f"Bearer {sample_token}"},
+        )
+
+    @override_settings(FF_CERAMIC_CACHE_VERIFY_ON_WRITE="inline")
+    def test_stamps_are_verified_inline(self, sample_address, sample_token, ui_scorer):
+        with patch(
+            "ceramic_cache.verification.validate_credential", return_value=[]
+        ) as mock_verify_on_write, patch(
+            "registry.atasks.validate_credential", return_value=[]
+        ) as mock_verify_on_score:
+            response = self.add_stamps(sample_address, sample_token)
+
+        assert response.status_code == 201
+        # The untrusted stamp is not verified with didkit
+        assert mock_verify_on_write.call_count == 1
+        # The stamp verified on write is not verified again when scoring
+        assert mock_verify_on_score.call_count == 0
+
+        google = CeramicCache.objects.get(provider="Google", deleted_at__isnull=True)
+        ens = CeramicCache.objects.get(provider="Ens", deleted_at__isnull=True)
+        assert google.verification_status == CeramicCache.VerificationStatus.VALID
+        assert google.verified_at is not None
+        assert ens.verification_status == CeramicCache.VerificationStatus.INVALID
+
+        verified = {
+            stamp["provider"]: stamp["verified"]
+            for stamp in get_passport(sample_address.lower())["stamps"]
+        }
+        assert verified == {"Google": True, "Ens": False}
+
+    @override_settings(FF_CERAMIC_CACHE_VERIFY_ON_WRITE="inline")
+    def test_stamps_are_verified_again_when_trusted_issuers_change(
+        self, sample_address, sample_token, ui_scorer
+    ):
+        with patch("ceramic_cache.verification.validate_credential", return_value=[]):
+            self.add_stamps(sample_address, sample_token)
+
+        with override_settings(
+            TRUSTED_IAM_ISSUERS=django_settings.TRUSTED_IAM_ISSUERS + ["did:key:x"]
+        ):
+            assert not any(
+                stamp["verified"]
+                for stamp in get_passport(sample_address.lower())["stamps"]
+            )
+
+    @override_settings(FF_CERAMIC_CACHE_VERIFY_ON_WRITE="background")
+    def test_stamps_are_verified_in_background(
+        self, sample_address, sample_token, ui_scorer
+    ):
+        with patch("ceramic_cache.tasks.verify_stamps.delay") as mock_delay:
+            self.add_stamps(sample_address, sample_token)
+
+        stamp_ids = list(
+            CeramicCache.objects.filter(deleted_at__isnull=True).values_list(
+                "pk", flat=True
+            )
+        )
+        assert sorted(mock_delay.call_args.args[0]) == sorted(stamp_ids)
+
+    def test_stamps_are_not_verified_by_default(
+        self, sample_address, sample_token, ui_scorer
+    ):
+        with patch(
+            "ceramic_cache.verification.validate_credential", return_value=[]
+        ) as mock_verify_on_write:
+            self.add_stamps(sample_address, sample_token)
+
+        assert mock_verify_on_write.call_count == 0
+        assert not CeramicCache.objects.exclude(verification_status="").exists()
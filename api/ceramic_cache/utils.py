@@ -5,6 +5,7 @@ from hashlib import sha256
 import api_logging as logging
 import dag_cbor
 import uvarint
+from django.conf import settings
 from ecdsa import NIST256p, VerifyingKey
 from jose import jwk, jws
 from multibase import decode
@@ -19,6 +20,13 @@ def get_utc_time():
     return datetime.now(timezone.utc)
 
 
+def trusted_issuers_version() -> str:
+    """Digest of the TRUSTED_IAM_ISSUERS setting"""
+    return sha256(
+        json.dumps(sorted(settings.TRUSTED_IAM_ISSUERS)).encode("utf-8")
+    ).hexdigest()
+
+
 def validate_dag_jws_payload(payload: dict, payload_cid_str: str) -> bool:
     """
     payload_cid_str is a base65url encoded cid of the dagCBor encoded payload
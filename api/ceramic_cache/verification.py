@@ -0,0 +1,86 @@
+"""
+Verify the stamps when they are written to the ceramic cache.
+
+By default the stamps are only verified when a passport is scored, which happens
+for every scoring request and every community scoring the address. With the
+`FF_CERAMIC_CACHE_VERIFY_ON_WRITE` flag the stamps are verified once when they
+are written, either inline or in a celery task, and the result is stored on the
+`CeramicCache` record. `aget_passport` flags the stamps that have been verified,
+and `avalidate_credentials` does not verify these again.
+
+The issuer is checked against `TRUSTED_IAM_ISSUERS`, so the digest of the setting
+is stored with the result: if the setting changes, the stamp is not considered
+verified anymore and is verified again at scoring time.
+"""
+
+import asyncio
+from typing import List
+
+import api_logging as logging
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from reader.passport_reader import get_did
+from registry.utils import get_utc_time, validate_credential, verify_issuer
+
+from .models import CeramicCache
+from .utils import trusted_issuers_version
+
+log = logging.getLogger(__name__)
+
+
+async def averify_stamps(stamps: List[CeramicCache]):
+    """Verify the credentials of the stamps and store the result"""
+    issuers_version = trusted_issuers_version()
+    semaphore = asyncio.Semaphore(settings.CREDENTIAL_VERIFICATION_CONCURRENCY)
+
+    async def averify_stamp(stamp: CeramicCache):
+        errors = []
+        if verify_issuer({"credential": stamp.stamp}):
+            async with semaphore:
+                try:
+                    errors = await validate_credential(
+                        get_did(stamp.address), stamp.stamp
+                    )
+                except Exception:
+                    log.error("Failed to verify stamp id=%s", stamp.pk, exc_info=True)
+                    # Leave the stamp unverified, it will be verified when scoring
+                    return
+        else:
+            errors = ["Issuer is not trusted"]
+
+        if errors:
+            log.info("Stamp id=%s failed verification: %s", stamp.pk, errors)
+
+        stamp.verification_status = (
+            CeramicCache.VerificationStatus.INVALID
+            if errors
+            else CeramicCache.VerificationStatus.VALID
+        )
+        stamp.verified_at = get_utc_time()
+        stamp.verified_issuers = issuers_version
+
+    await asyncio.gather(*[averify_stamp(stamp) for stamp in stamps])
+    await CeramicCache.objects.abulk_update(
+        [stamp for stamp in stamps if stamp.verified_at is not None],
+        ["verification_status", "verified_at", "verified_issuers"],
+    )
+
+
+def verify_stamps_on_write(stamps: List[CeramicCache]):
+    """
+    Verify the newly written stamps, according to the `FF_CERAMIC_CACHE_VERIFY_ON_WRITE`
+    flag: "inline", "background" (in a celery task) or "off"
+    """
+    mode = settings.FF_CERAMIC_CACHE_VERIFY_ON_WRITE
+    if not stamps or mode == "off":
+        return
+
+    if mode == "inline":
+        async_to_sync(averify_stamps)(stamps)
+    elif mode == "background":
+        # pylint: disable=import-outside-toplevel
+        from .tasks import verify_stamps
+
+        verify_stamps.delay([stamp.pk for stamp in stamps])
+    else:
+        log.error("Invalid FF_CERAMIC_CACHE_VERIFY_ON_WRITE value: '%s'", mode)
@@ -1,10 +1,11 @@
 # libs for processing the deterministic stream location
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from asgiref.sync import async_to_sync
 
 import api_logging as logging
 from ceramic_cache.models import CeramicCache
+from ceramic_cache.utils import trusted_issuers_version
 
 log = logging.getLogger(__name__)
 
@@ -20,10 +21,14 @@ def get_did(address, network="1"):
     return (f"did:pkh:eip155:{network}:{address}").lower()
 
 
-async def aget_passport(address: str = "") -> Dict:
+async def aget_passport(
+    address: str = "", providers: Optional[List[str]] = None
+) -> Dict:
     db_stamp_list = CeramicCache.objects.filter(
         address=address, deleted_at__isnull=True, revocation__isnull=True
     )
+    if providers is not None:
+        db_stamp_list = db_stamp_list.filter(provider__in=providers)
 
     stamps_by_provider = dict()
 
@@ -45,9 +50,17 @@ async def aget_passport(address: str = "") -> Dict:
 
         latest_stamps.append(latest_stamp)
 
+    # Stamps verified when they were written do not need to be verified again
+    issuers_version = trusted_issuers_version()
+
     return {
         "stamps": [
-            {"provider": s.provider, "credential": s.stamp} for s in latest_stamps
+            {
+                "provider": s.provider,
+                "credential": s.stamp,
+                "verified": s.is_verified(issuers_version),
+            }
+            for s in latest_stamps
         ]
     }
 
@@ -15,6 +15,7 @@ from registry.exceptions import InvalidLimitException, api_get_object_or_404
 from registry.models import Event, Score
 from registry.utils import (
     decode_cursor,
+    get_cursor_page,
     get_cursor_query_condition,
     get_cursor_tokens_for_results,
 )
@@ -127,19 +128,17 @@ def get_score_history(
                 .distinct("address")
             )
 
-            scores = list(query[:limit])
+            scores, has_next, has_prev = get_cursor_page(query, cursor, limit)
             for score in scores:
                 score.created_at = score.created_at.isoformat()
 
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
-
             domain = request.build_absolute_uri("/")[:-1]
 
             page_links = get_cursor_tokens_for_results(
-                query,
                 domain,
                 scores,
+                has_next,
+                has_prev,
                 pagination_sort_fields,
                 limit,
                 [scorer_id],
@@ -180,19 +179,17 @@ def get_score_history(
                 .distinct("address")
             )
 
-            scores = list(query[:limit])
+            scores, has_next, has_prev = get_cursor_page(query, cursor, limit)
             for score in scores:
                 score.created_at = score.created_at.isoformat()
 
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
-
             domain = request.build_absolute_uri("/")[:-1]
 
             page_links = get_cursor_tokens_for_results(
-                query,
                 domain,
                 scores,
+                has_next,
+                has_prev,
                 pagination_sort_fields,
                 limit,
                 [scorer_id],
@@ -2,7 +2,7 @@ from decimal import Decimal
 from enum import Enum
 from typing import Dict, List, Optional
 
-from ninja import Schema
+from ninja import Field, Schema
 from registry.models import Event, Score
 
 
@@ -14,6 +14,27 @@ class SubmitPassportPayload(Schema):
     nonce: str = ""
 
 
+class SubmitPassportScorersPayload(Schema):
+    scorer_ids: List[str]
+    signature: str = ""
+    nonce: str = ""
+
+
+class SubmitPassportBatchPayload(Schema):
+    scorer_id: str
+    addresses: List[str]
+
+
+class GetScoresBulkPayload(Schema):
+    # The maximum is a setting, checked by `get_scores_bulk`
+    addresses: List[str] = Field(..., min_items=1)
+
+
+class ScoreExportFormat(str, Enum):
+    ndjson = "ndjson"
+    parquet = "parquet"
+
+
 class ScoreEvidenceResponse(Schema):
     type: str
     success: bool
@@ -107,6 +128,18 @@ class DetailedScoreResponse(Schema):
         return obj.stamp_scores
 
 
+class BulkScoreResponse(Schema):
+    address: str
+    found: bool
+    score: Optional[str]
+    status: Optional[StatusEnum]
+    last_score_timestamp: Optional[str]
+    expiration_date: Optional[str]
+    evidence: Optional[ThresholdScoreEvidenceResponse]
+    error: Optional[str]
+    stamp_scores: Optional[Dict]
+
+
 class HistoricalScoreData(Schema):
     score: float
     evidence: Optional[ThresholdScoreEvidenceResponse]
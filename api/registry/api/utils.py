@@ -4,8 +4,15 @@ import api_logging as logging
 from account.models import Account, AccountAPIKey
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.utils.module_loading import import_string
-from django_ratelimit.core import is_ratelimited
+from django_ratelimit.core import (
+    EXPIRATION_FUDGE,
+    _get_window,
+    _make_cache_key,
+    _split_rate,
+    is_ratelimited,
+)
 from django_ratelimit.decorators import ALL
 from django_ratelimit.exceptions import Ratelimited
 from eth_utils.address import (
@@ -195,17 +202,20 @@ aapi_key.openapi_security_schema: SecuritySchema = SecuritySchema(
 )
 
 
-def check_rate_limit(request):
+def check_rate_limit(request, count: int = 1):
     """
     Check the rate limit for the API.
     This is based on the original ratelimit decorator from django_ratelimit
+
+    A request can count as several requests, e.g. a batch counts as one request
+    per address.
     """
     old_limited = getattr(request, "limited", False)
 
     if request.path.startswith("/passport/"):
-        ratelimited = check_analysis_rate_limit(request)
+        ratelimited = check_analysis_rate_limit(request, count)
     else:
-        ratelimited = check_standard_rate_limit(request)
+        ratelimited = check_standard_rate_limit(request, count)
 
     request.limited = ratelimited or old_limited
 
@@ -214,13 +224,16 @@ def check_rate_limit(request):
         raise (import_string(cls) if isinstance(cls, str) else cls)()
 
 
-def check_standard_rate_limit(request) -> bool:
+def check_standard_rate_limit(request, count: int = 1) -> bool:
     rate = request.api_key.rate_limit
 
     # Bypass rate limiting if rate is set to None
     if rate == "":
         return False
 
+    if count != 1:
+        return is_ratelimited_by_count(request, "registry", rate, count)
+
     return is_ratelimited(
         request=request,
         group="registry",
@@ -232,13 +245,16 @@ def check_standard_rate_limit(request) -> bool:
     )
 
 
-def check_analysis_rate_limit(request) -> bool:
+def check_analysis_rate_limit(request, count: int = 1) -> bool:
     rate = request.api_key.analysis_rate_limit
 
     # Bypass rate limiting if rate is set to None
     if rate == "":
         return False
 
+    if count != 1:
+        return is_ratelimited_by_count(request, "analysis", rate, count)
+
     return is_ratelimited(
         request=request,
         group="analysis",
@@ -250,6 +266,31 @@ def check_analysis_rate_limit(request) -> bool:
     )
 
 
+def is_ratelimited_by_count(request, group: str, rate: str, count: int) -> bool:
+    """
+    Same as `is_ratelimited` for a request counting as `count` requests: the
+    counter shared with the single requests of the API key is incremented by
+    `count` at once. The key of the counter is built with the private helpers of
+    django-ratelimit, which is pinned for this reason.
+    """
+    if not rate or not getattr(settings, "RATELIMIT_ENABLE", True):
+        return False
+
+    limit, period = _split_rate(rate)
+    value = request.api_key.prefix
+    cache_key = _make_cache_key(group, _get_window(value, period), rate, value, ALL)
+    cache = caches[getattr(settings, "RATELIMIT_USE_CACHE", "default")]
+    try:
+        cache.add(cache_key, 0, period + EXPIRATION_FUDGE)
+        used = cache.incr(cache_key, delta=count)
+    except ValueError:
+        # The key has just expired
+        used = None
+    if used is None:
+        return not getattr(settings, "RATELIMIT_FAIL_OPEN", False)
+    return used > limit
+
+
 # TODO define logic once Community model has been updated
 def community_requires_signature(_):
     return False
@@ -1,4 +1,6 @@
-from typing import List, Optional
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
 from urllib.parse import urljoin
 
 import api_logging as logging
@@ -30,7 +32,9 @@ from registry.api.schema import (
     GtcEventsResponse,
     SigningMessageResponse,
     StampDisplayResponse,
+    SubmitPassportBatchPayload,
     SubmitPassportPayload,
+    SubmitPassportScorersPayload,
 )
 from registry.api.utils import (
     ApiKey,
@@ -43,7 +47,7 @@ from registry.api.utils import (
     track_apikey_usage,
     with_read_db,
 )
-from registry.atasks import ascore_passport
+from registry.atasks import LoadedPassport, ascore_passport
 from registry.exceptions import (
     InternalServerErrorException,
     InvalidAddressException,
@@ -52,6 +56,7 @@ from registry.exceptions import (
     InvalidLimitException,
     InvalidNonceException,
     InvalidOrderByFieldException,
+    InvalidScorerIdException,
     InvalidSignerException,
     NotFoundApiException,
     StakingRequestError,
@@ -60,6 +65,7 @@ from registry.exceptions import (
 )
 from registry.filters import GTCStakeEventsFilter
 from registry.models import GTCStakeEvent, Passport, Score
+from registry.single_flight import acoalesce_scoring
 from registry.tasks import score_passport_passport, score_registry_passport
 from registry.utils import (
     decode_cursor,
@@ -178,7 +184,9 @@ async def a_submit_passport(
 
 
 async def ahandle_submit_passport(
-    payload: SubmitPassportPayload, account: Account
+    payload: SubmitPassportPayload,
+    account: Account,
+    changed_providers: Optional[List[str]] = None,
 ) -> DetailedScoreResponse:
     address_lower = payload.address.lower()
     if not is_valid_address(address_lower):
@@ -194,19 +202,36 @@ async def ahandle_submit_passport(
 
     # Verify the signer
     if payload.signature or community_requires_signature(user_community):
-        if get_signer(payload.nonce, payload.signature).lower() != address_lower:
-            raise InvalidSignerException()
+        await averify_signer(payload.signature, payload.nonce, payload.address)
 
-        # Verify nonce
-        if not await Nonce.ause_nonce(payload.nonce):
-            log.error("Invalid nonce %s for address %s", payload.nonce, payload.address)
-            raise InvalidNonceException()
+    return await ascore_community_passport(
+        user_community, payload.address, changed_providers
+    )
+
+
+async def averify_signer(signature: str, nonce: str, address: str):
+    if get_signer(nonce, signature).lower() != address.lower():
+        raise InvalidSignerException()
+
+    # Verify nonce
+    if not await Nonce.ause_nonce(nonce):
+        log.error("Invalid nonce %s for address %s", nonce, address)
+        raise InvalidNonceException()
+
+
+async def ascore_community_passport(
+    community: Community,
+    address: str,
+    changed_providers: Optional[List[str]] = None,
+    loaded_passport: Optional[LoadedPassport] = None,
+) -> DetailedScoreResponse:
+    address_lower = address.lower()
 
     # Create an empty passport instance, only needed to be able to create a pending Score
     # The passport will be updated by the score_passport task
     db_passport, _ = await Passport.objects.aupdate_or_create(
-        address=payload.address.lower(),
-        community=user_community,
+        address=address_lower,
+        community=community,
     )
 
     # Create a score with status PROCESSING
@@ -220,11 +245,127 @@ async def ahandle_submit_passport(
         defaults=dict(score=None, status=Score.Status.PROCESSING),
     )
 
-    await ascore_passport(user_community, db_passport, payload.address, score)
-    await score.asave()
+    async def ascore() -> Score:
+        await ascore_passport(
+            community, db_passport, address, score, changed_providers, loaded_passport
+        )
+        await score.asave()
+        return score
+
+    async def aread_score() -> Optional[Score]:
+        return (
+            await Score.objects.select_related("passport")
+            .filter(passport=db_passport)
+            .afirst()
+        )
+
+    # The requests that bring changes do not join a scoring in progress
+    score = await acoalesce_scoring(
+        address_lower,
+        community.pk,
+        ascore,
+        aread_score,
+        join=changed_providers is None,
+    )
     return DetailedScoreResponse.from_orm(score)
 
 
+async def ahandle_submit_passport_to_scorers(
+    address: str, payload: SubmitPassportScorersPayload, account: Account
+) -> List[DetailedScoreResponse]:
+    """
+    Score the passport with each of the scorers, concurrently. The passport is
+    loaded and its credentials are verified once, only the deduplication and the
+    scoring are done for each community. The scores are returned in the order of
+    the scorer IDs.
+    """
+    if not is_valid_address(address):
+        raise InvalidAddressException()
+
+    scorer_ids = list(dict.fromkeys(payload.scorer_ids))
+    if not scorer_ids or len(scorer_ids) > settings.SUBMIT_PASSPORT_MAX_SCORERS:
+        raise InvalidScorerIdException(
+            f"Between 1 and {settings.SUBMIT_PASSPORT_MAX_SCORERS} scorer_ids are required."
+        )
+
+    # All the scorers are checked before any passport is scored
+    communities = [
+        await aget_scorer_by_id(scorer_id, account) for scorer_id in scorer_ids
+    ]
+
+    # Verify the signer
+    if payload.signature or any(
+        community_requires_signature(community) for community in communities
+    ):
+        await averify_signer(payload.signature, payload.nonce, address)
+
+    loaded_passport = LoadedPassport(address)
+    responses = await asyncio.gather(
+        *[
+            ascore_community_passport(
+                community, address, loaded_passport=loaded_passport
+            )
+            for community in communities
+        ]
+    )
+    responses_by_scorer_id = dict(zip(scorer_ids, responses))
+    return [responses_by_scorer_id[scorer_id] for scorer_id in payload.scorer_ids]
+
+
+async def ahandle_submit_passport_batch(
+    payload: SubmitPassportBatchPayload, account: Account
+) -> AsyncIterator[str]:
+    """
+    Score the passports of the addresses with the scorer, at most
+    `SUBMIT_PASSPORT_BATCH_CONCURRENCY` at a time. The scorer is checked before
+    anything is scored, and the score of each address is then yielded as a line
+    of NDJSON as soon as it is ready.
+    """
+    if not payload.addresses or (
+        len(payload.addresses) > settings.SUBMIT_PASSPORT_MAX_BATCH_SIZE
+    ):
+        raise InvalidLimitException(
+            f"Between 1 and {settings.SUBMIT_PASSPORT_MAX_BATCH_SIZE} addresses are required."
+        )
+
+    community = await aget_scorer_by_id(payload.scorer_id, account)
+    # The signatures of a batch of addresses cannot be verified
+    if community_requires_signature(community):
+        raise InvalidSignerException()
+
+    semaphore = asyncio.Semaphore(settings.SUBMIT_PASSPORT_BATCH_CONCURRENCY)
+
+    async def ascore(address: str) -> str:
+        try:
+            if not is_valid_address(address):
+                raise InvalidAddressException()
+            async with semaphore:
+                response = await ascore_community_passport(community, address)
+            return response.json()
+        except APIException as e:
+            return json.dumps({"address": address.lower(), "error": str(e.detail)})
+        except Exception as e:
+            log.exception("Error submitting passport in batch: %s", e)
+            return json.dumps({"address": address.lower(), "error": "Unexpected error"})
+
+    async def alines() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.ensure_future(ascore(address))
+            for address in dict.fromkeys(
+                address.lower() for address in payload.addresses
+            )
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task + "\n"
+        finally:
+            # The client has disconnected
+            for task in tasks:
+                task.cancel()
+
+    return alines()
+
+
 def handle_submit_passport(
     payload: SubmitPassportPayload, account: Account, use_passport_task: bool = False
 ) -> DetailedScoreResponse:
@@ -5,34 +5,53 @@ import api_logging as logging
 
 # --- Deduplication Modules
 from account.models import Community
+from django.conf import settings
 from django.db.models import Q
-from ninja import Router
+from django.http import JsonResponse, StreamingHttpResponse
+from ninja import Query, Router
+from ninja_extra.exceptions import APIException
 from registry.api import common, v1
 from registry.api.schema import (
+    BulkScoreResponse,
     CursorPaginatedHistoricalScoreResponse,
     CursorPaginatedScoreResponse,
     CursorPaginatedStampCredentialResponse,
     DetailedScoreResponse,
     ErrorMessageResponse,
+    GetScoresBulkPayload,
+    ScoreExportFormat,
     SigningMessageResponse,
     StampDisplayResponse,
+    SubmitPassportBatchPayload,
     SubmitPassportPayload,
+    SubmitPassportScorersPayload,
 )
 from registry.api.utils import (
     ApiKey,
+    atrack_apikey_usage,
     check_rate_limit,
     track_apikey_usage,
     with_read_db,
 )
 from registry.exceptions import (
+    InternalServerErrorException,
     InvalidAddressException,
+    InvalidAPIKeyPermissions,
     InvalidLimitException,
     api_get_object_or_404,
 )
 from registry.models import Score
+from registry.score_export import (
+    SCORE_VALUES_FIELDS,
+    agzip_ndjson_stream,
+    aparquet_stream,
+    score_values_to_dict,
+)
 from registry.utils import (
+    RowValueComparison,
     decode_cursor,
     encode_cursor,
+    get_cursor_page,
     get_cursor_query_condition,
     reverse_lazy_with_query,
 )
@@ -80,6 +99,90 @@ async def a_submit_passport(
     return await v1.a_submit_passport(request, payload)
 
 
+@router.post(
+    "/submit-passport/batch",
+    auth=v1.aapi_key,
+    response={
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Submit a batch of Ethereum addresses to the Scorer",
+    description=f"""Use this API to submit the passports of up to {settings.SUBMIT_PASSPORT_MAX_BATCH_SIZE} addresses for scoring by one scorer.\n
+The scores are streamed back as NDJSON, one line per address as soon as it has been scored, in no particular order: either a `DetailedScoreResponse`, or an object with the `address` and an `error`.\n
+Each distinct address counts as one request for the rate limit.
+""",
+)
+@atrack_apikey_usage(track_response=False, payload_param_name="payload")
+async def a_submit_passport_batch(
+    request, payload: SubmitPassportBatchPayload
+) -> StreamingHttpResponse:
+    try:
+        log.debug("called a_submit_passport_batch, payload=%s", payload)
+
+        if not request.api_key.submit_passports:
+            raise InvalidAPIKeyPermissions()
+
+        # Validates the batch & the scorer, nothing is scored before the lines are read
+        lines = await v1.ahandle_submit_passport_batch(payload, request.auth)
+    except APIException as e:
+        raise e
+    except Exception as e:
+        log.exception("Error submitting passports: %s", e)
+        raise InternalServerErrorException(
+            "Unexpected error while submitting passports"
+        )
+
+    # Each distinct address counts as one request
+    check_rate_limit(
+        request, count=len({address.lower() for address in payload.addresses})
+    )
+    return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+
+@router.post(
+    "/stamps/{str:address}/score",
+    auth=v1.aapi_key,
+    response={
+        200: List[DetailedScoreResponse],
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+        422: ErrorMessageResponse,
+    },
+    summary="Submit an Ethereum address to several Scorers",
+    description="""Use this API to submit your passport for scoring by several scorers at once.\n
+The passport is loaded and its stamps are verified once, and it is then scored by each of the scorers in `scorer_ids`.\n
+This API will return a list of `DetailedScoreResponse` structures, one for each of the `scorer_ids`, in the same order.\n
+Each distinct scorer counts as one request for the rate limit.
+""",
+)
+@atrack_apikey_usage(track_response=False, payload_param_name="payload")
+async def a_submit_passport_to_scorers(
+    request, address: str, payload: SubmitPassportScorersPayload
+) -> List[DetailedScoreResponse]:
+    # Each distinct scorer counts as one request, like the addresses of a batch
+    check_rate_limit(request, count=len(set(payload.scorer_ids)))
+    try:
+        log.debug(
+            "called a_submit_passport_to_scorers, address=%s, payload=%s",
+            address,
+            payload,
+        )
+
+        if not request.api_key.submit_passports:
+            raise InvalidAPIKeyPermissions()
+
+        return await v1.ahandle_submit_passport_to_scorers(
+            address, payload, request.auth
+        )
+    except APIException as e:
+        raise e
+    except Exception as e:
+        log.exception("Error submitting passport: %s", e)
+        raise InternalServerErrorException("Unexpected error while submitting passport")
+
+
 @router.get(
     "/score/{int:scorer_id}",
     auth=ApiKey(),
@@ -153,15 +256,10 @@ def get_scores(
                     last_score_timestamp__gte=last_score_timestamp__gte
                 )
 
-        has_more_scores = has_prev_scores = False
         next_cursor = prev_cursor = {}
 
         query = base_query.filter(filter_condition).order_by(*field_ordering)
-        scores = query[:limit]
-        scores = list(scores)
-
-        if cursor and cursor["d"] == "prev":
-            scores.reverse()
+        scores, has_more_scores, has_prev_scores = get_cursor_page(query, cursor, limit)
 
         if scores:
             next_id = scores[-1].id
@@ -186,12 +284,6 @@ def get_scores(
                 last_score_timestamp__gte=last_score_timestamp__gte,
             )
 
-            next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-            prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
-
-            has_more_scores = base_query.filter(next_filter_cond).exists()
-            has_prev_scores = base_query.filter(prev_filter_cond).exists()
-
         domain = request.build_absolute_uri("/")[:-1]
 
         next_url = (
@@ -229,6 +321,89 @@ def get_scores(
         raise e
 
 
+def bulk_score_response(address: str, row: Optional[dict], error=None) -> dict:
+    """The `BulkScoreResponse` of an address, built from its `.values()` row"""
+    if row is None:
+        return dict(
+            address=address,
+            found=False,
+            score=None,
+            status=None,
+            last_score_timestamp=None,
+            expiration_date=None,
+            evidence=None,
+            error=error,
+            stamp_scores=None,
+        )
+
+    return dict(found=True, **score_values_to_dict(row))
+
+
+@router.post(
+    "/stamps/{int:scorer_id}/scores",
+    auth=ApiKey(),
+    response={
+        200: List[BulkScoreResponse],
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Retrieve the Passport scores of several addresses",
+    description=f"""Use this endpoint to fetch the scores of up to {settings.GET_SCORES_BULK_MAX_ADDRESSES} addresses that are associated with a scorer, at once\n
+This endpoint will return a list of `BulkScoreResponse` structures, one for each of the `addresses`, in the same order.
+The addresses that have no score for the scorer have `found` set to false.
+""",
+)
+@track_apikey_usage(track_response=False, payload_param_name="payload")
+def get_scores_bulk(
+    request, scorer_id: int, payload: GetScoresBulkPayload
+) -> List[BulkScoreResponse]:
+    check_rate_limit(request)
+
+    if not request.api_key.read_scores:
+        raise InvalidAPIKeyPermissions()
+
+    if len(payload.addresses) > settings.GET_SCORES_BULK_MAX_ADDRESSES:
+        raise InvalidLimitException()
+
+    user_community = api_get_object_or_404(
+        Community, id=scorer_id, account=request.auth
+    )
+    try:
+        addresses = [address.lower() for address in payload.addresses]
+        valid_addresses = {
+            address for address in addresses if v1.is_valid_address(address)
+        }
+
+        # The rows are serialized as they are, without loading the models
+        rows = (
+            with_read_db(Score)
+            .filter(
+                passport__community_id=user_community.id,
+                passport__address__in=valid_addresses,
+            )
+            .values(*SCORE_VALUES_FIELDS)
+        )
+        rows_by_address = {row["passport__address"]: row for row in rows}
+
+        results = [
+            bulk_score_response(
+                address,
+                rows_by_address.get(address),
+                error=None if address in valid_addresses else "Invalid address.",
+            )
+            for address in addresses
+        ]
+        return JsonResponse(results, safe=False)
+    except Exception as e:
+        log.error(
+            "Error getting passport scores. scorer_id=%s",
+            scorer_id,
+            exc_info=True,
+        )
+        raise e
+
+
 @router.get(
     "/stamps/{str:address}",
     auth=ApiKey(),
@@ -303,6 +478,66 @@ def get_score_history(
     )
 
 
+@router.get(
+    "/score/{int:scorer_id}/export",
+    auth=v1.aapi_key,
+    response={
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Export the Passport scores for all submitted addresses",
+    description="""Use this endpoint to download the scores of all the addresses that are associated with a scorer, at once\n
+The scores are streamed as a gzip-compressed NDJSON file (`format=ndjson`, one `DetailedScoreResponse` with the `id` of the score per line) or as a Parquet file (`format=parquet`), sorted ascending by `["last_score_timestamp", "id"]`.\n
+For incremental exports, pass the `last_score_timestamp` and the `id` of the last score of the previous export as `since` and `since_id`: only the scores that come after it in this order are exported.
+With `since` alone, the scores updated at `since` are exported again, and can be deduplicated by `id`.\n
+The download counts as one request for the rate limit.
+""",
+)
+@atrack_apikey_usage(track_response=False)
+async def a_export_scores(
+    request,
+    scorer_id: int,
+    export_format: ScoreExportFormat = Query(ScoreExportFormat.ndjson, alias="format"),
+    since: Optional[datetime] = None,
+    since_id: Optional[int] = None,
+) -> StreamingHttpResponse:
+    check_rate_limit(request)
+
+    if not request.api_key.read_scores:
+        raise InvalidAPIKeyPermissions()
+
+    community = await v1.aget_scorer_by_id(scorer_id, request.auth)
+
+    query = with_read_db(Score).filter(passport__community_id=community.id)
+    if since and since_id is not None:
+        # Keyset watermark: the scores updated at `since` after the last exported one
+        query = query.filter(
+            RowValueComparison(["last_score_timestamp", "id"], ">", [since, since_id])
+        )
+    elif since:
+        query = query.filter(last_score_timestamp__gte=since)
+    # Read from a server-side cursor, one chunk at a time
+    rows = (
+        query.order_by("last_score_timestamp", "id")
+        .values(*SCORE_VALUES_FIELDS)
+        .aiterator(chunk_size=settings.SCORE_EXPORT_CHUNK_SIZE)
+    )
+
+    if export_format == ScoreExportFormat.parquet:
+        response = StreamingHttpResponse(
+            aparquet_stream(rows), content_type="application/vnd.apache.parquet"
+        )
+        filename = f"scores_{scorer_id}.parquet"
+    else:
+        response = StreamingHttpResponse(
+            agzip_ndjson_stream(rows), content_type="application/gzip"
+        )
+        filename = f"scores_{scorer_id}.ndjson.gz"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @router.get(
     "/score/{int:scorer_id}/{str:address}",
     auth=ApiKey(),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegistryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "registry"
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import instrumentation, signals
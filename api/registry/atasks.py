@@ -1,6 +1,7 @@
-import copy
+import asyncio
 from datetime import datetime, timezone
-from typing import Dict
+from decimal import Decimal
+from typing import Dict, List, Optional
 
 import api_logging as logging
 from account.deduplication.lifo import alifo
@@ -8,11 +9,25 @@ from account.deduplication.lifo import alifo
 # --- Deduplication Modules
 from account.models import AccountAPIKeyAnalytics, Community, Rules
 from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.db.models.fields.json import KT
+from django.utils.dateparse import parse_datetime
 from ninja_extra.exceptions import APIException
 from reader.passport_reader import aget_passport, get_did
 from registry.exceptions import NoPassportException
+from registry.fingerprint import (
+    acompute_passport_fingerprint,
+    arecord_fingerprint_result,
+)
+from registry.instrumentation import log_stage_timings, stage
 from registry.models import Passport, Score, Stamp
 from registry.utils import get_utc_time, validate_credential, verify_issuer
+from registry.verification_cache import (
+    ais_credential_verified,
+    aremember_verified_credential,
+)
+from scorer_weighted.models import ScoreData
+from scorer_weighted.weight_table import WeightTable, aget_weight_table
 
 log = logging.getLogger(__name__)
 
@@ -63,18 +78,6 @@ async def asave_api_key_analytics(
         log.error("Failed to save analytics. Error: '%s'", e, exc_info=True)
 
 
-async def aremove_stale_stamps_from_db(passport: Passport, passport_data: dict):
-    current_hashes = [
-        stamp["credential"]["credentialSubject"]["hash"]
-        for stamp in passport_data["stamps"]
-    ]
-    await (
-        Stamp.objects.filter(passport=passport)
-        .exclude(hash__in=current_hashes)
-        .adelete()
-    )
-
-
 async def aload_passport_data(address: str) -> Dict:
     # Get the passport data from the blockchain or ceramic cache
     passport_data = await aget_passport(address)
@@ -84,16 +87,35 @@ async def aload_passport_data(address: str) -> Dict:
     return passport_data
 
 
-async def acalculate_score(passport: Passport, community_id: int, score: Score):
-    log.debug("Scoring")
-    user_community = await Community.objects.aget(pk=community_id)
+class LoadedPassport:
+    """
+    The passport of an address, to be scored in several communities: it is loaded
+    at most once, and its credentials are validated at most once, when the first
+    community needs them. The validated stamps are only filtered by the following
+    stages, so they can be shared by the communities.
+    """
 
-    scorer = await user_community.aget_scorer()
-    scores = await scorer.acompute_score([passport.id], community_id)
+    def __init__(self, address: str):
+        self.address = address
+        self._data: Optional[asyncio.Future] = None
+        self._validated_data: Optional[asyncio.Future] = None
+
+    async def aload(self) -> dict:
+        if self._data is None:
+            self._data = asyncio.ensure_future(aload_passport_data(self.address))
+        return await asyncio.shield(self._data)
+
+    async def avalidate(self, passport: Passport) -> dict:
+        if self._validated_data is None:
+            self._validated_data = asyncio.ensure_future(
+                avalidate_credentials(passport, await self.aload())
+            )
+        return await asyncio.shield(self._validated_data)
 
-    log.info("Scores for address '%s': %s", passport.address, scores)
-    scoreData = scores[0]
 
+def apply_score_data(
+    score: Score, scoreData: ScoreData, weights_version: Optional[str]
+):
     score.score = scoreData.score
     score.status = Score.Status.DONE
     score.last_score_timestamp = get_utc_time()
@@ -101,9 +123,164 @@ async def acalculate_score(passport: Passport, community_id: int, score: Score):
     score.error = None
     score.stamp_scores = scoreData.stamp_scores
     score.expiration_date = scoreData.expiration_date
+    score.weights_version = weights_version
+    score.fingerprint = None
+
+
+def is_score_up_to_date(score: Score, fingerprint: Optional[str]) -> bool:
+    """
+    Check if the score has been calculated from the same inputs as described by
+    the fingerprint (see `registry.fingerprint`), and has not expired yet
+    """
+    return (
+        fingerprint is not None
+        and score.status == Score.Status.DONE
+        and score.fingerprint == fingerprint
+        and (score.expiration_date is None or score.expiration_date > get_utc_time())
+    )
+
+
+async def acalculate_score(
+    passport: Passport,
+    community_id: int,
+    score: Score,
+    scorer=None,
+    weight_table: Optional[WeightTable] = None,
+):
+    """
+    Score the passport. The scorer of the community and its weight table are read,
+    unless they are given (e.g. the weight table the fingerprint was computed with).
+    """
+    log.debug("Scoring")
+    if scorer is None:
+        user_community = await Community.objects.aget(pk=community_id)
+        scorer = await user_community.aget_scorer()
+    # Read the weights version before scoring, if the weights change while scoring
+    # the score will be considered outdated and fully recalculated the next time
+    if weight_table is None:
+        weight_table = await aget_weight_table(scorer, community_id)
+    scores = await scorer.acompute_score([passport.id], community_id, weight_table)
+
+    log.info("Scores for address '%s': %s", passport.address, scores)
+    apply_score_data(score, scores[0], weight_table.version)
     log.info("Calculated score: %s", score)
 
 
+async def aget_earliest_expiration_date(stamps) -> Optional[datetime]:
+    """
+    The earliest expiration of the stamps, computed by the DB. The stamps saved
+    before the `expiration_date` column was added (see the
+    `backfill_stamp_expiration_and_issuer` command) are read from their credential.
+    """
+    result = await stamps.aaggregate(
+        earliest=Min("expiration_date"),
+        num_legacy=Count("id", filter=Q(expiration_date__isnull=True)),
+    )
+    expiration_dates = [result["earliest"]] if result["earliest"] else []
+    if result["num_legacy"]:
+        expiration_dates += [
+            datetime.fromisoformat(expiration_date)
+            async for expiration_date in stamps.filter(
+                expiration_date__isnull=True
+            ).values_list(KT("credential__expirationDate"), flat=True)
+        ]
+    return min(expiration_dates) if expiration_dates else None
+
+
+async def aupdate_score_incrementally(
+    community: Community,
+    passport: Passport,
+    address: str,
+    score: Score,
+    providers: List[str],
+) -> bool:
+    """
+    Update the score after the stamps of the given providers have changed, without
+    re-validating and re-scoring the stamps of all the other providers.
+
+    The score delta is computed from the stored `Score.stamp_scores` and the current
+    weight table. This is only possible if the score was calculated with the current
+    weights and has not expired, otherwise False is returned and nothing is changed,
+    and the caller is expected to do a full recalculation.
+    """
+    if (
+        score.status != Score.Status.DONE
+        or score.stamp_scores is None
+        or score.weights_version is None
+        or (
+            score.expiration_date is not None
+            and score.expiration_date <= get_utc_time()
+        )
+    ):
+        return False
+
+    scorer = await community.aget_scorer()
+    weight_table = await aget_weight_table(scorer, community.pk)
+    if weight_table.version != score.weights_version:
+        log.debug(
+            "Weights changed since the score was calculated, the score of '%s' will be recalculated",
+            address,
+        )
+        return False
+
+    providers = sorted(set(providers))
+
+    # The expiration of the replaced stamps tells if the earliest expiration of the passport may change
+    replaced_expiration_date = await aget_earliest_expiration_date(
+        Stamp.objects.filter(passport=passport, provider__in=providers)
+    )
+
+    passport_data = await aget_passport(address, providers=providers)
+    validated_passport_data = await avalidate_credentials(passport, passport_data)
+    deduped_passport_data = await aprocess_deduplication(
+        passport, community, validated_passport_data, score
+    )
+    await asave_stamps(passport, deduped_passport_data, providers=providers)
+
+    stamp_scores = {
+        provider: points
+        for provider, points in score.stamp_scores.items()
+        if provider not in providers
+    }
+    for stamp in deduped_passport_data["stamps"]:
+        stamp_scores[stamp["provider"]] = float(
+            Decimal(weight_table.weights.get(stamp["provider"], 0))
+        )
+
+    sum_of_weights = Decimal(0)
+    for provider in stamp_scores:
+        sum_of_weights += Decimal(weight_table.weights.get(provider, 0))
+
+    new_expiration_dates = [
+        datetime.fromisoformat(stamp["credential"]["expirationDate"])
+        for stamp in deduped_passport_data["stamps"]
+    ]
+    if score.expiration_date is not None and (
+        replaced_expiration_date is None
+        or replaced_expiration_date > score.expiration_date
+    ):
+        expiration_date = min([score.expiration_date] + new_expiration_dates)
+    else:
+        # One of the replaced stamps might have been the earliest to expire
+        expiration_date = await aget_earliest_expiration_date(
+            Stamp.objects.filter(passport=passport)
+        )
+
+    apply_score_data(
+        score,
+        scorer.get_score_data(
+            {
+                "sum_of_weights": sum_of_weights,
+                "earned_points": stamp_scores,
+                "expiration_date": expiration_date,
+            }
+        ),
+        weight_table.version,
+    )
+    log.info("Incrementally updated score: %s", score)
+    return True
+
+
 async def aprocess_deduplication(passport, community, passport_data, score: Score):
     """
     Process deduplication based on the community rule
@@ -152,34 +329,70 @@ async def aprocess_deduplication(passport, community, passport_data, score: Scor
 
 
 async def avalidate_credentials(passport: Passport, passport_data) -> dict:
+    """
+    Validate the stamps of the passport. The cheap checks (issuer, expiration) are
+    done first, and the signatures of the remaining stamps are then verified
+    concurrently, at most `CREDENTIAL_VERIFICATION_CONCURRENCY` at a time.
+    The validated stamps are returned in the same order as in `passport_data`.
+
+    Credentials that have already been verified for this DID are not verified
+    again (see `registry.verification_cache` and `ceramic_cache.verification`).
+    """
     log.debug("validating credentials")
 
-    validated_passport = copy.deepcopy(passport_data)
-    validated_passport["stamps"] = []
+    # The stamps are never modified by the scoring pipeline, so the stages only
+    # filter the list of stamps and share the stamps themselves
+    validated_passport = {**passport_data, "stamps": []}
 
     did = get_did(passport.address)
+    semaphore = asyncio.Semaphore(settings.CREDENTIAL_VERIFICATION_CONCURRENCY)
 
-    for stamp in passport_data["stamps"]:
-        log.debug(
-            "validating credential did='%s' credential='%s'", did, stamp["credential"]
-        )
+    async def averify_stamp(stamp) -> list:
+        # Verified when it was written to the ceramic cache
+        if stamp.get("verified"):
+            return []
 
+        if await ais_credential_verified(did, stamp["credential"]):
+            return []
+
+        async with semaphore:
+            log.debug(
+                "validating credential did='%s' credential='%s'",
+                did,
+                stamp["credential"],
+            )
+            stamp_return_errors = await validate_credential(did, stamp["credential"])
+
+        if len(stamp_return_errors) == 0:
+            await aremember_verified_credential(did, stamp["credential"])
+        return stamp_return_errors
+
+    checks = []
+    verifications = []
+    for stamp in passport_data["stamps"]:
         is_issuer_verified = verify_issuer(stamp)
         # check that expiration date is not in the past
         stamp_expiration_date = datetime.fromisoformat(
             stamp["credential"]["expirationDate"]
         )
         stamp_is_expired = stamp_expiration_date < datetime.now(timezone.utc)
+        checks.append((stamp, stamp_is_expired, is_issuer_verified))
+        if not stamp_is_expired and is_issuer_verified:
+            # do expensive operation last
+            verifications.append(averify_stamp(stamp))
+
+    verification_errors = iter(await asyncio.gather(*verifications))
+
+    for stamp, stamp_is_expired, is_issuer_verified in checks:
         stamp_return_errors = []
         valid = False
         if not stamp_is_expired and is_issuer_verified:
-            # do expensive operation last
-            stamp_return_errors = await validate_credential(did, stamp["credential"])
+            stamp_return_errors = next(verification_errors)
             if len(stamp_return_errors) == 0:
                 valid = True
 
         if valid:
-            validated_passport["stamps"].append(copy.deepcopy(stamp))
+            validated_passport["stamps"].append(stamp)
         else:
             log.info(
                 "Stamp not created. Stamp=%s\nReason: errors=%s stamp_is_expired=%s is_issuer_verified=%s",
@@ -192,25 +405,82 @@ async def avalidate_credentials(passport: Passport, passport_data) -> dict:
     return validated_passport
 
 
-async def asave_stamps(passport: Passport, deduped_passport_data) -> None:
+async def asave_stamps(
+    passport: Passport, deduped_passport_data, providers: Optional[List[str]] = None
+) -> None:
+    """
+    Sync the stamps of the passport in the DB with the deduplicated passport data.
+
+    The existing stamps are loaded once and compared in memory: new and changed
+    stamps are upserted in bulk, stamps that are no longer part of the passport
+    are deleted, and unchanged stamps are not written at all.
+
+    If `providers` is set, only the stamps of these providers are synced, and the
+    stamps of the other providers are left untouched.
+    """
     log.debug(
         "saving stamps deduped_passport_data: %s", deduped_passport_data["stamps"]
     )
 
-    for stamp in deduped_passport_data["stamps"]:
-        await Stamp.objects.aupdate_or_create(
-            hash=stamp["credential"]["credentialSubject"]["hash"],
+    existing_stamps = Stamp.objects.filter(passport=passport)
+    if providers is not None:
+        existing_stamps = existing_stamps.filter(provider__in=providers)
+    existing = {
+        hash: (id, provider, credential, expiration_date)
+        async for id, hash, provider, credential, expiration_date in existing_stamps.values_list(
+            "id", "hash", "provider", "credential", "expiration_date"
+        )
+    }
+
+    stamps = {
+        stamp["credential"]["credentialSubject"]["hash"]: stamp
+        for stamp in deduped_passport_data["stamps"]
+    }
+    # Stamps saved before the expiration date & issuer columns were added are rewritten too
+    changed_stamps = [
+        Stamp(
             passport=passport,
-            defaults={
-                "provider": stamp["provider"],
-                "credential": stamp["credential"],
-            },
+            hash=hash,
+            provider=stamp["provider"],
+            credential=stamp["credential"],
+            expiration_date=parse_datetime(stamp["credential"]["expirationDate"]),
+            issuer=stamp["credential"].get("issuer"),
+        )
+        for hash, stamp in stamps.items()
+        if hash not in existing
+        or existing[hash][1:3] != (stamp["provider"], stamp["credential"])
+        or existing[hash][3] is None
+    ]
+    stale_ids = [id for hash, (id, *_) in existing.items() if hash not in stamps]
+
+    if changed_stamps:
+        await Stamp.objects.abulk_create(
+            changed_stamps,
+            update_conflicts=True,
+            unique_fields=["hash", "passport"],
+            update_fields=["provider", "credential", "expiration_date", "issuer"],
         )
+    if stale_ids:
+        await Stamp.objects.filter(pk__in=stale_ids).adelete()
 
 
+@log_stage_timings
 async def ascore_passport(
-    community: Community, passport: Passport, address: str, score: Score
+    community: Community,
+    passport: Passport,
+    address: str,
+    score: Score,
+    changed_providers: Optional[List[str]] = None,
+    loaded_passport: Optional[LoadedPassport] = None,
 ):
+    """
+    Score the passport. If `changed_providers` is set, only the stamps of these
+    providers have changed since the last scoring, and the score will be updated
+    incrementally when possible (see `aupdate_score_incrementally`).
+
+    The passport is loaded and validated through `loaded_passport` when it is
+    shared with the scorings of other communities.
+    """
     log.info(
         "score_passport request for community_id=%s, address='%s'",
         community.pk,
@@ -218,14 +488,55 @@ async def ascore_passport(
     )
 
     try:
-        passport_data = await aload_passport_data(address)
-        validated_passport_data = await avalidate_credentials(passport, passport_data)
-        deduped_passport_data = await aprocess_deduplication(
-            passport, community, validated_passport_data, score
-        )
-        await asave_stamps(passport, deduped_passport_data)
-        await aremove_stale_stamps_from_db(passport, deduped_passport_data)
-        await acalculate_score(passport, community.pk, score)
+        if changed_providers is not None:
+            with stage("incremental_update"):
+                updated = await aupdate_score_incrementally(
+                    community, passport, address, score, changed_providers
+                )
+            if updated:
+                return
+
+        if loaded_passport is None:
+            loaded_passport = LoadedPassport(address)
+
+        with stage("load_passport_data"):
+            passport_data = await loaded_passport.aload()
+
+        with stage("fingerprint"):
+            scorer = await community.aget_scorer()
+            weight_table = await aget_weight_table(scorer, community.pk)
+            fingerprint = await acompute_passport_fingerprint(
+                community.pk, weight_table.version, passport_data
+            )
+        if is_score_up_to_date(score, fingerprint):
+            log.info(
+                "Passport of '%s' has not changed since it was last scored", address
+            )
+            await arecord_fingerprint_result(hit=True)
+            return
+        await arecord_fingerprint_result(hit=False)
+
+        with stage("validate_credentials"):
+            validated_passport_data = await loaded_passport.avalidate(passport)
+        with stage("deduplication"):
+            deduped_passport_data = await aprocess_deduplication(
+                passport, community, validated_passport_data, score
+            )
+        with stage("save_stamps"):
+            await asave_stamps(passport, deduped_passport_data)
+        with stage("calculate_score"):
+            # With the weight table of the fingerprint, so that both use the same
+            # weights version
+            await acalculate_score(
+                passport, community.pk, score, scorer=scorer, weight_table=weight_table
+            )
+
+        # Computed after the deduplication, as the next submission will be compared
+        # to the deduplication state this score results in
+        with stage("fingerprint"):
+            score.fingerprint = await acompute_passport_fingerprint(
+                community.pk, score.weights_version, passport_data
+            )
 
     except APIException as e:
         log.error(
@@ -0,0 +1,122 @@
+"""
+Fingerprint of the inputs a passport score has been calculated from.
+
+Integrators often resubmit passports whose stamps have not changed. If the
+fingerprint of the freshly loaded passport matches the one stored on the score,
+and the score has not expired, the stored score can be returned without
+verifying, deduplicating, saving and scoring the stamps again.
+
+The fingerprint covers:
+ - the stamps: the sorted stamp hashes together with their expiration dates and
+   proof values, so that a renewed stamp (same hash) changes the fingerprint
+ - the weights & threshold of the scorer (see `scorer_weighted.weight_table`)
+ - the deduplication state: the hash links of the stamp hashes in the community
+"""
+
+import hashlib
+import json
+from typing import List, Optional
+
+import api_logging as logging
+from django.core.cache import cache
+from registry.hash_filter import arecord_hash_filter_result, asplit_hashes
+from registry.models import HashScorerLink
+from registry.utils import get_utc_time
+
+log = logging.getLogger(__name__)
+
+FINGERPRINT_HITS_KEY = "passport_fingerprint:hits"
+FINGERPRINT_MISSES_KEY = "passport_fingerprint:misses"
+
+
+def _digest(data) -> str:
+    return hashlib.sha256(
+        json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def get_stamp_hashes(passport_data: dict) -> List[str]:
+    return sorted(
+        stamp["credential"].get("credentialSubject", {}).get("hash") or ""
+        for stamp in passport_data["stamps"]
+    )
+
+
+async def adedup_state_version(community_id: int, hashes: List[str]) -> str:
+    """
+    Version of the deduplication state of the given stamp hashes: it changes
+    whenever a hash is claimed, released, or its claim expires.
+
+    The hashes that have definitely not been claimed in the community (see
+    `registry.hash_filter`) are not looked up. The filter may miss a link that is
+    being claimed concurrently, but this can only make the version differ from the
+    one stored on the score (and the passport be rescored): all the hashes of a
+    passport are claimed by the time its score is stored.
+    """
+    maybe_claimed_hashes, skipped = await asplit_hashes(community_id, hashes)
+    now = get_utc_time()
+    links = []
+    if maybe_claimed_hashes:
+        links = [
+            (hash, address, expires_at.isoformat(), expires_at <= now)
+            async for hash, address, expires_at in HashScorerLink.objects.filter(
+                community_id=community_id, hash__in=maybe_claimed_hashes
+            )
+            .order_by("hash")
+            .values_list("hash", "address", "expires_at")
+        ]
+    if skipped is not None:
+        await arecord_hash_filter_result(
+            skipped, len(maybe_claimed_hashes), len({link[0] for link in links})
+        )
+    return _digest(links)
+
+
+async def acompute_passport_fingerprint(
+    community_id: int, weights_version: Optional[str], passport_data: dict
+) -> Optional[str]:
+    """
+    Return the fingerprint of the passport data for the community, or None if the
+    weights version is unknown (in which case the score must always be recalculated).
+    """
+    if weights_version is None:
+        return None
+
+    stamps = sorted(
+        (
+            stamp["credential"].get("credentialSubject", {}).get("hash") or "",
+            stamp["credential"].get("expirationDate") or "",
+            stamp["credential"].get("proof", {}).get("proofValue") or "",
+        )
+        for stamp in passport_data["stamps"]
+    )
+    dedup_version = await adedup_state_version(
+        community_id, get_stamp_hashes(passport_data)
+    )
+    return _digest([stamps, weights_version, dedup_version])
+
+
+async def arecord_fingerprint_result(hit: bool):
+    """Count the fingerprint hits & misses in the shared cache"""
+    key = FINGERPRINT_HITS_KEY if hit else FINGERPRINT_MISSES_KEY
+    try:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+    except Exception:
+        log.error("Failed to record the passport fingerprint result", exc_info=True)
+
+
+def get_fingerprint_stats() -> dict:
+    counters = cache.get_many([FINGERPRINT_HITS_KEY, FINGERPRINT_MISSES_KEY])
+    hits = counters.get(FINGERPRINT_HITS_KEY, 0)
+    misses = counters.get(FINGERPRINT_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else None,
+    }
+
+
+def reset_fingerprint_stats():
+    cache.delete_many([FINGERPRINT_HITS_KEY, FINGERPRINT_MISSES_KEY])
@@ -0,0 +1,303 @@
+"""
+Bloom filters of the stamp hashes claimed in each community.
+
+Most of the stamp hashes looked up in `HashScorerLink` have never been claimed in
+the community. A Bloom filter per community tells when a hash is definitely not
+claimed, in which case the DB lookup can be skipped. A "maybe" answer still needs
+the DB lookup, and the rate at which these lookups find nothing (the false
+positive rate) is counted in the shared cache.
+
+The filters are bitmaps in the shared cache (redis). The bits of the hashes are
+tested with `GETBIT` and set with `SETBIT` (so that concurrent writers never lose
+each other's bits), in a single pipelined round trip: the bitmaps themselves are
+never transferred.
+
+Each filter is sized from the number of hash links of its community (see
+`filter_bits`), and its size is kept in its header. The workers remember the size
+of the filters, and read the header in the same round trip as the bits: if the
+size has changed, the bits are read (or written) again at their new offsets. Bits
+set at the offsets of a stale size only add false positives.
+
+The first bit of a bitmap tells that the filter is complete, i.e. it contains all
+the hash links of the community. It is set by the `rebuild_hash_filters` command
+(which also resizes the filters that have outgrown their size), or when the
+community is created. A filter that is incomplete (never rebuilt, or evicted from
+redis) answers "maybe" for every hash.
+
+Hash links are never removed from a filter (links are rarely deleted, and this
+only makes the filter answer "maybe" for them). A hash claimed by another worker
+while a passport is being scored may be reported as "definitely not claimed", so
+the filter must only be used where such an answer is safe (see
+`registry.fingerprint.adedup_state_version`).
+"""
+
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import api_logging as logging
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+HASH_FILTER_KEY_PREFIX = "hash_filter"
+HASH_FILTER_SKIPPED_KEY = "hash_filter_stats:skipped"
+HASH_FILTER_POSITIVES_KEY = "hash_filter_stats:positives"
+HASH_FILTER_FALSE_POSITIVES_KEY = "hash_filter_stats:false_positives"
+
+# The header of a bitmap: a byte of flags, the first one being the "complete" flag,
+# and the log2 of the number of bits of the filter
+COMPLETE_BIT = 0
+HEADER_BYTES = 2
+HEADER_BITS = HEADER_BYTES * 8
+
+
+def hash_filter_key(community_id: int) -> str:
+    return f"{HASH_FILTER_KEY_PREFIX}:{community_id}"
+
+
+def filter_bits(num_hashes: int) -> int:
+    """The number of bits (a power of 2) of a filter for the number of hashes"""
+    bits = max(
+        settings.HASH_FILTER_MIN_BITS, num_hashes * settings.HASH_FILTER_BITS_PER_HASH
+    )
+    return min(1 << (bits - 1).bit_length(), settings.HASH_FILTER_MAX_BITS)
+
+
+def bit_offsets(hash: str, num_bits: int) -> List[int]:
+    """The offsets of the bits of the stamp hash in a bitmap (double hashing)"""
+    digest = hashlib.sha256(hash.encode("utf-8")).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    return [
+        HEADER_BITS + (h1 + i * h2) % num_bits
+        for i in range(settings.HASH_FILTER_NUM_HASHES)
+    ]
+
+
+def set_bits(bitmap: bytearray, offsets: Iterable[int]):
+    # Same bit order as the redis bitmaps: offset 0 is the most significant bit
+    for offset in offsets:
+        bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+
+
+def is_bit_set(bitmap: bytes, offset: int) -> bool:
+    byte = offset >> 3
+    return byte < len(bitmap) and bool(bitmap[byte] & (0x80 >> (offset & 7)))
+
+
+def parse_header(header: bytes) -> Tuple[bool, Optional[int]]:
+    """Whether the filter is complete, and its number of bits (None if unknown)"""
+    if len(header) < HEADER_BYTES or not header[1]:
+        return False, None
+    return is_bit_set(header, COMPLETE_BIT), 1 << header[1]
+
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis_client() -> redis.Redis:
+    """A client of the (primary) server of the default cache, whose keys it shares"""
+    global _redis_client
+    if _redis_client is None:
+        location = settings.CACHES["default"]["LOCATION"]
+        if isinstance(location, str):
+            location = location.split(",")
+        _redis_client = redis.Redis.from_url(location[0])
+    return _redis_client
+
+
+# The number of bits of the filter of each community, as last read by this worker
+local_filter_bits: Dict[int, int] = {}
+
+
+def _run_on_bits(
+    community_id: int,
+    hashes: List[str],
+    command: Callable[[redis.client.Pipeline, str, int], None],
+) -> Tuple[bool, List[List[int]]]:
+    """
+    Run the command (e.g. a `GETBIT`) on the bits of each hash in the filter of the
+    community, in a single round trip with the read of the header of the filter.
+    Return whether the filter is complete, and the results of the command for each
+    hash (none if the size of the filter is unknown, in which case the filter is not
+    complete).
+    """
+    key = cache.make_and_validate_key(hash_filter_key(community_id))
+    client = _get_redis_client()
+    num_bits = local_filter_bits.get(community_id) or filter_bits(0)
+    # Retried once if the filter has been resized since its size was last read
+    for _ in range(2):
+        pipeline = client.pipeline(transaction=False)
+        pipeline.getrange(key, 0, HEADER_BYTES - 1)
+        for hash in hashes:
+            for offset in bit_offsets(hash, num_bits):
+                command(pipeline, key, offset)
+        header, *results = pipeline.execute()
+
+        complete, filter_num_bits = parse_header(header)
+        if filter_num_bits is None:
+            return False, []
+        local_filter_bits[community_id] = filter_num_bits
+        if filter_num_bits == num_bits:
+            k = settings.HASH_FILTER_NUM_HASHES
+            return complete, [results[i : i + k] for i in range(0, len(results), k)]
+        num_bits = filter_num_bits
+    return False, []
+
+
+def split_hashes(
+    community_id: int, hashes: Iterable[str]
+) -> Tuple[List[str], Optional[int]]:
+    """
+    Return the hashes that might have been claimed in the community, and the
+    number of the other hashes, which have definitely not been claimed. The
+    number is None if the filter of the community is not available (all the
+    hashes might have been claimed).
+    """
+    hashes = list(hashes)
+    try:
+        complete, bits = _run_on_bits(
+            community_id,
+            hashes,
+            lambda pipeline, key, offset: pipeline.getbit(key, offset),
+        )
+    except Exception:
+        log.error("Failed to read the hash filter", exc_info=True)
+        complete = False
+    if not complete:
+        return hashes, None
+
+    maybe_claimed = [hash for hash, hash_bits in zip(hashes, bits) if all(hash_bits)]
+    return maybe_claimed, len(hashes) - len(maybe_claimed)
+
+
+asplit_hashes = sync_to_async(split_hashes)
+
+
+def add_hashes(community_id: int, hashes: Iterable[str]):
+    """Add claimed hashes to the filter of the community, in a single round trip"""
+    hashes = list(hashes)
+    if not hashes:
+        return
+    try:
+        _run_on_bits(
+            community_id,
+            hashes,
+            lambda pipeline, key, offset: pipeline.setbit(key, offset, 1),
+        )
+    except Exception:
+        log.error("Failed to update the hash filter", exc_info=True)
+
+
+aadd_hashes = sync_to_async(add_hashes)
+
+
+def get_filter_bits(community_id: int) -> Optional[int]:
+    """The number of bits of the filter of the community, None if it has none"""
+    key = cache.make_and_validate_key(hash_filter_key(community_id))
+    return parse_header(_get_redis_client().getrange(key, 0, HEADER_BYTES - 1))[1]
+
+
+def new_bitmap(num_bits: int) -> bytearray:
+    bitmap = bytearray((HEADER_BITS + num_bits + 7) // 8)
+    bitmap[1] = num_bits.bit_length() - 1
+    return bitmap
+
+
+def merge_bitmap(community_id: int, bitmap: bytearray, complete: bool = False):
+    """
+    Add the bits of the bitmap (see `new_bitmap` and `set_bits`) to the filter of
+    the community in a single `BITOP OR`, and flag the filter as complete if
+    `complete` is set. The filter must have the size of the bitmap (see
+    `reset_hash_filter`).
+    """
+    if complete:
+        set_bits(bitmap, [COMPLETE_BIT])
+
+    key = cache.make_and_validate_key(hash_filter_key(community_id))
+    tmp_key = f"{key}:merge"
+    pipeline = _get_redis_client().pipeline(transaction=True)
+    pipeline.set(tmp_key, bytes(bitmap))
+    pipeline.bitop("OR", key, key, tmp_key)
+    pipeline.delete(tmp_key)
+    pipeline.execute()
+
+
+def reset_hash_filter(
+    community_id: int, num_bits: Optional[int] = None, complete: bool = False
+):
+    """
+    Replace the filter of the community with an empty filter of `num_bits` bits
+    (the min. size by default). A filter can only be flagged as complete
+    when it is reset if the community has no hash links (e.g. it has just been
+    created).
+    """
+    header = new_bitmap(num_bits or filter_bits(0))[:HEADER_BYTES]
+    if complete:
+        set_bits(header, [COMPLETE_BIT])
+    key = cache.make_and_validate_key(hash_filter_key(community_id))
+    _get_redis_client().set(key, bytes(header))
+
+
+def record_hash_filter_result(skipped: int, positives: int, found: int):
+    """
+    Count the hashes that have been skipped as definitely not claimed, the hashes
+    that might have been claimed (and have been looked up), and the false positives
+    among them (looked up, but not found)
+    """
+    counts = {
+        HASH_FILTER_SKIPPED_KEY: skipped,
+        HASH_FILTER_POSITIVES_KEY: positives,
+        HASH_FILTER_FALSE_POSITIVES_KEY: positives - found,
+    }
+    counts = {key: count for key, count in counts.items() if count}
+    if not counts:
+        return
+
+    try:
+        # A single round trip: the counters are plain integers, which the cache
+        # reads back as such (see `get_hash_filter_stats`)
+        keys = {key: cache.make_and_validate_key(key) for key in counts}
+        pipeline = _get_redis_client().pipeline(transaction=False)
+        for key, count in counts.items():
+            pipeline.incrby(keys[key], count)
+        pipeline.execute()
+    except Exception:
+        log.error("Failed to record the hash filter result", exc_info=True)
+
+
+arecord_hash_filter_result = sync_to_async(record_hash_filter_result)
+
+
+def get_hash_filter_stats() -> dict:
+    counters = cache.get_many(
+        [
+            HASH_FILTER_SKIPPED_KEY,
+            HASH_FILTER_POSITIVES_KEY,
+            HASH_FILTER_FALSE_POSITIVES_KEY,
+        ]
+    )
+    skipped = counters.get(HASH_FILTER_SKIPPED_KEY, 0)
+    positives = counters.get(HASH_FILTER_POSITIVES_KEY, 0)
+    false_positives = counters.get(HASH_FILTER_FALSE_POSITIVES_KEY, 0)
+    # The negatives are the skipped hashes and the false positives
+    negatives = skipped + false_positives
+    return {
+        "skipped": skipped,
+        "positives": positives,
+        "false_positives": false_positives,
+        "false_positive_rate": false_positives / negatives if negatives else None,
+    }
+
+
+def reset_hash_filter_stats():
+    cache.delete_many(
+        [
+            HASH_FILTER_SKIPPED_KEY,
+            HASH_FILTER_POSITIVES_KEY,
+            HASH_FILTER_FALSE_POSITIVES_KEY,
+        ]
+    )
@@ -0,0 +1,202 @@
+"""
+Timing of the stages of the scoring pipeline (see `registry.atasks.ascore_passport`).
+
+When the `FF_STAGE_TIMING` flag is on, `collect_timings` collects, for each stage
+run within it, the elapsed time and the number & duration of the DB queries. The
+timings of each scoring are logged as structured fields (`stage_<name>_ms`,
+`stage_<name>_queries` and `stage_<name>_db_ms`), and the timings of a request are
+returned in its `Server-Timing` header, by the `server_timing_middleware` for the
+API and by the `aws_lambdas.utils` wrappers for the Lambdas.
+
+When the flag is off no timings are collected: `stage` returns a shared no-op
+context manager, and the query wrapper returns right away.
+"""
+
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Dict, Optional
+
+import api_logging as logging
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+from structlog.contextvars import bound_contextvars
+
+log = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+_timings: ContextVar[Optional["StageTimings"]] = ContextVar("timings", default=None)
+_disabled_stage = nullcontext()
+
+
+class StageTiming:
+    def __init__(self):
+        self.duration = 0.0
+        self.num_queries = 0
+        self.query_duration = 0.0
+
+    def add(self, other: "StageTiming"):
+        self.duration += other.duration
+        self.num_queries += other.num_queries
+        self.query_duration += other.query_duration
+
+
+class StageTimings:
+    """The timings of the stages, by name and in the order they were first run"""
+
+    def __init__(self):
+        self.stages: Dict[str, StageTiming] = {}
+        self.current: Optional[StageTiming] = None
+
+    def get_stage(self, name: str) -> StageTiming:
+        if name not in self.stages:
+            self.stages[name] = StageTiming()
+        return self.stages[name]
+
+    def add(self, other: "StageTimings"):
+        for name, timing in other.stages.items():
+            self.get_stage(name).add(timing)
+
+    def as_log_fields(self) -> dict:
+        fields = {}
+        for name, timing in self.stages.items():
+            fields[f"stage_{name}_ms"] = round(timing.duration * 1000, 3)
+            fields[f"stage_{name}_queries"] = timing.num_queries
+            fields[f"stage_{name}_db_ms"] = round(timing.query_duration * 1000, 3)
+        return fields
+
+    def server_timing(self) -> str:
+        """The value of the `Server-Timing` header"""
+        return ", ".join(
+            f'{name};dur={timing.duration * 1000:.3f};desc="{timing.num_queries} '
+            f'queries in {timing.query_duration * 1000:.3f}ms"'
+            for name, timing in self.stages.items()
+        )
+
+
+class _Stage:
+    def __init__(self, timings: StageTimings, name: str):
+        self.timings = timings
+        self.timing = StageTiming()
+        self.name = name
+
+    def __enter__(self):
+        self.previous = self.timings.current
+        self.timings.current = self.timing
+        self.start = perf_counter()
+        return self.timing
+
+    def __exit__(self, *exc_info):
+        self.timing.duration = perf_counter() - self.start
+        self.timings.current = self.previous
+        self.timings.get_stage(self.name).add(self.timing)
+
+
+def stage(name: str):
+    """Time the code run within the returned context manager as the `name` stage"""
+    timings = _timings.get()
+    if timings is None:
+        return _disabled_stage
+    return _Stage(timings, name)
+
+
+class collect_timings:
+    """
+    Collect the timings of the stages run within the block, in a new `StageTimings`
+    (or None if the `FF_STAGE_TIMING` flag is off). They are added to the
+    timings of the enclosing block, if any, when the block exits.
+    """
+
+    def __enter__(self) -> Optional[StageTimings]:
+        if settings.FF_STAGE_TIMING != "on":
+            self.token = None
+            return None
+        self.timings = StageTimings()
+        self.token = _timings.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        if self.token is not None:
+            _timings.reset(self.token)
+            parent = _timings.get()
+            if parent is not None:
+                parent.add(self.timings)
+
+
+def log_stage_timings(func):
+    """Collect and log the timings of the stages of the decorated coroutine"""
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with collect_timings() as timings:
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                if timings is not None:
+                    with bound_contextvars(**timings.as_log_fields()):
+                        log.info(
+                            "%s stage timings: %s",
+                            func.__name__,
+                            timings.server_timing(),
+                        )
+
+    return wrapper
+
+
+def get_server_timing_header(timings: Optional[StageTimings]) -> Optional[str]:
+    if timings is None or not timings.stages:
+        return None
+    return timings.server_timing()
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding the queries to the current stage"""
+    timings = _timings.get()
+    if timings is None or timings.current is None:
+        return execute(sql, params, many, context)
+    timing = timings.current
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.num_queries += 1
+        timing.query_duration += perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # The signal is sent again when the connection is re-opened
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Return the timings of the stages run by the request in its `Server-Timing`"""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            with collect_timings() as timings:
+                response = await get_response(request)
+            header = get_server_timing_header(timings)
+            if header:
+                response[SERVER_TIMING_HEADER] = header
+            return response
+
+    else:
+
+        def middleware(request):
+            with collect_timings() as timings:
+                response = get_response(request)
+            header = get_server_timing_header(timings)
+            if header:
+                response[SERVER_TIMING_HEADER] = header
+            return response
+
+    return middleware
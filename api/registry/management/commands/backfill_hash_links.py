@@ -2,6 +2,7 @@ from tqdm import tqdm
 from datetime import datetime, timezone
 
 from django.core.management.base import BaseCommand
+from registry.hash_filter import add_hashes
 from registry.models import Stamp, HashScorerLink
 
 
@@ -62,6 +63,13 @@ class Command(BaseCommand):
                         HashScorerLink.objects.using("default").bulk_create(
                             hash_links, ignore_conflicts=True
                         )
+                        hashes_by_community = {}
+                        for hash_link in hash_links:
+                            hashes_by_community.setdefault(
+                                hash_link.community.pk, []
+                            ).append(hash_link.hash)
+                        for community_id, hashes in hashes_by_community.items():
+                            add_hashes(community_id, hashes)
                         progress_bar.update(len(objects))
                     else:
                         has_more = False
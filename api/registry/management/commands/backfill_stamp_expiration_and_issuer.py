@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from registry.models import Stamp
+
+
+class Command(BaseCommand):
+    help = "Backfills the expiration_date and issuer of the stamps from the credential"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="""Number of stamp ids updated per statement""",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_stamp = Stamp.objects.order_by("-id").only("id").first()
+        max_id = last_stamp.id if last_stamp else 0
+        current_id = 0
+
+        while current_id < max_id:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE registry_stamp
+                    SET
+                        expiration_date = (credential->>'expirationDate')::timestamptz,
+                        issuer = credential->>'issuer'
+                    WHERE
+                        id > %s
+                        AND id <= %s
+                        AND expiration_date IS NULL
+                """,
+                    [current_id, current_id + batch_size],
+                )
+
+            current_id += batch_size
+            self.stdout.write(f"Processed up to id {current_id}")
+
+        self.stdout.write(self.style.SUCCESS("Data backfill completed successfully"))
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import didkit
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reader.passport_reader import get_did
+from registry.atasks import avalidate_credentials
+from registry.models import Passport
+
+ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the verification of the stamps of a passport (p50/p99 against the number of stamps)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stamps",
+            type=str,
+            default="1,10,20,40,80",
+            help="Comma separated list of the number of stamps per passport",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=str,
+            default=f"1,{settings.CREDENTIAL_VERIFICATION_CONCURRENCY}",
+            help="Comma separated list of CREDENTIAL_VERIFICATION_CONCURRENCY values to compare",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=50,
+            help="Number of times each passport is verified",
+        )
+
+    def handle(self, *args, **options):
+        # The per stamp debug logs would dominate the timings
+        logging.getLogger("registry.atasks").setLevel(logging.INFO)
+        asyncio.run(self.abenchmark(options))
+
+    async def abenchmark(self, options):
+        stamp_counts = [int(n) for n in options["stamps"].split(",")]
+        concurrencies = [int(n) for n in options["concurrency"].split(",")]
+
+        key = didkit.generate_ed25519_key()
+        issuer = didkit.key_to_did("key", key)
+        stamps = await self.aissue_stamps(key, issuer, max(stamp_counts))
+        passport = Passport(address=ADDRESS)
+
+        original_issuers = settings.TRUSTED_IAM_ISSUERS
+        original_concurrency = settings.CREDENTIAL_VERIFICATION_CONCURRENCY
+        settings.TRUSTED_IAM_ISSUERS = [issuer]
+        try:
+            self.stdout.write("concurrency  stamps  p50 (ms)  p99 (ms)")
+            for concurrency in concurrencies:
+                settings.CREDENTIAL_VERIFICATION_CONCURRENCY = concurrency
+                for num_stamps in stamp_counts:
+                    timings = await self.atime_verification(
+                        passport, stamps[:num_stamps], options["runs"]
+                    )
+                    self.stdout.write(
+                        f"{concurrency:>11}  {num_stamps:>6}  {percentile(timings, 50):>8.1f}  {percentile(timings, 99):>8.1f}"
+                    )
+        finally:
+            settings.TRUSTED_IAM_ISSUERS = original_issuers
+            settings.CREDENTIAL_VERIFICATION_CONCURRENCY = original_concurrency
+
+    async def aissue_stamps(self, key, issuer, num_stamps):
+        verification_method = await didkit.key_to_verification_method("key", key)
+        options = json.dumps(
+            {
+                "proofPurpose": "assertionMethod",
+                "verificationMethod": verification_method,
+            }
+        )
+        now = datetime.now(timezone.utc)
+
+        async def aissue_stamp(idx):
+            credential = {
+                "type": ["VerifiableCredential"],
+                "issuer": issuer,
+                "@context": ["https://www.w3.org/2018/credentials/v1"],
+                "issuanceDate": now.isoformat(),
+                "expirationDate": (now + timedelta(days=90)).isoformat(),
+                "credentialSubject": {
+                    "@context": {
+                        "hash": "https://schema.org/Text",
+                        "provider": "https://schema.org/Text",
+                    },
+                    "id": get_did(ADDRESS),
+                    "hash": f"v0.0.0:benchmark-{idx}",
+                    "provider": f"Provider{idx}",
+                },
+            }
+            vc = await didkit.issue_credential(json.dumps(credential), options, key)
+            return {"provider": f"Provider{idx}", "credential": json.loads(vc)}
+
+        return await asyncio.gather(*[aissue_stamp(idx) for idx in range(num_stamps)])
+
+    async def atime_verification(self, passport, stamps, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            validated = await avalidate_credentials(passport, {"stamps": stamps})
+            timings.append((time.perf_counter() - start) * 1000)
+            assert len(validated["stamps"]) == len(stamps), "Verification failed"
+        return timings
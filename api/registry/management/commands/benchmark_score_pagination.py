@@ -0,0 +1,154 @@
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from account.models import Account, Community
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from registry.models import Passport, Score
+from registry.utils import get_cursor_page, get_cursor_query_condition
+from scorer_weighted.models import Scorer, WeightedScorer
+
+SORT_FIELDS = ["last_score_timestamp", "id"]
+
+
+class Rollback(Exception):
+    pass
+
+
+def expanded_cursor_condition(cursor, sort_fields):
+    """The `a > x OR (a >= x AND b > y)` condition the row value comparison replaced"""
+    strict, loose = ("gt", "gte") if cursor["d"] == "next" else ("lt", "lte")
+    condition = Q()
+    for i, field in enumerate(sort_fields):
+        condition_for_or = Q(**{f"{field}__{strict}": cursor[field]})
+        for previous_field in sort_fields[:i]:
+            condition_for_or &= Q(
+                **{f"{previous_field}__{loose}": cursor[previous_field]}
+            )
+        condition |= condition_for_or
+    return condition
+
+
+class Command(BaseCommand):
+    help = """
+    Measure the latency of the pages of the scores of a community (as read by the v2
+    `get_scores` API) at increasing depths, with the row value cursor condition &
+    `limit + 1` fetch, and with the OR-expanded condition & `exists()` probes they
+    replaced. All the data is created in a transaction that is rolled back.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=10_000_000, help="Number of scores"
+        )
+        parser.add_argument(
+            "--depths",
+            type=str,
+            default="0,0.1,0.5,0.9,0.999",
+            help="Comma separated list of the positions of the pages, as a fraction of the scores",
+        )
+        parser.add_argument("--limit", type=int, default=1000, help="Page size")
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Number of reads per page"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=10_000, help="Insert batch size"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                community = self.create_scores(options["rows"], options["batch_size"])
+                self.benchmark(
+                    community,
+                    options["rows"],
+                    [float(depth) for depth in options["depths"].split(",")],
+                    options["limit"],
+                    options["runs"],
+                )
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def create_scores(self, rows, batch_size):
+        user = get_user_model().objects.create(username="benchmark-pagination")
+        account = Account.objects.create(
+            user=user, address="0x0000000000000000000000000000000000000001"
+        )
+        community = Community.objects.create(
+            name="benchmark-pagination",
+            account=account,
+            scorer=WeightedScorer.objects.create(type=Scorer.Type.WEIGHTED),
+        )
+
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, rows, batch_size):
+            passports = Passport.objects.bulk_create(
+                Passport(address=f"0x{idx:040x}", community=community)
+                for idx in range(offset, min(offset + batch_size, rows))
+            )
+            Score.objects.bulk_create(
+                Score(
+                    passport=passport,
+                    score=1,
+                    status=Score.Status.DONE,
+                    # Groups of scores with the same timestamp, like bulk rescores
+                    last_score_timestamp=start + timedelta(seconds=idx // 10),
+                )
+                for idx, passport in enumerate(passports, start=offset)
+            )
+            self.stdout.write(f"created {offset + len(passports)} scores", ending="\r")
+        self.stdout.write("")
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE registry_score, registry_passport")
+
+        return community
+
+    def benchmark(self, community, rows, depths, limit, runs):
+        base_query = Score.objects.filter(
+            passport__community_id=community.id
+        ).select_related("passport")
+
+        self.stdout.write("     depth  row value (ms)  OR + exists (ms)")
+        for depth in depths:
+            position = min(int(rows * depth), rows - 1)
+            record = base_query.order_by(*SORT_FIELDS).values(*SORT_FIELDS)[position]
+            cursor = dict(d="next", **record)
+
+            def read_row_value_page():
+                condition, ordering = get_cursor_query_condition(cursor, SORT_FIELDS)
+                query = base_query.filter(condition).order_by(*ordering)
+                get_cursor_page(query, cursor, limit)
+
+            def read_expanded_page():
+                condition = expanded_cursor_condition(cursor, SORT_FIELDS)
+                page = list(base_query.filter(condition).order_by(*SORT_FIELDS)[:limit])
+                # The probes for the next & previous pages
+                if page:
+                    for direction, score in [("next", page[-1]), ("prev", page[0])]:
+                        probe_cursor = dict(
+                            d=direction,
+                            last_score_timestamp=score.last_score_timestamp,
+                            id=score.id,
+                        )
+                        base_query.filter(
+                            expanded_cursor_condition(probe_cursor, SORT_FIELDS)
+                        ).exists()
+
+            self.stdout.write(
+                f"{depth:>10}  {self.measure(read_row_value_page, runs):>14.1f}"
+                f"  {self.measure(read_expanded_page, runs):>16.1f}"
+            )
+
+    def measure(self, read_page, runs):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            read_page()
+            durations.append(time.perf_counter() - start)
+        return statistics.median(durations) * 1000
@@ -0,0 +1,129 @@
+import logging
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from account.models import Account, Community
+from asgiref.sync import async_to_sync
+from ceramic_cache.models import CeramicCache
+from ceramic_cache.utils import trusted_issuers_version
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reader.passport_reader import get_did
+from registry.atasks import ascore_passport
+from registry.models import Passport, Score
+from scorer_weighted.models import Scorer, WeightedScorer
+
+ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = """
+    Measure the memory allocated when scoring a passport (load, validate, deduplicate,
+    save and score). All the data is created in a transaction that is rolled back.
+    The stamps are marked as verified on write, so that didkit is not part of the measurement.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stamps",
+            type=str,
+            default="10,40,80",
+            help="Comma separated list of the number of stamps per passport",
+        )
+        parser.add_argument(
+            "--credential-size",
+            type=int,
+            default=4096,
+            help="Approximate size of each credential, in bytes",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Number of submits per passport"
+        )
+
+    def handle(self, *args, **options):
+        # The debug logs would format every credential
+        logging.disable(logging.DEBUG)
+        self.stdout.write("stamps  passport (KiB)  peak allocated (KiB)")
+        for num_stamps in [int(n) for n in options["stamps"].split(",")]:
+            try:
+                with transaction.atomic():
+                    self.benchmark(
+                        num_stamps, options["credential_size"], options["runs"]
+                    )
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def benchmark(self, num_stamps, credential_size, runs):
+        user = get_user_model().objects.create(username="benchmark-submit")
+        account = Account.objects.create(user=user, address=ADDRESS)
+        community = Community.objects.create(
+            name="benchmark-submit",
+            account=account,
+            scorer=WeightedScorer.objects.create(
+                type=Scorer.Type.WEIGHTED,
+                weights={f"Provider{idx}": "1" for idx in range(num_stamps)},
+            ),
+        )
+        passport = Passport.objects.create(address=ADDRESS, community=community)
+
+        now = datetime.now(timezone.utc)
+        stamps = [
+            CeramicCache(
+                address=ADDRESS,
+                provider=f"Provider{idx}",
+                stamp={
+                    "type": ["VerifiableCredential"],
+                    "issuer": settings.TRUSTED_IAM_ISSUERS[0],
+                    "issuanceDate": now.isoformat(),
+                    "expirationDate": (now + timedelta(days=90)).isoformat(),
+                    "credentialSubject": {
+                        "id": get_did(ADDRESS),
+                        "hash": f"v0.0.0:benchmark-{idx}",
+                        "provider": f"Provider{idx}",
+                    },
+                    "proof": {
+                        "proofValue": f"0xbenchmark{idx}",
+                        # Like the EIP712 types in the proof of the IAM stamps,
+                        # about 40 bytes of JSON per type
+                        "eip712Domain": {
+                            "types": {
+                                "Credential": [
+                                    {"name": f"field{i}", "type": "string"}
+                                    for i in range(credential_size // 40)
+                                ]
+                            }
+                        },
+                    },
+                },
+                proof_value=f"0xbenchmark{idx}",
+                verification_status=CeramicCache.VerificationStatus.VALID,
+                verified_at=now,
+                verified_issuers=trusted_issuers_version(),
+            )
+            for idx in range(num_stamps)
+        ]
+        CeramicCache.objects.bulk_create(stamps)
+
+        peaks = []
+        for _ in range(runs):
+            # A new score, so that the submit is not skipped as unchanged
+            score = Score(passport=passport, status=Score.Status.PROCESSING)
+            tracemalloc.start()
+            async_to_sync(ascore_passport)(community, passport, ADDRESS, score)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if score.status != Score.Status.DONE:
+                raise Exception(f"Scoring failed: {score.error}")
+            peaks.append(peak)
+
+        passport_size = num_stamps * credential_size
+        self.stdout.write(
+            f"{num_stamps:>6}  {passport_size / 1024:>14.0f}  {min(peaks) / 1024:>20.0f}"
+        )
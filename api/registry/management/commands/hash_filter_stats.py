@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from registry.hash_filter import get_hash_filter_stats, reset_hash_filter_stats
+
+
+class Command(BaseCommand):
+    help = "Show how many hash link lookups have been skipped thanks to the hash filters, and their false positive rate"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_hash_filter_stats()
+        false_positive_rate = (
+            f"{stats['false_positive_rate']:.2%}"
+            if stats["false_positive_rate"] is not None
+            else "n/a"
+        )
+        self.stdout.write(
+            f"skipped: {stats['skipped']}, looked up: {stats['positives']}, false positives: {stats['false_positives']}, false positive rate: {false_positive_rate}"
+        )
+
+        if options["reset"]:
+            reset_hash_filter_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from registry.fingerprint import get_fingerprint_stats, reset_fingerprint_stats
+
+
+class Command(BaseCommand):
+    help = "Show how often a passport submission was skipped because the passport had not changed since it was last scored"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_fingerprint_stats()
+        hit_ratio = (
+            f"{stats['hit_ratio']:.2%}" if stats["hit_ratio"] is not None else "n/a"
+        )
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {hit_ratio}"
+        )
+
+        if options["reset"]:
+            reset_fingerprint_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,84 @@
+from account.models import Community
+from django.core.management.base import BaseCommand
+from registry.hash_filter import (
+    bit_offsets,
+    filter_bits,
+    get_filter_bits,
+    merge_bitmap,
+    new_bitmap,
+    reset_hash_filter,
+    set_bits,
+)
+from registry.models import HashScorerLink
+from tqdm import tqdm
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Bloom filters of the stamp hashes claimed in each community from the hash link table, resized for their number of hash links"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--community-id",
+            type=int,
+            required=False,
+            help="Only rebuild the filter of this community (defaults to all communities)",
+        )
+        parser.add_argument(
+            "--headroom",
+            type=float,
+            default=2.0,
+            help="Size the filters for this many times the current number of hash links of their community, so that they can grow",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Clear the filters before rebuilding them (e.g. after many hash links have been deleted)",
+        )
+
+    def handle(self, *args, **options):
+        communities = Community.objects.order_by("id")
+        if options["community_id"]:
+            communities = communities.filter(id=options["community_id"])
+        community_ids = list(communities.values_list("id", flat=True))
+
+        chunk_size = 10000
+        with tqdm(
+            unit="items", unit_scale=None, desc="Processing hash links"
+        ) as progress_bar:
+            for community_id in community_ids:
+                query = (
+                    HashScorerLink.objects.using("read_replica_0")
+                    .filter(community_id=community_id)
+                    .order_by("id")
+                    .values_list("id", "hash")
+                )
+                num_bits = filter_bits(int(query.count() * options["headroom"]))
+                if options["reset"] or get_filter_bits(community_id) != num_bits:
+                    reset_hash_filter(community_id, num_bits)
+
+                # Hash links written while the filter is being rebuilt are added
+                # to it by the writers, so the filter is only flagged as complete
+                # once all the existing hash links have been merged
+                last_id = 0
+                num_hashes = 0
+                bitmap = new_bitmap(num_bits)
+                has_more = True
+                while has_more:
+                    rows = list(query.filter(id__gt=last_id)[:chunk_size])
+                    if rows:
+                        last_id = rows[-1][0]
+                        for _, hash in rows:
+                            set_bits(bitmap, bit_offsets(hash, num_bits))
+                        num_hashes += len(rows)
+                        progress_bar.update(len(rows))
+                    else:
+                        has_more = False
+
+                merge_bitmap(community_id, bitmap, complete=True)
+                self.stdout.write(
+                    f"Community {community_id}: {num_hashes} hash links, {num_bits} bits"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(community_ids)} hash filters")
+        )
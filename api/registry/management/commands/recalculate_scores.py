@@ -1,13 +1,35 @@
 import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
 
 from account.models import Community
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db.models import QuerySet
-from registry.models import Passport, Score, Stamp
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import QuerySet, Sum
+from registry.models import Passport, Score
 from registry.utils import get_utc_time
-from scorer_weighted.models import BinaryWeightedScorer, RescoreRequest, WeightedScorer
+from scorer_weighted.computation import scoring_stamps_query
+from scorer_weighted.models import (
+    BinaryWeightedScorer,
+    RescoreRange,
+    RescoreRequest,
+    WeightedScorer,
+)
+from scorer_weighted.rescore_diff import diff_community_scores, write_rescore_diffs
+from scorer_weighted.sql_computation import sql_rescore_passports
+from scorer_weighted.weight_diff import RescorePlan, plan_weight_changes
+from scorer_weighted.weight_table import bump_weights_version, get_weight_table
+
+DEFAULT_RANGE_SIZE = 10000
+
+PYTHON_ENGINE = "python"
+SQL_ENGINE = "sql"
 
 
 class Command(BaseCommand):
@@ -33,6 +55,59 @@ class Command(BaseCommand):
             default=1000,
             help="""Batch size for recoring""",
         )
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=DEFAULT_RANGE_SIZE,
+            help="""Number of passports per range, the unit of work that is checkpointed and distributed to the workers""",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="""Number of worker processes rescoring the ranges in parallel""",
+        )
+        parser.add_argument(
+            "--engine",
+            type=str,
+            default=PYTHON_ENGINE,
+            choices=[PYTHON_ENGINE, SQL_ENGINE],
+            help="""Scoring engine: "python" loads the stamps and scores them in batches, "sql" scores each range with a single statement inside the DB""",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            default=None,
+            help="""ID of a rescore request to resume: only its unfinished ranges are rescored, from their last checkpoint""",
+        )
+        parser.add_argument(
+            "--plan",
+            action="store_true",
+            help="""Only print the passports affected by the new weights in each community (including the unscored passports, and those whose last scoring failed or did not finish), without updating anything""",
+        )
+        parser.add_argument(
+            "--dry-run-diff",
+            action="store_true",
+            help="""Score the affected passports with the new weights without writing anything, and write the score changes of each community to Parquet files""",
+        )
+        parser.add_argument(
+            "--diff-output",
+            type=str,
+            default="rescore_diff",
+            help="""Prefix of the Parquet files written by --dry-run-diff: <prefix>_summary.parquet, <prefix>_histograms.parquet and <prefix>_providers.parquet""",
+        )
+        parser.add_argument(
+            "--diff-bin-width",
+            type=Decimal,
+            default=Decimal(1),
+            help="""Width of the bins of the score histograms written by --dry-run-diff""",
+        )
+        parser.add_argument(
+            "--diff-top-providers",
+            type=int,
+            default=10,
+            help="""Number of providers driving the score changes written by --dry-run-diff for each community""",
+        )
         parser.add_argument(
             "--only-weights",
             type=bool,
@@ -58,6 +133,20 @@ class Command(BaseCommand):
 
         batch_size = kwargs["batch_size"]
 
+        if kwargs["resume"]:
+            try:
+                rescore_request = RescoreRequest.objects.get(pk=kwargs["resume"])
+            except RescoreRequest.DoesNotExist:
+                raise CommandError(f"Rescore request {kwargs['resume']} not found")
+            self.stdout.write(f"Resuming {rescore_request}")
+            return run_rescore_request(
+                rescore_request,
+                batch_size,
+                self.stdout,
+                kwargs["workers"],
+                engine=kwargs["engine"],
+            )
+
         communities = (
             Community.objects.filter(**filter)
             .exclude(**exclude)
@@ -65,6 +154,19 @@ class Command(BaseCommand):
             .exclude(scorer__binaryweightedscorer__exclude_from_weight_updates=True)
         )
 
+        # Compare the current weights to the new ones, to only rescore the affected passports
+        plans = plan_weight_changes(
+            communities,
+            settings.GITCOIN_PASSPORT_WEIGHTS,
+            settings.GITCOIN_PASSPORT_THRESHOLD,
+        )
+        if kwargs["plan"]:
+            self.print_plans(communities, plans)
+            return
+        if kwargs["dry_run_diff"]:
+            self.diff_scores(communities, plans, batch_size, kwargs)
+            return
+
         self.stdout.write(f"Updating communities: {list(communities)}")
 
         # Update Score weights
@@ -75,7 +177,54 @@ class Command(BaseCommand):
 
         self.stdout.write("Recalculating scores")
 
-        return recalculate_scores(communities, batch_size, self.stdout)
+        recalculate_scores(
+            communities,
+            batch_size,
+            self.stdout,
+            workers=kwargs["workers"],
+            range_size=kwargs["range_size"],
+            plans=plans,
+            engine=kwargs["engine"],
+        )
+
+    def print_plans(self, communities, plans):
+        total_affected = 0
+        for community in communities:
+            plan = plans[community.id]
+            affected = plan.affected_passports(community.id).count()
+            total = Passport.objects.filter(community=community).count()
+            total_affected += affected
+            threshold = (
+                f", threshold: {plan.old_threshold} -> {plan.new_threshold}"
+                if plan.threshold_changed
+                else ""
+            )
+            self.stdout.write(
+                f"Community {community.id} ({community.name}): {affected} of {total} passports affected, changed providers: {plan.changed_providers}{threshold}"
+            )
+        self.stdout.write(f"Passports to rescore: {total_affected}")
+
+    def diff_scores(self, communities, plans, batch_size, kwargs):
+        diffs = (
+            diff_community_scores(
+                community,
+                plans[community.id],
+                settings.GITCOIN_PASSPORT_WEIGHTS,
+                settings.GITCOIN_PASSPORT_THRESHOLD,
+                batch_size,
+                bin_width=kwargs["diff_bin_width"],
+                using="read_replica_0",
+            )
+            for community in communities
+        )
+        summaries = write_rescore_diffs(
+            kwargs["diff_output"], diffs, kwargs["diff_top_providers"]
+        )
+        for summary in summaries:
+            self.stdout.write(
+                f"Community {summary['community_id']}: {summary['num_changed']} of {summary['num_passports']} affected passports would change ({summary['num_increased']} up, {summary['num_decreased']} down, {summary['num_new']} new), {summary['num_pass_gained']} would pass, {summary['num_pass_lost']} would fail"
+            )
+        self.stdout.write(f"Score changes written to {kwargs['diff_output']}_*.parquet")
 
     def update_scorers(self, communities: QuerySet[Community]):
         weights = settings.GITCOIN_PASSPORT_WEIGHTS
@@ -88,118 +237,356 @@ class Command(BaseCommand):
 
         weighted_scorers.update(weights=weights)
         binary_weighted_scorers.update(weights=weights, threshold=threshold)
+        # `update` does not send the post_save signals, so invalidate the cached weights here
+        bump_weights_version(
+            scorer_ids=list(weighted_scorers.values_list("pk", flat=True))
+            + list(binary_weighted_scorers.values_list("pk", flat=True))
+        )
         print(
             "Updated scorers:",
             weighted_scorers.count() + binary_weighted_scorers.count(),
         )
 
 
-def recalculate_scores(communities, batch_size, outstream):
-    count = 0
-    start = datetime.now()
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
 
-    rescore_request = RescoreRequest.objects.create(
-        num_communities_requested=len(communities)
+
+def plan_rescore_ranges(
+    rescore_request: RescoreRequest,
+    communities,
+    range_size: int,
+    plans: Optional[Dict[int, RescorePlan]] = None,
+) -> List[RescoreRange]:
+    """
+    Split the passports of each community into ranges of `range_size` passport ids.
+    The last range of a community is open ended, so that it also includes the
+    passports created while rescoring.
+
+    If `plans` are given, only the passports affected by the weight change are
+    rescored in each range.
+    """
+    ranges = []
+    for community in communities:
+        plan = plans[community.id].as_dict() if plans else None
+        start_id = 0
+        passport_ids = (
+            Passport.objects.filter(community=community)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=range_size)
+        )
+        for idx, passport_id in enumerate(passport_ids, start=1):
+            if idx % range_size == 0:
+                ranges.append(
+                    RescoreRange(
+                        rescore_request=rescore_request,
+                        community=community,
+                        start_id=start_id,
+                        end_id=passport_id,
+                        last_id=start_id,
+                        plan=plan,
+                    )
+                )
+                start_id = passport_id
+        ranges.append(
+            RescoreRange(
+                rescore_request=rescore_request,
+                community=community,
+                start_id=start_id,
+                end_id=None,
+                last_id=start_id,
+                plan=plan,
+            )
+        )
+    return RescoreRange.objects.bulk_create(ranges)
+
+
+def rescore_passports(scorer, community, passports) -> None:
+    # Read once, so that the scores are stored with the version of the weights
+    # they were calculated with
+    weight_table = get_weight_table(scorer, community.id)
+    passport_ids = [p.id for p in passports]
+    stamp_query = scoring_stamps_query(passport_ids)
+    stamps = {}
+    for s in stamp_query:
+        if s.passport_id not in stamps:
+            stamps[s.passport_id] = []
+        stamps[s.passport_id].append(s)
+    calculated_scores = scorer.recompute_score(
+        passport_ids, stamps, community.id, weight_table
     )
-    rescore_request.save()
+    scores_to_update = []
+    scores_to_create = []
+
+    for p, scoreData in zip(passports, calculated_scores):
+        passport_scores = list(p.score.all())
+        if passport_scores:
+            score = passport_scores[0]
+            scores_to_update.append(score)
+        else:
+            score = Score(
+                passport=p,
+            )
+            scores_to_create.append(score)
+
+        score.score = scoreData.score
+        score.status = Score.Status.DONE
+        score.last_score_timestamp = get_utc_time()
+        score.evidence = scoreData.evidence[0].as_dict() if scoreData.evidence else None
+        score.error = None
+        score.stamp_scores = scoreData.stamp_scores
+        score.expiration_date = scoreData.expiration_date
+        score.weights_version = weight_table.version
+        # The fingerprint covers the passport data as loaded on submission (see
+        # `registry.fingerprint`), it is computed again on the next submission
+        score.fingerprint = None
+
+    if scores_to_create:
+        Score.objects.bulk_create(scores_to_create)
+
+    if scores_to_update:
+        Score.objects.bulk_update(
+            scores_to_update,
+            [
+                "score",
+                "status",
+                "last_score_timestamp",
+                "evidence",
+                "error",
+                "stamp_scores",
+                "expiration_date",
+                "weights_version",
+                "fingerprint",
+            ],
+        )
+
+
+def update_rescore_request_progress(rescore_request_id: int) -> RescoreRequest:
+    """
+    Update the number of communities processed and the status of the request from
+    the status of its ranges. The request is locked, so that the last range to
+    finish always sees the others as finished.
+    """
+    with transaction.atomic():
+        rescore_request = RescoreRequest.objects.select_for_update().get(
+            pk=rescore_request_id
+        )
+        ranges = RescoreRange.objects.filter(rescore_request=rescore_request)
+        unfinished = ranges.exclude(status=RescoreRange.Status.SUCCESS)
+        rescore_request.num_communities_processed = (
+            ranges.values("community_id").distinct().count()
+            - unfinished.values("community_id").distinct().count()
+        )
+        if unfinished.filter(status=RescoreRange.Status.FAILED).exists():
+            rescore_request.status = RescoreRequest.Status.FAILED
+        elif not unfinished.exists():
+            rescore_request.status = RescoreRequest.Status.SUCCESS
+        else:
+            rescore_request.status = RescoreRequest.Status.RUNNING
+        rescore_request.save()
+    return rescore_request
+
 
+def get_range_passports(rescore_range: RescoreRange) -> QuerySet[Passport]:
+    """The passports of the range still to be rescored, after the last checkpoint"""
+    passport_query = Passport.objects.filter(
+        community_id=rescore_range.community_id, id__gt=rescore_range.last_id
+    )
+    if rescore_range.end_id is not None:
+        passport_query = passport_query.filter(id__lte=rescore_range.end_id)
+    if rescore_range.plan is not None:
+        passport_query = passport_query.filter(
+            RescorePlan.from_dict(rescore_range.plan).affected_passports_filter(
+                rescore_range.community_id
+            )
+        )
+    return passport_query
+
+
+def rescore_range(
+    rescore_range_id: int, batch_size: int, engine: str = PYTHON_ENGINE
+) -> RescoreRange:
+    """
+    Rescore the passports of the range, starting after the last checkpoint. The
+    checkpoint is saved after each batch, or once for the whole range with the SQL
+    engine (see `scorer_weighted.sql_computation`).
+    """
+    rescore_range = RescoreRange.objects.select_related("community").get(
+        pk=rescore_range_id
+    )
+    if rescore_range.status == RescoreRange.Status.SUCCESS:
+        return rescore_range
+
+    community = rescore_range.community
+    scorer = community.get_scorer()
+    rescore_range.status = RescoreRange.Status.RUNNING
+    rescore_range.worker = get_worker_name()
+    rescore_range.save()
+
+    start = time.perf_counter()
+    elapsed_seconds = rescore_range.elapsed_seconds
     try:
-        for idx, community in enumerate(communities):
-            # Reset has_more and last_id for each community
+        if engine == SQL_ENGINE:
+            rescore_range.num_passports_processed += sql_rescore_passports(
+                scorer, community.id, get_range_passports(rescore_range)
+            )
+            if rescore_range.end_id is not None:
+                rescore_range.last_id = rescore_range.end_id
+            has_more = False
+        else:
             has_more = True
-            last_id = 0
-            scorer = community.get_scorer()
-            outstream.write(
-                f"""
-Community:{community}
-scorer type: {scorer.type}, {type(scorer)}"""
+        while has_more:
+            passport_query = (
+                get_range_passports(rescore_range)
+                .order_by("id")
+                .prefetch_related("score")
             )
-
-            while has_more:
-                outstream.write(
-                    f"has more: {has_more} / last id: {last_id} / count: {count}"
+            passports = list(passport_query[:batch_size])
+            has_more = len(passports) > 0
+            if has_more:
+                rescore_passports(scorer, community, passports)
+                rescore_range.last_id = passports[-1].id
+                rescore_range.num_passports_processed += len(passports)
+                rescore_range.elapsed_seconds = elapsed_seconds + (
+                    time.perf_counter() - start
                 )
-                passport_query = Passport.objects.order_by("id").select_related("score")
-                if last_id:
-                    passport_query = passport_query.filter(id__gt=last_id)
-                passport_query = passport_query.filter(community=community)
-                passports = list(passport_query[:batch_size].iterator())
-                passport_ids = [p.id for p in passports]
-                count += len(passports)
-                has_more = len(passports) > 0
-                if len(passports) > 0:
-                    last_id = passport_ids[-1]
-                    stamp_query = Stamp.objects.filter(passport_id__in=passport_ids)
-                    stamps = {}
-                    for s in stamp_query:
-                        if s.passport_id not in stamps:
-                            stamps[s.passport_id] = []
-                        stamps[s.passport_id].append(s)
-                    calculated_scores = scorer.recompute_score(
-                        passport_ids, stamps, community.id
-                    )
-                    scores_to_update = []
-                    scores_to_create = []
-
-                    for p, scoreData in zip(passports, calculated_scores):
-                        passport_scores = list(p.score.all())
-                        if passport_scores:
-                            score = passport_scores[0]
-                            scores_to_update.append(score)
-                        else:
-                            score = Score(
-                                passport=p,
-                            )
-                            scores_to_create.append(score)
-
-                        score.score = scoreData.score
-                        score.status = Score.Status.DONE
-                        score.last_score_timestamp = get_utc_time()
-                        score.evidence = (
-                            scoreData.evidence[0].as_dict()
-                            if scoreData.evidence
-                            else None
-                        )
-                        score.error = None
-                        score.stamp_scores = scoreData.stamp_scores
-
-                    if scores_to_create:
-                        Score.objects.bulk_create(scores_to_create)
-
-                    if scores_to_update:
-                        Score.objects.bulk_update(
-                            scores_to_update,
-                            [
-                                "score",
-                                "status",
-                                "last_score_timestamp",
-                                "evidence",
-                                "error",
-                                "stamp_scores",
-                            ],
-                        )
-
-                elapsed = datetime.now() - start
-                rate = "-"
-                if count > 0:
-                    rate = elapsed / count
-
-                outstream.write(
-                    f"""
-Community id: {community}
-Elapsed: {elapsed}
-Count: {count}
-Rate: {rate}
-"""
-                )
-            rescore_request.num_communities_processed = idx + 1
-            rescore_request.save()
+                rescore_range.save()
+    except Exception:
+        rescore_range.status = RescoreRange.Status.FAILED
+        rescore_range.elapsed_seconds = elapsed_seconds + (time.perf_counter() - start)
+        rescore_range.save()
+        update_rescore_request_progress(rescore_range.rescore_request_id)
+        raise
 
-    except Exception as e:
-        rescore_request.status = RescoreRequest.Status.FAILED
-        rescore_request.save()
+    rescore_range.status = RescoreRange.Status.SUCCESS
+    rescore_range.elapsed_seconds = elapsed_seconds + (time.perf_counter() - start)
+    rescore_range.save()
+    update_rescore_request_progress(rescore_range.rescore_request_id)
+    return rescore_range
+
+
+def rescore_range_in_worker(
+    rescore_range_id: int, batch_size: int, engine: str = PYTHON_ENGINE
+) -> int:
+    rescore_range(rescore_range_id, batch_size, engine)
+    return rescore_range_id
+
+
+def get_worker_throughput(rescore_request: RescoreRequest) -> List[dict]:
+    """The number of passports rescored per second by each worker"""
+    workers = (
+        RescoreRange.objects.filter(rescore_request=rescore_request)
+        .exclude(worker="")
+        .values("worker")
+        .annotate(
+            num_passports=Sum("num_passports_processed"),
+            elapsed_seconds=Sum("elapsed_seconds"),
+        )
+        .order_by("worker")
+    )
+    return [
+        {
+            **worker,
+            "passports_per_second": (
+                worker["num_passports"] / worker["elapsed_seconds"]
+                if worker["elapsed_seconds"]
+                else None
+            ),
+        }
+        for worker in workers
+    ]
 
-        raise e
 
-    rescore_request.status = RescoreRequest.Status.SUCCESS
+def run_rescore_request(
+    rescore_request: RescoreRequest,
+    batch_size: int,
+    outstream,
+    workers: int = 1,
+    dispatch_ranges: Optional[Callable[[List[int]], None]] = None,
+    engine: str = PYTHON_ENGINE,
+):
+    """
+    Rescore the ranges of the request that have not been finished yet, either in
+    this process, across a pool of `workers` processes, or by handing them over to
+    `dispatch_ranges` (e.g. to send them to a queue).
+    """
+    range_ids = list(
+        RescoreRange.objects.filter(rescore_request=rescore_request)
+        .exclude(status=RescoreRange.Status.SUCCESS)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    outstream.write(
+        f"Rescore request {rescore_request.pk}: {len(range_ids)} ranges to rescore"
+    )
+    rescore_request.status = RescoreRequest.Status.RUNNING
     rescore_request.save()
+
+    if dispatch_ranges is not None:
+        dispatch_ranges(range_ids)
+        return
+
+    start = datetime.now()
+    errors = []
+    if workers > 1:
+        # The forked workers must not share the DB connections of this process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(rescore_range_in_worker, range_id, batch_size, engine)
+                for range_id in range_ids
+            ]
+            for future in as_completed(futures):
+                try:
+                    outstream.write(f"Rescored range {future.result()}")
+                except Exception as e:
+                    errors.append(e)
+    else:
+        for range_id in range_ids:
+            rescore_range(range_id, batch_size, engine)
+            outstream.write(f"Rescored range {range_id}")
+
+    rescore_request = update_rescore_request_progress(rescore_request.pk)
+    outstream.write(f"{rescore_request}, elapsed: {datetime.now() - start}")
+    for worker in get_worker_throughput(rescore_request):
+        rate = (
+            f"{worker['passports_per_second']:.1f} passports/s"
+            if worker["passports_per_second"] is not None
+            else "-"
+        )
+        outstream.write(
+            f"Worker {worker['worker']}: {worker['num_passports']} passports in {worker['elapsed_seconds']:.1f}s ({rate})"
+        )
+
+    if errors:
+        raise errors[0]
+
+
+def recalculate_scores(
+    communities,
+    batch_size,
+    outstream,
+    workers: int = 1,
+    range_size: int = DEFAULT_RANGE_SIZE,
+    dispatch_ranges: Optional[Callable[[List[int]], None]] = None,
+    plans: Optional[Dict[int, RescorePlan]] = None,
+    engine: str = PYTHON_ENGINE,
+) -> RescoreRequest:
+    rescore_request = RescoreRequest.objects.create(
+        num_communities_requested=len(communities)
+    )
+    try:
+        plan_rescore_ranges(rescore_request, communities, range_size, plans)
+        for community_id, plan in (plans or {}).items():
+            # The scores that are not rescored only need the new threshold
+            plan.update_evidence_threshold(community_id)
+    except Exception:
+        rescore_request.status = RescoreRequest.Status.FAILED
+        rescore_request.save()
+        raise
+
+    run_rescore_request(
+        rescore_request, batch_size, outstream, workers, dispatch_ranges, engine
+    )
+    return rescore_request
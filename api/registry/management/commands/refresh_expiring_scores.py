@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from registry.score_refresh import refresh_expiring_scores
+
+
+class Command(BaseCommand):
+    help = "Rescore in the background the scores that are about to expire, and report the lag between expiration and refresh"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=settings.SCORE_REFRESH_WINDOW,
+            help="Refresh the scores expiring within this number of seconds",
+        )
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            default=settings.SCORE_REFRESH_LOOKBACK,
+            help="Also refresh the scores that have expired within this number of seconds",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.SCORE_REFRESH_BATCH_SIZE,
+            help="Number of scores loaded per batch",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.SCORE_REFRESH_CONCURRENCY,
+            help="Number of scores refreshed concurrently",
+        )
+        parser.add_argument(
+            "--community-id",
+            type=int,
+            action="append",
+            help="Only refresh the scores of this community (can be repeated, defaults to all communities)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Max. number of scores refreshed in this run",
+        )
+
+    def handle(self, *args, **options):
+        report = refresh_expiring_scores(
+            window=timedelta(seconds=options["window"]),
+            lookback=timedelta(seconds=options["lookback"]),
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            community_ids=options["community_id"],
+            limit=options["limit"],
+        )
+        for name, value in report.as_dict().items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from registry.single_flight import get_single_flight_stats, reset_single_flight_stats
+
+
+class Command(BaseCommand):
+    help = "Show how many concurrent score requests were coalesced with the scoring of the same passport"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_single_flight_stats()
+        coalesced_ratio = (
+            f"{stats['coalesced_ratio']:.2%}"
+            if stats["coalesced_ratio"] is not None
+            else "n/a"
+        )
+        self.stdout.write(
+            f"leaders: {stats['leaders']}, "
+            f"coalesced locally: {stats['coalesced_local']}, "
+            f"coalesced remotely: {stats['coalesced_remote']}, "
+            f"fallbacks: {stats['fallbacks']}, "
+            f"coalesced ratio: {coalesced_ratio}"
+        )
+
+        if options["reset"]:
+            reset_single_flight_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
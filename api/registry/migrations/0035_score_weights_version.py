@@ -0,0 +1,24 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0034_batchmodelscoringrequest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="score",
+            name="weights_version",
+            field=models.CharField(
+                blank=True,
+                default=None,
+                help_text="Version of the weights (see `scorer_weighted.weight_table`) this score was calculated with. Used to decide if the score can be updated incrementally.",
+                max_length=100,
+                null=True,
+                serialize=False,
+            ),
+        ),
+    ]
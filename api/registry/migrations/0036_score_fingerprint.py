@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registry", "0035_score_weights_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="score",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                default=None,
+                help_text="Fingerprint of the stamps, weights and deduplication state (see `registry.fingerprint`) this score was calculated from. Used to skip rescoring unchanged passports.",
+                max_length=64,
+                null=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registry", "0036_score_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stamp",
+            name="expiration_date",
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stamp",
+            name="issuer",
+            field=models.CharField(db_index=True, max_length=256, null=True),
+        ),
+    ]
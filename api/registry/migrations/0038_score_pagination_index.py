@@ -0,0 +1,19 @@
+# Generated by Django 4.2.6 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("registry", "0037_stamp_expiration_date_issuer"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="score",
+            index=models.Index(
+                fields=["last_score_timestamp", "id"], name="score_pagination_index"
+            ),
+        ),
+    ]
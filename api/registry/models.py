@@ -35,6 +35,13 @@ class Stamp(models.Model):
         null=False, blank=False, default="", max_length=256, db_index=True
     )
     credential = models.JSONField(default=dict)
+    # Copied from the credential, so that scoring does not need to load it
+    expiration_date = models.DateTimeField(
+        null=True, db_index=True
+    )  # credential['expirationDate']
+    issuer = models.CharField(
+        null=True, max_length=256, db_index=True
+    )  # credential['issuer']
 
     def __str__(self):
         return f"Stamp #{self.id}, hash={self.hash}, provider={self.provider}, passport={self.passport_id}"
@@ -46,6 +53,13 @@ class Stamp(models.Model):
 class Score(models.Model):
     class Meta:
         permissions = [("rescore_individual_score", "Can rescore individual scores")]
+        indexes = [
+            # For the keyset pagination of the scores (see `get_cursor_query_condition`)
+            models.Index(
+                fields=["last_score_timestamp", "id"],
+                name="score_pagination_index",
+            ),
+        ]
 
     class Status:
         PROCESSING = "PROCESSING"
@@ -78,6 +92,26 @@ class Score(models.Model):
         default=None, null=True, blank=True, db_index=True
     )
 
+    weights_version = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        default=None,
+        # Internal bookkeeping, not part of the exported score data
+        serialize=False,
+        help_text="Version of the weights (see `scorer_weighted.weight_table`) this score was calculated with. Used to decide if the score can be updated incrementally.",
+    )
+
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        default=None,
+        # Internal bookkeeping, not part of the exported score data
+        serialize=False,
+        help_text="Fingerprint of the stamps, weights and deduplication state (see `registry.fingerprint`) this score was calculated from. Used to skip rescoring unchanged passports.",
+    )
+
     def __str__(self):
         return f"Score #{self.id}, score={self.score}, last_score_timestamp={self.last_score_timestamp}, status={self.status}, error={self.error}, evidence={self.evidence}, passport_id={self.passport_id}"
 
@@ -0,0 +1,148 @@
+"""
+Streaming export of all the scores of a community (see the v2 `a_export_scores` API).
+
+The scores are read from a server-side cursor in chunks of `SCORE_EXPORT_CHUNK_SIZE`
+rows, and each chunk is encoded and sent before the next one is read, so that the
+memory used does not depend on the number of scores:
+ - as gzip-compressed NDJSON, one `DetailedScoreResponse` per line, with the id
+   of the score (the `since_id` of the next incremental export)
+ - as Parquet, one row group per chunk. The JSON fields (`evidence` and
+   `stamp_scores`) are serialized to strings.
+"""
+
+import io
+import json
+import zlib
+from typing import AsyncIterator, List
+
+import pyarrow as pa
+from django.conf import settings
+from scorer.export_utils import parquet_writer
+
+# The fields of the `.values()` rows of the scores
+SCORE_VALUES_FIELDS = [
+    "id",
+    "passport__address",
+    "score",
+    "status",
+    "last_score_timestamp",
+    "expiration_date",
+    "evidence",
+    "error",
+    "stamp_scores",
+]
+
+SCORE_EXPORT_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("address", pa.string()),
+        ("score", pa.decimal256(18, 9)),
+        ("status", pa.string()),
+        ("last_score_timestamp", pa.timestamp("ms", tz="UTC")),
+        ("expiration_date", pa.timestamp("ms", tz="UTC")),
+        ("evidence", pa.string()),
+        ("error", pa.string()),
+        ("stamp_scores", pa.string()),
+    ]
+)
+
+# wbits for a gzip header & trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def score_values_to_dict(row: dict) -> dict:
+    """The `DetailedScoreResponse` of a score, built from its `.values()` row"""
+    score = row["score"]
+    last_score_timestamp = row["last_score_timestamp"]
+    expiration_date = row["expiration_date"]
+    return dict(
+        address=row["passport__address"],
+        score=str(score) if score is not None else None,
+        status=row["status"],
+        last_score_timestamp=(
+            last_score_timestamp.isoformat() if last_score_timestamp else None
+        ),
+        expiration_date=expiration_date.isoformat() if expiration_date else None,
+        evidence=row["evidence"],
+        error=row["error"],
+        stamp_scores=row["stamp_scores"] or {},
+    )
+
+
+def score_values_to_export_dict(row: dict) -> dict:
+    """The exported NDJSON line of a score: its `DetailedScoreResponse` and its id"""
+    return dict(id=row["id"], **score_values_to_dict(row))
+
+
+def score_values_to_parquet_row(row: dict) -> dict:
+    return dict(
+        id=row["id"],
+        address=row["passport__address"],
+        score=row["score"],
+        status=row["status"],
+        last_score_timestamp=row["last_score_timestamp"],
+        expiration_date=row["expiration_date"],
+        evidence=json.dumps(row["evidence"]) if row["evidence"] is not None else None,
+        error=row["error"],
+        stamp_scores=(
+            json.dumps(row["stamp_scores"]) if row["stamp_scores"] is not None else None
+        ),
+    )
+
+
+async def achunks(rows: AsyncIterator[dict]) -> AsyncIterator[List[dict]]:
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= settings.SCORE_EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def agzip_ndjson_stream(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    async for chunk in achunks(rows):
+        lines = "".join(
+            json.dumps(score_values_to_export_dict(row)) + "\n" for row in chunk
+        )
+        data = compressor.compress(lines.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _StreamSink(io.RawIOBase):
+    """File the Parquet writer writes to, emptied after each row group"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # The offsets of the row groups in the footer are absolute
+        return self.position
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def aparquet_stream(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    sink = _StreamSink()
+    with parquet_writer(pa.PythonFile(sink, mode="w"), SCORE_EXPORT_SCHEMA) as writer:
+        async for chunk in achunks(rows):
+            writer.write_batch([score_values_to_parquet_row(row) for row in chunk])
+            yield sink.pop()
+    # The footer
+    yield sink.pop()
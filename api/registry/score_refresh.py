@@ -0,0 +1,253 @@
+"""
+Proactive refresh of the scores that are about to expire.
+
+A score expires with the earliest stamp it was calculated from. The first read of
+an expired score (see `ceramic_cache.api.v1.handle_get_ui_score`) recalculates it
+synchronously, with the full verification, deduplication and scoring latency.
+
+The `refresh_expiring_scores` command runs on a schedule, and rescores in the
+background the scores expiring within the next `SCORE_REFRESH_WINDOW` seconds
+(or that have expired in the last `SCORE_REFRESH_LOOKBACK` seconds), using the
+index on `Score.expiration_date`:
+ - if the stamps have been renewed since, the refreshed score expires later
+ - if not, the score keeps its expiration date. It is then remembered in the
+   cache until it expires, and rescored again right after it has expired (which
+   drops the expired stamp)
+
+The number of scores refreshed per community and per minute is limited by
+`SCORE_REFRESH_RATE_LIMIT`, so that a community with many scores expiring at the
+same time does not starve the others. The lag between the expiration and the
+refresh of each score is reported (it is negative for the scores refreshed
+before they expired).
+
+The refreshes are coalesced with the scorings of the same passports in progress,
+and a refresh that fails does not overwrite the previous score.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from registry.atasks import ascore_passport
+from registry.models import Score
+from registry.single_flight import acoalesce_scoring
+from registry.utils import get_utc_time
+
+log = logging.getLogger(__name__)
+
+REFRESHED_KEY_PREFIX = "score_refresh:unchanged"
+QUOTA_KEY_PREFIX = "score_refresh:quota"
+
+
+def refreshed_key(score: Score) -> str:
+    return f"{REFRESHED_KEY_PREFIX}:{score.pk}:{score.expiration_date.isoformat()}"
+
+
+def quota_key(community_id: int, minute: int) -> str:
+    return f"{QUOTA_KEY_PREFIX}:{community_id}:{minute}"
+
+
+class RefreshReport:
+    """Counts of a refresh run, and the lags between expiration and refresh"""
+
+    def __init__(self):
+        self.num_refreshed = 0
+        self.num_extended = 0
+        self.num_unchanged = 0
+        self.num_failed = 0
+        self.num_throttled = 0
+        self.lags: List[float] = []
+
+    def add(self, expiration_date: datetime, refreshed_score: Score, now: datetime):
+        self.num_refreshed += 1
+        self.lags.append((now - expiration_date).total_seconds())
+        if refreshed_score.status != Score.Status.DONE:
+            self.num_failed += 1
+        elif (
+            refreshed_score.expiration_date is None
+            or refreshed_score.expiration_date > expiration_date
+        ):
+            self.num_extended += 1
+        else:
+            self.num_unchanged += 1
+
+    def as_dict(self) -> dict:
+        late = [lag for lag in self.lags if lag > 0]
+        return {
+            "refreshed": self.num_refreshed,
+            "extended": self.num_extended,
+            "unchanged": self.num_unchanged,
+            "failed": self.num_failed,
+            "throttled": self.num_throttled,
+            "refreshed_after_expiration": len(late),
+            "max_lag_seconds": max(late) if late else 0.0,
+            "mean_lag_seconds": sum(late) / len(late) if late else 0.0,
+        }
+
+
+def get_expiring_scores(now: datetime, window: timedelta, lookback: timedelta):
+    """
+    The scores expiring within the window, or that have expired within the
+    lookback period, by expiration date
+    """
+    return (
+        Score.objects.filter(
+            status=Score.Status.DONE,
+            expiration_date__gt=now - lookback,
+            expiration_date__lte=now + window,
+        )
+        .select_related("passport__community")
+        .order_by("expiration_date", "id")
+    )
+
+
+def take_quota(community_id: int, count: int, now: datetime) -> int:
+    """
+    Take up to `count` refreshes from the quota of the community for the current
+    minute, and return how many were granted
+    """
+    key = quota_key(community_id, int(now.timestamp()) // 60)
+    cache.add(key, 0, timeout=120)
+    try:
+        used = cache.incr(key, count)
+    except ValueError:
+        # The key has just expired
+        cache.set(key, count, timeout=120)
+        used = count
+    granted = max(0, min(count, settings.SCORE_REFRESH_RATE_LIMIT - (used - count)))
+    if granted < count:
+        cache.decr(key, count - granted)
+    return granted
+
+
+def select_scores_to_refresh(
+    scores: List[Score], now: datetime, report: RefreshReport
+) -> List[Score]:
+    """
+    Skip the scores that have already been refreshed without change (until they
+    expire), and those over the quota of their community
+    """
+    unexpired = [score for score in scores if score.expiration_date > now]
+    refreshed = cache.get_many([refreshed_key(score) for score in unexpired])
+    scores = [score for score in scores if refreshed_key(score) not in refreshed]
+
+    by_community: Dict[int, List[Score]] = {}
+    for score in scores:
+        by_community.setdefault(score.passport.community_id, []).append(score)
+
+    selected = []
+    for community_id, community_scores in by_community.items():
+        granted = take_quota(community_id, len(community_scores), now)
+        selected += community_scores[:granted]
+        report.num_throttled += len(community_scores) - granted
+    return selected
+
+
+async def arefresh_score(score: Score) -> Tuple[Optional[datetime], Score]:
+    """
+    Rescore the passport, coalesced with the scorings of the same passport in
+    progress (see `registry.single_flight`). A refresh that fails is not saved:
+    the passport keeps its previous score until it expires.
+    """
+    expiration_date = score.expiration_date
+    passport = score.passport
+
+    async def ascore() -> Score:
+        await ascore_passport(passport.community, passport, passport.address, score)
+        if score.status == Score.Status.ERROR:
+            log.error(
+                "Failed to refresh the score %s, keeping the previous score: %s",
+                score.pk,
+                score.error,
+            )
+        else:
+            await score.asave()
+        return score
+
+    async def aread_score() -> Optional[Score]:
+        return (
+            await Score.objects.select_related("passport")
+            .filter(passport_id=passport.pk)
+            .afirst()
+        )
+
+    score = await acoalesce_scoring(
+        passport.address, passport.community_id, ascore, aread_score
+    )
+    return expiration_date, score
+
+
+async def arefresh_scores(scores: List[Score], concurrency: int) -> List[tuple]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def refresh(score: Score):
+        async with semaphore:
+            return await arefresh_score(score)
+
+    return await asyncio.gather(*[refresh(score) for score in scores])
+
+
+def remember_unchanged_scores(results: List[tuple], now: datetime):
+    """
+    The scores that still expire at the same date do not need to be refreshed
+    again before they expire
+    """
+    for expiration_date, score in results:
+        if (
+            score.status == Score.Status.DONE
+            and score.expiration_date == expiration_date
+            and expiration_date > now
+        ):
+            cache.set(
+                refreshed_key(score),
+                True,
+                timeout=int((expiration_date - now).total_seconds()) + 1,
+            )
+
+
+def refresh_expiring_scores(
+    window: timedelta,
+    lookback: timedelta,
+    batch_size: int,
+    concurrency: int,
+    community_ids: Optional[List[int]] = None,
+    limit: Optional[int] = None,
+) -> RefreshReport:
+    """Refresh the expiring scores in batches, and report the refresh lags"""
+    report = RefreshReport()
+    start = get_utc_time()
+    query = get_expiring_scores(start, window, lookback)
+    if community_ids:
+        query = query.filter(passport__community_id__in=community_ids)
+
+    last = None
+    while limit is None or report.num_refreshed < limit:
+        batch_query = query
+        if last is not None:
+            last_expiration_date, last_id = last
+            batch_query = batch_query.filter(
+                Q(expiration_date__gt=last_expiration_date)
+                | Q(expiration_date=last_expiration_date, id__gt=last_id)
+            )
+        scores = list(batch_query[:batch_size])
+        if not scores:
+            break
+        last = (scores[-1].expiration_date, scores[-1].id)
+
+        now = get_utc_time()
+        scores = select_scores_to_refresh(scores, now, report)
+        if limit is not None:
+            scores = scores[: limit - report.num_refreshed]
+        results = asyncio.run(arefresh_scores(scores, concurrency))
+
+        now = get_utc_time()
+        for expiration_date, score in results:
+            report.add(expiration_date, score, now)
+        remember_unchanged_scores(results, now)
+        log.info("Refreshed %s expiring scores: %s", len(results), report.as_dict())
+
+    return report
@@ -1 +1,31 @@
+"""
+Keep the hash filters (see `registry.hash_filter`) up to date: the filter of a new
+community is complete, as it has no hash links yet, and the hash links that are not
+written by the LIFO deduplication (e.g. in the admin) are added to the filters.
+"""
+
+import api_logging as logging
 import django.dispatch
+from account.models import Community
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from registry.hash_filter import add_hashes, reset_hash_filter
+
+from .models import HashScorerLink
+
+log = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Community)
+def community_created(sender, instance, created, **kwargs):
+    if created:
+        # A new community has no hash links, so its empty filter is complete
+        try:
+            reset_hash_filter(instance.pk, complete=True)
+        except Exception:
+            log.error("Failed to reset the hash filter", exc_info=True)
+
+
+@receiver(post_save, sender=HashScorerLink)
+def hash_link_saved(sender, instance, **kwargs):
+    add_hashes(instance.community_id, [instance.hash])
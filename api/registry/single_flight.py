@@ -0,0 +1,176 @@
+"""
+Single-flight coalescing of the concurrent scorings of the same passport.
+
+Clients often send several score requests for an address at once (e.g. a `GET
+score` right after a `PATCH stamps/bulk`), which would each run the full scoring
+pipeline and race in the LIFO deduplication. Instead, only one of the concurrent
+requests for an (address, community) pair is the leader and scores the passport:
+ - the other requests of the same event loop wait for the result of the leader
+ - the requests of other workers & Lambdas find the lease the leader holds in the
+   shared cache for `SCORE_SINGLE_FLIGHT_LEASE` seconds. They wait for it to be
+   released, and read the score the leader has saved. If the lease is not
+   released within `SCORE_SINGLE_FLIGHT_WAIT` seconds, or no score has been
+   saved, they score the passport themselves.
+
+The requests that bring changes (`changed_providers`) never join a scoring in
+progress, as it may have loaded the passport before the change. They lead, and
+can be joined by the requests that come after them.
+
+The number of leaders, and of requests coalesced locally or remotely, are
+counted in the shared cache (see `get_single_flight_stats`).
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache
+from registry.models import Score
+
+log = logging.getLogger(__name__)
+
+LEASE_KEY_PREFIX = "score_single_flight:lease"
+STATS_KEY_PREFIX = "score_single_flight:stats"
+
+LEADERS = "leaders"
+COALESCED_LOCAL = "coalesced_local"
+COALESCED_REMOTE = "coalesced_remote"
+FALLBACKS = "fallbacks"
+COUNTERS = [LEADERS, COALESCED_LOCAL, COALESCED_REMOTE, FALLBACKS]
+
+# The scorings in progress in this process, by event loop, address & community
+_inflight: Dict[tuple, asyncio.Future] = {}
+
+
+def lease_key(address: str, community_id: int) -> str:
+    return f"{LEASE_KEY_PREFIX}:{community_id}:{address}"
+
+
+def stats_key(counter: str) -> str:
+    return f"{STATS_KEY_PREFIX}:{counter}"
+
+
+async def arecord(counter: str):
+    try:
+        key = stats_key(counter)
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+    except Exception:
+        log.error("Failed to record the single-flight %s", counter, exc_info=True)
+
+
+def get_single_flight_stats() -> dict:
+    counters = cache.get_many([stats_key(counter) for counter in COUNTERS])
+    stats = {counter: counters.get(stats_key(counter), 0) for counter in COUNTERS}
+    coalesced = stats[COALESCED_LOCAL] + stats[COALESCED_REMOTE]
+    total = stats[LEADERS] + coalesced
+    stats["coalesced_ratio"] = coalesced / total if total else None
+    return stats
+
+
+def reset_single_flight_stats():
+    cache.delete_many([stats_key(counter) for counter in COUNTERS])
+
+
+async def aacquire_lease(key: str, token: str) -> bool:
+    try:
+        return await cache.aadd(key, token, timeout=settings.SCORE_SINGLE_FLIGHT_LEASE)
+    except Exception:
+        log.error("Failed to acquire the single-flight lease", exc_info=True)
+        # Score the passport without the lease
+        return True
+
+
+async def arelease_lease(key: str, token: str):
+    try:
+        # Not atomic, but the lease is only released early by its holder: a lease
+        # taken over after it expired is at worst released before its time
+        if await cache.aget(key) == token:
+            await cache.adelete(key)
+    except Exception:
+        log.error("Failed to release the single-flight lease", exc_info=True)
+
+
+async def await_lease_release(key: str) -> bool:
+    """Wait for the lease to be released, and return False if it is not in time"""
+    deadline = time.monotonic() + settings.SCORE_SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.SCORE_SINGLE_FLIGHT_POLL_INTERVAL)
+        try:
+            if await cache.aget(key) is None:
+                return True
+        except Exception:
+            log.error("Failed to check the single-flight lease", exc_info=True)
+            return False
+    return False
+
+
+async def _alead(
+    key: str,
+    join: bool,
+    ascore: Callable[[], Awaitable[Score]],
+    aread_score: Callable[[], Awaitable[Optional[Score]]],
+) -> Score:
+    token = uuid4().hex
+    if await aacquire_lease(key, token):
+        await arecord(LEADERS)
+        try:
+            return await ascore()
+        finally:
+            await arelease_lease(key, token)
+
+    if join:
+        await arecord(COALESCED_REMOTE)
+        if await await_lease_release(key):
+            score = await aread_score()
+            if score is not None and score.status != Score.Status.PROCESSING:
+                return score
+        await arecord(FALLBACKS)
+
+    # Score the passport, without a lease of its own
+    return await ascore()
+
+
+async def acoalesce_scoring(
+    address: str,
+    community_id: int,
+    ascore: Callable[[], Awaitable[Score]],
+    aread_score: Callable[[], Awaitable[Optional[Score]]],
+    join: bool = True,
+) -> Score:
+    """
+    Score the passport with `ascore` (which scores and saves it), unless it is
+    already being scored, by this process or another one. `aread_score` reads the
+    score saved by another process. If `join` is False, a scoring already in
+    progress is not joined.
+    """
+    loop = asyncio.get_running_loop()
+    inflight_key = (loop, address, community_id)
+
+    inflight = _inflight.get(inflight_key)
+    if join and inflight is not None:
+        await arecord(COALESCED_LOCAL)
+        return await asyncio.shield(inflight)
+
+    future = loop.create_future()
+    _inflight[inflight_key] = future
+    try:
+        score = await _alead(
+            lease_key(address, community_id), join, ascore, aread_score
+        )
+        future.set_result(score)
+        return score
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Retrieved, so that it is not reported if no request joined
+        future.exception()
+        raise
+    finally:
+        if _inflight.get(inflight_key) is future:
+            del _inflight[inflight_key]
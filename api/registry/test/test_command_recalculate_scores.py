@@ -1,11 +1,13 @@
 import json
 
+import pyarrow.parquet as pq
 import pytest
 from account.models import Community
 from django.conf import settings
 from django.core.management import call_command
 from django.test import override_settings
 from registry.models import Passport, Score, Stamp
+from scorer_weighted.models import RescoreRange, RescoreRequest
 
 pytestmark = pytest.mark.django_db
 
@@ -508,3 +510,234 @@ class TestRecalculatScores:
         print(captured.out)
         assert "Updated scorers: 2" in captured.out
         assert "Recalculating scores" not in captured.out
+
+    def test_rescoring_in_checkpointed_ranges(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+        capsys,
+    ):
+        """Test that the passports are rescored in ranges, and each range is checkpointed"""
+        call_command("recalculate_scores", range_size=2, batch_size=1)
+
+        rescore_request = RescoreRequest.objects.get()
+        assert rescore_request.status == RescoreRequest.Status.SUCCESS
+        assert rescore_request.num_communities_requested == 1
+        assert rescore_request.num_communities_processed == 1
+
+        ranges = list(rescore_request.ranges.order_by("id"))
+        assert [(r.start_id, r.end_id) for r in ranges] == [
+            (0, weighted_scorer_passports[1].id),
+            (weighted_scorer_passports[1].id, None),
+        ]
+        assert [r.last_id for r in ranges] == [
+            weighted_scorer_passports[1].id,
+            weighted_scorer_passports[2].id,
+        ]
+        assert [r.num_passports_processed for r in ranges] == [2, 1]
+        assert all(r.status == RescoreRange.Status.SUCCESS for r in ranges)
+        assert Score.objects.filter(status=Score.Status.DONE).count() == 3
+
+        captured = capsys.readouterr()
+        assert f"Worker {ranges[0].worker}: 3 passports" in captured.out
+
+    def test_resume_failed_rescore(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+        mocker,
+    ):
+        """Test that a failed rescore can be resumed, skipping the finished ranges and batches"""
+        rescore_passports = mocker.patch(
+            "registry.management.commands.recalculate_scores.rescore_passports",
+            side_effect=[None, Exception("DB down")],
+        )
+        with pytest.raises(Exception, match="DB down"):
+            call_command("recalculate_scores", range_size=2, batch_size=1)
+
+        rescore_request = RescoreRequest.objects.get()
+        assert rescore_request.status == RescoreRequest.Status.FAILED
+        assert rescore_request.num_communities_processed == 0
+        failed_range = rescore_request.ranges.get(status=RescoreRange.Status.FAILED)
+        assert failed_range.last_id == weighted_scorer_passports[0].id
+
+        rescore_passports.side_effect = None
+        rescore_passports.reset_mock()
+        call_command("recalculate_scores", resume=rescore_request.pk, batch_size=1)
+
+        rescore_request.refresh_from_db()
+        assert rescore_request.status == RescoreRequest.Status.SUCCESS
+        assert rescore_request.num_communities_processed == 1
+        # Only the 2 passports after the checkpoint are rescored
+        assert [
+            [p.id for p in call.args[2]] for call in rescore_passports.call_args_list
+        ] == [[weighted_scorer_passports[1].id], [weighted_scorer_passports[2].id]]
+
+    def test_rescore_only_passports_with_changed_providers(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+        capsys,
+    ):
+        """Test that only the passports holding a stamp of a provider whose weight changed are rescored"""
+        call_command("recalculate_scores")
+        timestamps = dict(
+            Score.objects.values_list("passport_id", "last_score_timestamp")
+        )
+
+        new_weights = {"FirstEthTxnProvider": "1", "Google": "5", "Ens": "1"}
+        with override_settings(GITCOIN_PASSPORT_WEIGHTS=new_weights):
+            call_command("recalculate_scores", plan=True)
+            captured = capsys.readouterr()
+            assert (
+                f"Community {scorer_community_with_weighted_scorer.id} (My Community): 2 of 3 passports affected, changed providers: ['Google']"
+                in captured.out
+            )
+            # Nothing is written in plan mode
+            assert RescoreRequest.objects.count() == 1
+
+            call_command("recalculate_scores")
+
+        scores = {s.passport_id: s for s in Score.objects.all()}
+        unaffected, *affected = weighted_scorer_passports
+        assert scores[unaffected.id].last_score_timestamp == timestamps[unaffected.id]
+        assert scores[unaffected.id].score == 1
+        for passport in affected:
+            assert scores[passport.id].last_score_timestamp > timestamps[passport.id]
+        assert [scores[p.id].score for p in affected] == [6, 7]
+
+    def test_rescore_passports_with_failed_scores(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+        capsys,
+    ):
+        """Test that the passports whose last scoring failed or did not finish are rescored too"""
+        call_command("recalculate_scores")
+        # Only the last passport holds an Ens stamp
+        failed, processing, _ = weighted_scorer_passports
+        Score.objects.filter(passport=failed).update(
+            status=Score.Status.ERROR, score=None, error="Failed"
+        )
+        Score.objects.filter(passport=processing).update(
+            status=Score.Status.PROCESSING, score=None
+        )
+
+        new_weights = {"FirstEthTxnProvider": "1", "Google": "1", "Ens": "5"}
+        with override_settings(GITCOIN_PASSPORT_WEIGHTS=new_weights):
+            call_command("recalculate_scores", plan=True)
+            captured = capsys.readouterr()
+            assert (
+                "3 of 3 passports affected, changed providers: ['Ens']" in captured.out
+            )
+
+            call_command("recalculate_scores")
+
+        statuses = dict(Score.objects.values_list("passport_id", "status"))
+        assert statuses[failed.id] == Score.Status.DONE
+        assert statuses[processing.id] == Score.Status.DONE
+
+    def test_rescore_only_passports_near_changed_threshold(
+        self,
+        binary_weighted_scorer_passports,
+        scorer_community_with_binary_scorer,
+        capsys,
+    ):
+        """Test that only the passports whose raw score is between the old and new threshold are rescored"""
+        call_command("recalculate_scores")
+        timestamps = dict(
+            Score.objects.values_list("passport_id", "last_score_timestamp")
+        )
+
+        with override_settings(GITCOIN_PASSPORT_THRESHOLD=2):
+            call_command("recalculate_scores", plan=True)
+            captured = capsys.readouterr()
+            assert (
+                "2 of 3 passports affected, changed providers: [], threshold: 75.00000 -> 2.00000"
+                in captured.out
+            )
+
+            call_command("recalculate_scores")
+
+        scores = {s.passport_id: s for s in Score.objects.all()}
+        unaffected, *affected = binary_weighted_scorer_passports
+        assert scores[unaffected.id].last_score_timestamp == timestamps[unaffected.id]
+        assert [scores[p.id].score for p in binary_weighted_scorer_passports] == [
+            0,
+            1,
+            1,
+        ]
+        # The threshold in the evidence of the scores that were not rescored is updated too
+        assert [scores[p.id].evidence for p in binary_weighted_scorer_passports] == [
+            {
+                "type": "ThresholdScoreCheck",
+                "success": success,
+                "rawScore": raw_score,
+                "threshold": "2.00000",
+            }
+            for success, raw_score in [(False, "1"), (True, "2"), (True, "3")]
+        ]
+
+    @pytest.mark.django_db(transaction=True, databases=["default", "read_replica_0"])
+    def test_dry_run_diff(
+        self,
+        binary_weighted_scorer_passports,
+        scorer_community_with_binary_scorer,
+        tmp_path,
+        capsys,
+    ):
+        """Test that the score changes are reported without writing anything"""
+        call_command("recalculate_scores")
+        scores = list(Score.objects.order_by("id").values())
+
+        new_weights = {"FirstEthTxnProvider": "1", "Google": "5", "Ens": "1"}
+        output = str(tmp_path / "diff")
+        with override_settings(
+            GITCOIN_PASSPORT_WEIGHTS=new_weights, GITCOIN_PASSPORT_THRESHOLD=5
+        ):
+            call_command("recalculate_scores", dry_run_diff=True, diff_output=output)
+
+        assert list(Score.objects.order_by("id").values()) == scores
+        assert RescoreRequest.objects.count() == 1
+        assert scorer_community_with_binary_scorer.get_scorer().threshold == 75
+
+        community_id = scorer_community_with_binary_scorer.id
+        captured = capsys.readouterr()
+        assert (
+            f"Community {community_id}: 2 of 2 affected passports would change (2 up, 0 down, 0 new), 2 would pass, 0 would fail"
+            in captured.out
+        )
+        assert pq.read_table(f"{output}_summary.parquet").to_pylist() == [
+            {
+                "community_id": community_id,
+                "num_passports": 2,
+                "num_changed": 2,
+                "num_increased": 2,
+                "num_decreased": 0,
+                "num_new": 0,
+                "num_pass_gained": 2,
+                "num_pass_lost": 0,
+            }
+        ]
+        assert pq.read_table(f"{output}_histograms.parquet").to_pylist() == [
+            {
+                "community_id": community_id,
+                "bin_start": bin_start,
+                "old_count": old_count,
+                "new_count": new_count,
+            }
+            for bin_start, old_count, new_count in [
+                (2.0, 1, 0),
+                (3.0, 1, 0),
+                (6.0, 0, 1),
+                (7.0, 0, 1),
+            ]
+        ]
+        assert pq.read_table(f"{output}_providers.parquet").to_pylist() == [
+            {
+                "community_id": community_id,
+                "provider": "Google",
+                "num_passports": 2,
+                "points_delta": 8.0,
+            }
+        ]
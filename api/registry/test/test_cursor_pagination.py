@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from registry.models import Passport, Score
+from registry.utils import get_cursor_page, get_cursor_query_condition
+
+pytestmark = pytest.mark.django_db
+
+SORT_FIELDS = ["last_score_timestamp", "id"]
+TIMESTAMP = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name="scores")
+def fixture_scores(scorer_community):
+    scores = []
+    for idx in range(5):
+        passport = Passport.objects.create(
+            address=f"0x{idx:040x}", community=scorer_community
+        )
+        scores.append(
+            Score.objects.create(
+                passport=passport,
+                score=1,
+                status=Score.Status.DONE,
+                # Pairs of identical timestamps
+                last_score_timestamp=TIMESTAMP + timedelta(days=idx // 2),
+            )
+        )
+    return scores
+
+
+def get_page(cursor, limit):
+    condition, ordering = get_cursor_query_condition(cursor, SORT_FIELDS)
+    query = Score.objects.filter(condition).order_by(*ordering)
+    return get_cursor_page(query, cursor, limit)
+
+
+def cursor_of(direction, score):
+    return dict(
+        d=direction,
+        last_score_timestamp=score.last_score_timestamp.isoformat(),
+        id=score.id,
+    )
+
+
+class TestCursorPagination:
+    def test_condition_is_a_row_value_comparison(self):
+        condition, ordering = get_cursor_query_condition(
+            cursor_of("next", Score(id=1, last_score_timestamp=TIMESTAMP)),
+            SORT_FIELDS,
+        )
+
+        sql = str(Score.objects.filter(condition).query)
+
+        assert (
+            '("registry_score"."last_score_timestamp", "registry_score"."id") >' in sql
+        )
+        assert ordering == SORT_FIELDS
+
+    def test_next_pages(self, scores):
+        page, has_next, has_prev = get_page(cursor_of("next", scores[1]), 2)
+
+        assert page == scores[2:4]
+        assert (has_next, has_prev) == (True, True)
+
+        page, has_next, has_prev = get_page(cursor_of("next", scores[3]), 2)
+
+        assert page == scores[4:]
+        assert (has_next, has_prev) == (False, True)
+
+    def test_prev_pages(self, scores):
+        page, has_next, has_prev = get_page(cursor_of("prev", scores[4]), 2)
+
+        assert page == scores[2:4]
+        assert (has_next, has_prev) == (True, True)
+
+        page, has_next, has_prev = get_page(cursor_of("prev", scores[2]), 2)
+
+        assert page == scores[:2]
+        assert (has_next, has_prev) == (True, False)
+
+    def test_empty_page(self, scores):
+        assert get_page(cursor_of("next", scores[4]), 2) == ([], False, False)
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_page_is_read_in_one_query(self, scorer_api_key, scorer_community, scores):
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                f"/registry/v2/score/{scorer_community.id}?limit=2",
+                HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            )
+
+        assert response.status_code == 200
+        assert response.json()["prev"] is None
+        score_queries = [
+            query for query in queries if '"registry_score"' in query["sql"]
+        ]
+        assert len(score_queries) == 1
+
+        response = client.get(
+            response.json()["next"], HTTP_AUTHORIZATION="Token " + scorer_api_key
+        )
+        response = client.get(
+            response.json()["next"], HTTP_AUTHORIZATION="Token " + scorer_api_key
+        )
+
+        assert [item["address"] for item in response.json()["items"]] == [
+            scores[4].passport.address
+        ]
+        assert response.json()["next"] is None
+        assert response.json()["prev"] is not None
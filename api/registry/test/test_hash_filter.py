@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from account.deduplication.lifo import alifo
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from registry import hash_filter
+from registry.fingerprint import adedup_state_version
+from registry.hash_filter import (
+    add_hashes,
+    get_filter_bits,
+    get_hash_filter_stats,
+    hash_filter_key,
+    local_filter_bits,
+    reset_hash_filter,
+    reset_hash_filter_stats,
+    split_hashes,
+)
+from registry.models import HashScorerLink
+
+pytestmark = pytest.mark.django_db
+
+expires_at = datetime.now(timezone.utc) + timedelta(days=30)
+
+
+@pytest.fixture(autouse=True)
+def clear_hash_filters():
+    local_filter_bits.clear()
+    reset_hash_filter_stats()
+    yield
+    local_filter_bits.clear()
+    reset_hash_filter_stats()
+
+
+def make_stamp(hash):
+    return {
+        "credential": {
+            "credentialSubject": {"hash": hash, "provider": "Google"},
+            "expirationDate": expires_at.isoformat(),
+        }
+    }
+
+
+class TestHashFilter:
+    def test_new_community_filter_is_complete(self, scorer_community):
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == ([], 2)
+
+    def test_added_hashes_might_be_claimed(self, scorer_community):
+        add_hashes(scorer_community.pk, ["hash1"])
+
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == (["hash1"], 1)
+
+    def test_hashes_are_tested_in_one_round_trip(self, scorer_community, mocker):
+        add_hashes(scorer_community.pk, ["hash1"])
+        execute = mocker.spy(hash_filter.redis.client.Pipeline, "execute")
+
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == (["hash1"], 1)
+        assert execute.call_count == 1
+
+    def test_resized_filter(self, scorer_community, settings):
+        settings.HASH_FILTER_MIN_BITS = 2**10
+        reset_hash_filter(scorer_community.pk, complete=True)
+        # The size of the filter is remembered
+        split_hashes(scorer_community.pk, ["hash1"])
+
+        # Resized by another worker
+        reset_hash_filter(scorer_community.pk, 2**12, complete=True)
+        add_hashes(scorer_community.pk, ["hash1"])
+
+        assert local_filter_bits[scorer_community.pk] == 2**12
+        local_filter_bits.clear()
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == (["hash1"], 1)
+
+    def test_incomplete_filter(self, scorer_community):
+        reset_hash_filter(scorer_community.pk)
+        add_hashes(scorer_community.pk, ["hash1"])
+
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == (
+            ["hash1", "hash2"],
+            None,
+        )
+
+    def test_claimed_hashes_are_added(self, scorer_community):
+        async_to_sync(alifo)(
+            scorer_community, {"stamps": [make_stamp("hash1")]}, "0xaddress_1"
+        )
+        # Another worker
+        local_filter_bits.clear()
+
+        assert split_hashes(scorer_community.pk, ["hash1", "hash2"]) == (["hash1"], 1)
+
+    def test_unclaimed_hashes_are_not_looked_up(
+        self, scorer_community, django_assert_num_queries
+    ):
+        with django_assert_num_queries(0):
+            version = async_to_sync(adedup_state_version)(
+                scorer_community.pk, ["hash1", "hash2"]
+            )
+
+        HashScorerLink.objects.create(
+            hash="hash1",
+            address="0xaddress_1",
+            community=scorer_community,
+            expires_at=expires_at,
+        )
+        with django_assert_num_queries(1):
+            assert (
+                async_to_sync(adedup_state_version)(
+                    scorer_community.pk, ["hash1", "hash2"]
+                )
+                != version
+            )
+
+        assert get_hash_filter_stats() == {
+            "skipped": 3,
+            "positives": 1,
+            "false_positives": 0,
+            "false_positive_rate": 0.0,
+        }
+
+    def test_false_positives_are_counted(self, scorer_community):
+        # The hash link has been deleted, but stays in the filter
+        add_hashes(scorer_community.pk, ["hash1"])
+
+        async_to_sync(adedup_state_version)(scorer_community.pk, ["hash1", "hash2"])
+
+        assert get_hash_filter_stats() == {
+            "skipped": 1,
+            "positives": 1,
+            "false_positives": 1,
+            "false_positive_rate": 0.5,
+        }
+
+    @pytest.mark.django_db(transaction=True, databases=["default", "read_replica_0"])
+    def test_rebuild_hash_filters(self, scorer_community):
+        HashScorerLink.objects.bulk_create(
+            [
+                HashScorerLink(
+                    hash=f"hash{i}",
+                    address="0xaddress_1",
+                    community=scorer_community,
+                    expires_at=expires_at,
+                )
+                for i in range(10)
+            ]
+        )
+        reset_hash_filter(scorer_community.pk)
+
+        call_command("rebuild_hash_filters", "--reset")
+
+        assert split_hashes(
+            scorer_community.pk, [f"hash{i}" for i in range(10)] + ["unclaimed"]
+        ) == ([f"hash{i}" for i in range(10)], 1)
+
+    @pytest.mark.django_db(transaction=True, databases=["default", "read_replica_0"])
+    def test_rebuild_sizes_filters_from_hash_links(self, scorer_community, settings):
+        settings.HASH_FILTER_MIN_BITS = 2**10
+        settings.HASH_FILTER_BITS_PER_HASH = 16
+        HashScorerLink.objects.bulk_create(
+            [
+                HashScorerLink(
+                    hash=f"hash{i}",
+                    address="0xaddress_1",
+                    community=scorer_community,
+                    expires_at=expires_at,
+                )
+                for i in range(100)
+            ]
+        )
+        call_command("rebuild_hash_filters")
+
+        # 100 hash links * 2 (headroom) * 16 bits, rounded to a power of 2
+        assert get_filter_bits(scorer_community.pk) == 2**12
+        key = cache.make_and_validate_key(hash_filter_key(scorer_community.pk))
+        assert hash_filter._get_redis_client().strlen(key) <= 2 + 2**12 // 8
+        assert split_hashes(
+            scorer_community.pk, [f"hash{i}" for i in range(100)] + ["unclaimed"]
+        ) == ([f"hash{i}" for i in range(100)], 1)
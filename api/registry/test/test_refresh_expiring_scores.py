@@ -0,0 +1,176 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+from registry.models import Passport, Score
+from registry.score_refresh import refresh_expiring_scores
+from registry.utils import get_utc_time
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def cache_keys(mocker):
+    # The cache is shared by the tests
+    prefix = uuid.uuid4().hex
+    mocker.patch("registry.score_refresh.QUOTA_KEY_PREFIX", f"{prefix}:quota")
+    mocker.patch("registry.score_refresh.REFRESHED_KEY_PREFIX", f"{prefix}:unchanged")
+    mocker.patch("registry.single_flight.LEASE_KEY_PREFIX", f"{prefix}:lease")
+    mocker.patch("registry.single_flight.STATS_KEY_PREFIX", f"{prefix}:stats")
+
+
+@pytest.fixture(name="now")
+def fixture_now():
+    return get_utc_time()
+
+
+@pytest.fixture(name="rescore")
+def fixture_rescore(mocker, now):
+    """Rescoring renews the stamps of the passports in `renewed`"""
+    renewed = set()
+    failing = set()
+
+    async def ascore_passport(community, passport, address, score):
+        if address in failing:
+            score.status = Score.Status.ERROR
+            score.error = "Failed"
+            score.score = None
+            return
+        if address in renewed:
+            score.expiration_date = now + timedelta(days=90)
+        score.last_score_timestamp = get_utc_time()
+
+    mock = mocker.patch(
+        "registry.score_refresh.ascore_passport", side_effect=ascore_passport
+    )
+    mock.renewed = renewed
+    mock.failing = failing
+    return mock
+
+
+def create_scores(community, expiration_dates):
+    scores = []
+    for idx, expiration_date in enumerate(expiration_dates):
+        passport = Passport.objects.create(address=f"0x{idx:040x}", community=community)
+        scores.append(
+            Score.objects.create(
+                passport=passport,
+                score=1,
+                status=Score.Status.DONE,
+                expiration_date=expiration_date,
+            )
+        )
+    return scores
+
+
+def refresh(**kwargs):
+    return refresh_expiring_scores(
+        window=timedelta(hours=1),
+        lookback=timedelta(days=1),
+        batch_size=2,
+        concurrency=2,
+        **kwargs,
+    ).as_dict()
+
+
+def refreshed_addresses(rescore):
+    return sorted(call.args[2] for call in rescore.call_args_list)
+
+
+class TestRefreshExpiringScores:
+    def test_refresh_scores_expiring_within_window(
+        self, scorer_community, rescore, now
+    ):
+        expired, expiring, later, long_expired = create_scores(
+            scorer_community,
+            [
+                now - timedelta(minutes=10),
+                now + timedelta(minutes=30),
+                now + timedelta(days=1),
+                now - timedelta(days=2),
+            ],
+        )
+        rescore.renewed.update([expired.passport.address, expiring.passport.address])
+
+        report = refresh()
+
+        assert refreshed_addresses(rescore) == sorted(
+            [expired.passport.address, expiring.passport.address]
+        )
+        assert report["refreshed"] == 2
+        assert report["extended"] == 2
+        assert report["refreshed_after_expiration"] == 1
+        assert 600 <= report["max_lag_seconds"] < 700
+        expired.refresh_from_db()
+        assert expired.expiration_date == now + timedelta(days=90)
+
+    def test_unchanged_scores_are_refreshed_again_once_expired(
+        self, scorer_community, rescore, now
+    ):
+        [score] = create_scores(scorer_community, [now + timedelta(minutes=30)])
+
+        assert refresh()["unchanged"] == 1
+        # Not refreshed again before it expires
+        assert refresh()["refreshed"] == 0
+        assert rescore.call_count == 1
+
+        Score.objects.filter(pk=score.pk).update(
+            expiration_date=now - timedelta(minutes=1)
+        )
+        assert refresh()["refreshed"] == 1
+        assert rescore.call_count == 2
+
+    @override_settings(SCORE_REFRESH_RATE_LIMIT=2)
+    def test_rate_limit_per_community(
+        self, scorer_community, scorer_community_with_binary_scorer, rescore, now
+    ):
+        create_scores(scorer_community, [now + timedelta(minutes=i) for i in range(3)])
+        create_scores(
+            scorer_community_with_binary_scorer,
+            [now + timedelta(minutes=i, seconds=30) for i in range(1)],
+        )
+
+        report = refresh()
+
+        assert report["refreshed"] == 3
+        assert report["throttled"] == 1
+        assert sorted(call.args[0].id for call in rescore.call_args_list) == sorted(
+            [scorer_community.id] * 2 + [scorer_community_with_binary_scorer.id]
+        )
+
+    def test_command_reports_lag(self, scorer_community, rescore, capsys, now):
+        create_scores(scorer_community, [now - timedelta(minutes=5)])
+
+        call_command("refresh_expiring_scores", "--community-id", scorer_community.id)
+
+        captured = capsys.readouterr()
+        assert "refreshed: 1" in captured.out
+        assert "refreshed_after_expiration: 1" in captured.out
+
+    def test_failed_refresh_keeps_previous_score(self, scorer_community, rescore, now):
+        [score] = create_scores(scorer_community, [now + timedelta(minutes=30)])
+        rescore.failing.add(score.passport.address)
+
+        report = refresh()
+
+        assert report["refreshed"] == 1
+        assert report["failed"] == 1
+        score.refresh_from_db()
+        assert score.status == Score.Status.DONE
+        assert score.score == 1
+        assert score.error is None
+
+    def test_refresh_joins_scoring_in_progress(
+        self, scorer_community, rescore, now, mocker
+    ):
+        [score] = create_scores(scorer_community, [now + timedelta(minutes=30)])
+        # Another process holds the lease, and has saved its score
+        mocker.patch("registry.single_flight.await_lease_release", return_value=True)
+        mocker.patch("registry.single_flight.aacquire_lease", return_value=False)
+
+        report = refresh()
+
+        assert report["refreshed"] == 1
+        assert rescore.call_count == 0
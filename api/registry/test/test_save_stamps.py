@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+
+import pytest
+from asgiref.sync import async_to_sync
+from registry.atasks import asave_stamps
+from registry.models import Stamp
+
+pytestmark = pytest.mark.django_db
+
+
+def make_stamp(provider, hash, expiration_date="2099-01-01T00:00:00+00:00"):
+    return {
+        "provider": provider,
+        "credential": {
+            "credentialSubject": {"hash": hash, "provider": provider},
+            "expirationDate": expiration_date,
+        },
+    }
+
+
+def save(passport, stamps, providers=None):
+    async_to_sync(asave_stamps)(passport, {"stamps": stamps}, providers=providers)
+
+
+def get_stamps(passport):
+    return {
+        stamp.hash: (stamp.provider, stamp.credential)
+        for stamp in Stamp.objects.filter(passport=passport)
+    }
+
+
+class TestSaveStamps:
+    def test_save_new_stamps(self, scorer_passport, django_assert_num_queries):
+        stamps = [make_stamp(f"Provider{i}", f"hash{i}") for i in range(30)]
+
+        # Load the existing stamps, insert the new ones
+        with django_assert_num_queries(2):
+            save(scorer_passport, stamps)
+
+        assert get_stamps(scorer_passport) == {
+            stamp["credential"]["credentialSubject"]["hash"]: (
+                stamp["provider"],
+                stamp["credential"],
+            )
+            for stamp in stamps
+        }
+
+    def test_unchanged_stamps_are_not_written(
+        self, scorer_passport, django_assert_num_queries
+    ):
+        stamps = [make_stamp(f"Provider{i}", f"hash{i}") for i in range(30)]
+        save(scorer_passport, stamps)
+        ids = set(Stamp.objects.values_list("id", flat=True))
+
+        with django_assert_num_queries(1):
+            save(scorer_passport, stamps)
+
+        assert set(Stamp.objects.values_list("id", flat=True)) == ids
+
+    def test_sync_changed_and_removed_stamps(
+        self, scorer_passport, django_assert_num_queries
+    ):
+        save(
+            scorer_passport,
+            [make_stamp(f"Provider{i}", f"hash{i}") for i in range(30)],
+        )
+        unchanged_id = Stamp.objects.get(hash="hash1").id
+
+        stamps = [make_stamp(f"Provider{i}", f"hash{i}") for i in range(1, 29)]
+        # A renewed stamp (same hash) and a new stamp
+        stamps[0] = make_stamp(
+            "Provider1", "hash1", expiration_date="2099-06-01T00:00:00+00:00"
+        )
+        stamps.append(make_stamp("Provider30", "hash30"))
+
+        # Load the existing stamps, upsert the changed ones, delete the stale ones
+        with django_assert_num_queries(3):
+            save(scorer_passport, stamps)
+
+        saved_stamps = get_stamps(scorer_passport)
+        assert set(saved_stamps) == {f"hash{i}" for i in range(1, 29)} | {"hash30"}
+        assert saved_stamps["hash1"] == ("Provider1", stamps[0]["credential"])
+        # The renewed stamp has been updated in place
+        assert Stamp.objects.get(hash="hash1").id == unchanged_id
+
+    def test_sync_only_given_providers(self, scorer_passport):
+        save(
+            scorer_passport,
+            [make_stamp("Google", "google"), make_stamp("Ens", "ens")],
+        )
+
+        save(scorer_passport, [make_stamp("Google", "google2")], providers=["Google"])
+
+        assert set(get_stamps(scorer_passport)) == {"google2", "ens"}
+
+    def test_expiration_date_and_issuer_columns(self, scorer_passport):
+        stamp = make_stamp("Google", "google")
+        stamp["credential"]["issuer"] = "did:key:issuer"
+        # A stamp saved before the columns were added
+        Stamp.objects.create(
+            passport=scorer_passport,
+            provider="Google",
+            hash="google",
+            credential=stamp["credential"],
+        )
+
+        save(scorer_passport, [stamp])
+
+        saved_stamp = Stamp.objects.get(hash="google")
+        assert saved_stamp.expiration_date == datetime(2099, 1, 1, tzinfo=timezone.utc)
+        assert saved_stamp.issuer == "did:key:issuer"
@@ -4,12 +4,16 @@ from decimal import Decimal
 from unittest.mock import call, patch
 
 from account.models import Account, AccountAPIKey, Community
+from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import Client, TransactionTestCase
 from registry.api.v2 import SubmitPassportPayload, a_submit_passport, get_score
+from registry.atasks import ascore_passport
+from registry.fingerprint import get_fingerprint_stats, reset_fingerprint_stats
 from registry.models import Event, HashScorerLink, Passport, Score, Stamp
 from registry.tasks import score_passport_passport, score_registry_passport
+from scorer_weighted.weight_table import aget_weight_table, bump_weights_version
 from web3 import Web3
 from datetime import datetime, timezone, timedelta
 import copy
@@ -491,3 +495,150 @@ class TestScorePassportTestCase(TransactionTestCase):
 
                 assert score.score == 0
                 assert score.expiration_date is None
+
+    def _mock_aget_passport(self, passport_data):
+        async def aget_passport(address="", providers=None):
+            return {
+                "stamps": [
+                    stamp
+                    for stamp in passport_data["stamps"]
+                    if providers is None or stamp["provider"] in providers
+                ]
+            }
+
+        return aget_passport
+
+    def _score(self, passport_data, changed_providers=None):
+        passport, _ = Passport.objects.get_or_create(
+            address=self.account.address.lower(), community_id=self.community.pk
+        )
+        score, _ = Score.objects.get_or_create(
+            passport=passport,
+            defaults=dict(score=None, status=Score.Status.PROCESSING),
+        )
+        with patch(
+            "registry.atasks.aget_passport",
+            side_effect=self._mock_aget_passport(passport_data),
+        ) as mock_aget_passport:
+            with patch(
+                "registry.atasks.validate_credential", side_effect=mock_validate
+            ):
+                async_to_sync(ascore_passport)(
+                    self.community,
+                    passport,
+                    passport.address,
+                    score,
+                    changed_providers,
+                )
+                score.save()
+        return score, mock_aget_passport
+
+    def test_incremental_score_update(self):
+        """
+        Test that patching the stamps of some providers updates the score incrementally,
+        with the same result as a full recalculation
+        """
+        self._score(mock_passport_data)
+
+        # Replace the Google stamp by one expiring later, and remove the Ens stamp
+        patched_passport_data = copy.deepcopy(mock_passport_data)
+        patched_passport_data["stamps"] = patched_passport_data["stamps"][1:]
+        google_stamp = patched_passport_data["stamps"][0]
+        google_stamp["credential"]["credentialSubject"]["hash"] = "0x99999"
+        google_stamp["credential"]["expirationDate"] = (
+            now + timedelta(days=10)
+        ).isoformat()
+
+        score, mock_aget_passport = self._score(
+            patched_passport_data, changed_providers=["Google", "Ens"]
+        )
+
+        # Only the stamps of the patched providers have been loaded
+        mock_aget_passport.assert_called_once_with(
+            self.account.address.lower(), providers=["Ens", "Google"]
+        )
+        assert score.status == Score.Status.DONE
+        assert score.score == Decimal(1)
+        assert score.expiration_date == expiration_dates[2]
+        assert score.stamp_scores == {"Gitcoin": 0.0, "Google": 1.0}
+        assert sorted(
+            Stamp.objects.filter(passport=score.passport).values_list("hash", flat=True)
+        ) == ["0x45678", "0x99999"]
+
+        full_score, _ = self._score(patched_passport_data)
+        assert full_score.score == score.score
+        assert full_score.evidence == score.evidence
+        assert full_score.expiration_date == score.expiration_date
+        assert full_score.stamp_scores == score.stamp_scores
+
+    def test_incremental_score_update_falls_back_when_weights_changed(self):
+        score, _ = self._score(mock_passport_data)
+        assert score.weights_version is not None
+
+        bump_weights_version(community_ids=[self.community.pk])
+
+        score, mock_aget_passport = self._score(
+            mock_passport_data, changed_providers=["Google"]
+        )
+
+        # The full passport has been loaded and rescored
+        mock_aget_passport.assert_called_once_with(self.account.address.lower())
+        assert score.status == Score.Status.DONE
+        assert score.score == Decimal(3)
+
+    def test_weight_table_is_read_once(self):
+        with patch(
+            "registry.atasks.aget_weight_table", wraps=aget_weight_table
+        ) as mock_aget_weight_table, patch(
+            "scorer_weighted.computation.aget_weight_table", wraps=aget_weight_table
+        ) as mock_computation_aget_weight_table:
+            score, _ = self._score(mock_passport_data)
+
+        assert score.status == Score.Status.DONE
+        assert mock_aget_weight_table.call_count == 1
+        mock_computation_aget_weight_table.assert_not_called()
+
+    def test_unchanged_passport_is_not_rescored(self):
+        reset_fingerprint_stats()
+        score, _ = self._score(mock_passport_data)
+        assert score.fingerprint is not None
+
+        with patch("registry.atasks.avalidate_credentials") as mock_avalidate:
+            score, _ = self._score(mock_passport_data)
+
+        mock_avalidate.assert_not_called()
+        assert score.status == Score.Status.DONE
+        assert score.score == Decimal(3)
+        assert get_fingerprint_stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    def test_changed_passport_is_rescored(self):
+        reset_fingerprint_stats()
+        score, _ = self._score(mock_passport_data)
+        fingerprint = score.fingerprint
+
+        # A renewed stamp keeps its hash, but has a new proof
+        renewed_passport_data = copy.deepcopy(mock_passport_data)
+        renewed_passport_data["stamps"][0]["credential"]["proof"] = {
+            "proofValue": "renewed"
+        }
+        score, _ = self._score(renewed_passport_data)
+        assert score.fingerprint != fingerprint
+        fingerprint = score.fingerprint
+
+        # Changing the weights changes the fingerprint
+        bump_weights_version(community_ids=[self.community.pk])
+        score, _ = self._score(renewed_passport_data)
+        assert score.fingerprint != fingerprint
+        fingerprint = score.fingerprint
+
+        # Another address claiming one of the hashes changes the fingerprint
+        HashScorerLink.objects.filter(hash="0x88888").update(
+            address=self.account_2.address
+        )
+        score, _ = self._score(renewed_passport_data)
+        assert score.fingerprint != fingerprint
+        # The Google stamp is now owned by another address
+        assert score.score == Decimal(2)
+
+        assert get_fingerprint_stats()["hits"] == 0
+        assert get_fingerprint_stats()["misses"] == 4
@@ -0,0 +1,165 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from registry.api.v1 import SubmitPassportPayload, ahandle_submit_passport
+from registry.models import Score
+from registry.single_flight import (
+    acoalesce_scoring,
+    get_single_flight_stats,
+    lease_key,
+)
+
+ADDRESS = "0x0636f974d29d947d4946b2091d769ec6d2d415de"
+
+
+@pytest.fixture(autouse=True)
+def cache_keys(mocker):
+    # The cache is shared by the tests
+    prefix = uuid.uuid4().hex
+    mocker.patch("registry.single_flight.LEASE_KEY_PREFIX", f"{prefix}:lease")
+    mocker.patch("registry.single_flight.STATS_KEY_PREFIX", f"{prefix}:stats")
+
+
+def slow_scoring(score=None, delay=0.1):
+    async def ascore():
+        await asyncio.sleep(delay)
+        return score if score is not None else Score(status=Score.Status.DONE)
+
+    return AsyncMock(side_effect=ascore)
+
+
+async def agather(*coroutines):
+    return await asyncio.gather(*coroutines)
+
+
+class TestSingleFlight:
+    def test_concurrent_requests_are_coalesced(self):
+        ascore = slow_scoring()
+        aread_score = AsyncMock()
+
+        first, second = asyncio.run(
+            agather(
+                acoalesce_scoring(ADDRESS, 1, ascore, aread_score),
+                acoalesce_scoring(ADDRESS, 1, ascore, aread_score),
+            )
+        )
+
+        assert first is second
+        assert ascore.call_count == 1
+        aread_score.assert_not_called()
+        stats = get_single_flight_stats()
+        assert stats["leaders"] == 1
+        assert stats["coalesced_local"] == 1
+        assert stats["coalesced_ratio"] == 0.5
+
+    def test_other_passports_are_not_coalesced(self):
+        ascore = slow_scoring()
+
+        asyncio.run(
+            agather(
+                acoalesce_scoring(ADDRESS, 1, ascore, AsyncMock()),
+                acoalesce_scoring(ADDRESS, 2, ascore, AsyncMock()),
+            )
+        )
+
+        assert ascore.call_count == 2
+
+    def test_requests_with_changes_do_not_join(self):
+        ascore = slow_scoring()
+
+        asyncio.run(
+            agather(
+                acoalesce_scoring(ADDRESS, 1, ascore, AsyncMock()),
+                acoalesce_scoring(ADDRESS, 1, ascore, AsyncMock(), join=False),
+            )
+        )
+
+        assert ascore.call_count == 2
+        assert get_single_flight_stats()["coalesced_local"] == 0
+
+    def test_error_of_the_leader_is_shared(self):
+        async def ascore():
+            await asyncio.sleep(0.1)
+            raise ValueError("scoring failed")
+
+        async def arequests():
+            return await asyncio.gather(
+                acoalesce_scoring(ADDRESS, 1, ascore, AsyncMock()),
+                acoalesce_scoring(ADDRESS, 1, ascore, AsyncMock()),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(arequests())
+
+        assert [str(result) for result in results] == ["scoring failed"] * 2
+
+    @override_settings(SCORE_SINGLE_FLIGHT_POLL_INTERVAL=0.01)
+    def test_score_of_other_worker_is_read(self):
+        saved_score = Score(status=Score.Status.DONE)
+        ascore = slow_scoring()
+        aread_score = AsyncMock(return_value=saved_score)
+
+        async def aother_worker():
+            await cache.aadd(lease_key(ADDRESS, 1), "other", timeout=10)
+            await asyncio.sleep(0.1)
+            await cache.adelete(lease_key(ADDRESS, 1))
+
+        async def arequest():
+            await asyncio.sleep(0.01)
+            return await acoalesce_scoring(ADDRESS, 1, ascore, aread_score)
+
+        _, score = asyncio.run(agather(aother_worker(), arequest()))
+
+        assert score is saved_score
+        ascore.assert_not_called()
+        assert get_single_flight_stats()["coalesced_remote"] == 1
+
+    @override_settings(SCORE_SINGLE_FLIGHT_WAIT=0, SCORE_SINGLE_FLIGHT_POLL_INTERVAL=0)
+    def test_passport_is_scored_if_the_lease_is_not_released(self):
+        cache.add(lease_key(ADDRESS, 1), "other", timeout=10)
+        ascore = slow_scoring(delay=0)
+        aread_score = AsyncMock()
+
+        asyncio.run(acoalesce_scoring(ADDRESS, 1, ascore, aread_score))
+
+        ascore.assert_called_once()
+        aread_score.assert_not_called()
+        stats = get_single_flight_stats()
+        assert stats["coalesced_remote"] == 1
+        assert stats["fallbacks"] == 1
+
+    def test_stats_command(self, capsys):
+        asyncio.run(acoalesce_scoring(ADDRESS, 1, slow_scoring(delay=0), AsyncMock()))
+
+        call_command("score_single_flight_stats", "--reset")
+
+        captured = capsys.readouterr()
+        assert "leaders: 1, coalesced locally: 0" in captured.out
+        assert get_single_flight_stats()["leaders"] == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_submissions_are_scored_once(scorer_community, scorer_account):
+    async def ascore_passport(community, passport, address, score, *args):
+        await asyncio.sleep(0.1)
+        score.score = 1
+        score.status = Score.Status.DONE
+
+    payload = SubmitPassportPayload(address=ADDRESS, scorer_id=scorer_community.id)
+    with patch(
+        "registry.api.v1.ascore_passport", side_effect=ascore_passport
+    ) as mock_score:
+        responses = asyncio.run(
+            agather(
+                *[ahandle_submit_passport(payload, scorer_account) for _ in range(3)]
+            )
+        )
+
+    assert mock_score.call_count == 1
+    assert [response.status for response in responses] == ["DONE"] * 3
+    assert Score.objects.get(passport__address=ADDRESS).status == Score.Status.DONE
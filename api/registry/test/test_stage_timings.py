@@ -0,0 +1,123 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from account.models import Community
+from asgiref.sync import async_to_sync
+from django.test import Client, override_settings
+from registry.atasks import ascore_passport
+from registry.instrumentation import collect_timings, stage
+from registry.models import Passport, Score
+from registry.test.test_passport_submission import mock_passport
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+SCORING_STAGES = [
+    "load_passport_data",
+    "fingerprint",
+    "validate_credentials",
+    "deduplication",
+    "save_stamps",
+    "calculate_score",
+]
+
+
+def submit_passport(community, api_key, address):
+    with patch("registry.atasks.aget_passport", return_value=mock_passport), patch(
+        "registry.atasks.validate_credential", return_value=[]
+    ):
+        return Client().post(
+            "/registry/submit-passport",
+            json.dumps({"community": community.id, "address": address}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {api_key}",
+        )
+
+
+class TestStageTimings:
+    @override_settings(FF_STAGE_TIMING="on")
+    def test_stages_and_queries_are_timed(self, scorer_community):
+        with collect_timings() as timings:
+            with stage("count"):
+                Community.objects.count()
+                Community.objects.count()
+            with stage("no_query"):
+                pass
+            # Not in a stage
+            Community.objects.count()
+            with stage("count"):
+                Community.objects.count()
+
+        assert list(timings.stages) == ["count", "no_query"]
+        assert timings.stages["count"].num_queries == 3
+        assert timings.stages["count"].query_duration > 0
+        assert timings.stages["no_query"].num_queries == 0
+        assert timings.as_log_fields()["stage_count_queries"] == 3
+
+    @override_settings(FF_STAGE_TIMING="on")
+    def test_nested_timings_are_added_to_the_enclosing_ones(self, scorer_community):
+        with collect_timings() as outer:
+            with collect_timings() as inner:
+                with stage("count"):
+                    Community.objects.count()
+
+        assert inner.stages["count"].num_queries == 1
+        assert outer.stages["count"].num_queries == 1
+
+    def test_no_timings_when_disabled(self):
+        with collect_timings() as timings:
+            with stage("count") as timing:
+                Community.objects.count()
+
+        assert timings is None
+        assert timing is None
+
+    @override_settings(FF_STAGE_TIMING="on")
+    def test_score_passport_stage_timings_are_logged(
+        self, scorer_community, scorer_account
+    ):
+        passport = Passport.objects.create(
+            address=scorer_account.address, community=scorer_community
+        )
+        score = Score.objects.create(passport=passport)
+
+        with patch("registry.atasks.aget_passport", return_value=mock_passport), patch(
+            "registry.atasks.validate_credential", return_value=[]
+        ), patch("registry.instrumentation.log.info") as log_info:
+            async_to_sync(ascore_passport)(
+                scorer_community, passport, passport.address, score
+            )
+
+        assert score.status == Score.Status.DONE
+        log_info.assert_called_once()
+        server_timing = log_info.call_args.args[2]
+        for name in SCORING_STAGES:
+            assert f"{name};dur=" in server_timing
+
+    @override_settings(FF_STAGE_TIMING="on")
+    def test_server_timing_header(self, scorer_community, scorer_api_key):
+        response = submit_passport(
+            scorer_community,
+            scorer_api_key,
+            "0x0636F974D29d947d4946b2091d769ec6D2d415DE",
+        )
+
+        assert response.status_code == 200
+        metrics = {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+        assert list(metrics) == SCORING_STAGES
+        assert 'desc="0 queries' not in metrics["save_stamps"]
+
+    def test_no_server_timing_header_when_disabled(
+        self, scorer_community, scorer_api_key
+    ):
+        response = submit_passport(
+            scorer_community,
+            scorer_api_key,
+            "0x0636F974D29d947d4946b2091d769ec6D2d415DE",
+        )
+
+        assert response.status_code == 200
+        assert not response.has_header("Server-Timing")
@@ -0,0 +1,167 @@
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.parquet as pq
+import pytest
+from django.test import Client, override_settings
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db(
+    transaction=True, databases=["default", "read_replica_0"]
+)
+
+TIMESTAMP = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def export_scores(api_key, scorer_id, **params):
+    return Client().get(
+        f"/registry/v2/score/{scorer_id}/export",
+        params,
+        HTTP_AUTHORIZATION=f"Token {api_key}",
+    )
+
+
+def read_lines(response) -> list:
+    content = gzip.decompress(b"".join(response)).decode("utf-8")
+    return [json.loads(line) for line in content.splitlines()]
+
+
+@pytest.fixture(name="scores")
+def fixture_scores(scorer_community):
+    scores = []
+    # Created in the reverse order of their timestamps
+    for idx in reversed(range(5)):
+        passport = Passport.objects.create(
+            address=f"0x{idx:040x}", community=scorer_community
+        )
+        scores.append(
+            Score.objects.create(
+                passport=passport,
+                score=idx,
+                status=Score.Status.DONE,
+                last_score_timestamp=TIMESTAMP + timedelta(days=idx),
+                evidence={
+                    "type": "ThresholdScoreCheck",
+                    "success": True,
+                    "rawScore": str(idx),
+                    "threshold": "1",
+                },
+                stamp_scores={"Google": "1.0"},
+            )
+        )
+    return list(reversed(scores))
+
+
+class TestExportScores:
+    def test_export_ndjson(self, scorer_api_key, scorer_community, scores):
+        response = export_scores(scorer_api_key, scorer_community.id)
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/gzip"
+        assert (
+            response["Content-Disposition"]
+            == f'attachment; filename="scores_{scorer_community.id}.ndjson.gz"'
+        )
+        lines = read_lines(response)
+        assert [line["address"] for line in lines] == [
+            score.passport.address for score in scores
+        ]
+        assert lines[1] == {
+            "id": scores[1].id,
+            "address": scores[1].passport.address,
+            "score": "1.000000000",
+            "status": "DONE",
+            "last_score_timestamp": "2024-01-02T00:00:00+00:00",
+            "expiration_date": None,
+            "evidence": {
+                "type": "ThresholdScoreCheck",
+                "success": True,
+                "rawScore": "1",
+                "threshold": "1",
+            },
+            "error": None,
+            "stamp_scores": {"Google": "1.0"},
+        }
+
+    @override_settings(SCORE_EXPORT_CHUNK_SIZE=2)
+    def test_export_parquet(self, scorer_api_key, scorer_community, scores):
+        response = export_scores(scorer_api_key, scorer_community.id, format="parquet")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/vnd.apache.parquet"
+        parquet_file = pq.ParquetFile(io.BytesIO(b"".join(response)))
+        # One row group per chunk
+        assert parquet_file.num_row_groups == 3
+        rows = parquet_file.read().to_pylist()
+        assert [row["address"] for row in rows] == [
+            score.passport.address for score in scores
+        ]
+        assert rows[1]["id"] == scores[1].id
+        assert rows[1]["last_score_timestamp"] == TIMESTAMP + timedelta(days=1)
+        assert json.loads(rows[1]["stamp_scores"]) == {"Google": "1.0"}
+
+    def test_export_since(self, scorer_api_key, scorer_community, scores):
+        response = export_scores(
+            scorer_api_key,
+            scorer_community.id,
+            since=scores[2].last_score_timestamp.isoformat(),
+        )
+
+        assert response.status_code == 200
+        # The scores updated at `since` are exported again
+        assert [line["id"] for line in read_lines(response)] == [
+            score.id for score in scores[2:]
+        ]
+
+    def test_export_since_id(self, scorer_api_key, scorer_community, scores):
+        # Scores updated at the same time
+        Score.objects.filter(pk__in=[scores[2].pk, scores[3].pk]).update(
+            last_score_timestamp=scores[2].last_score_timestamp
+        )
+        lines = read_lines(export_scores(scorer_api_key, scorer_community.id))
+        last = lines[2]
+
+        response = export_scores(
+            scorer_api_key,
+            scorer_community.id,
+            since=last["last_score_timestamp"],
+            since_id=last["id"],
+        )
+
+        assert response.status_code == 200
+        assert read_lines(response) == lines[3:]
+
+    def test_export_without_scores(self, scorer_api_key, scorer_community):
+        response = export_scores(scorer_api_key, scorer_community.id, format="parquet")
+
+        assert response.status_code == 200
+        assert pq.ParquetFile(io.BytesIO(b"".join(response))).metadata.num_rows == 0
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_export_counts_as_one_request(
+        self, scorer_api_key, scorer_community, scores, mocker
+    ):
+        # All the requests in the same rate limit window
+        mocker.patch("django_ratelimit.core.time").time.return_value = 1_700_000_000
+        # The rate limit of the API key is 3 requests / 30 seconds
+        for _ in range(3):
+            response = export_scores(scorer_api_key, scorer_community.id)
+            assert response.status_code == 200
+            b"".join(response)
+
+        response = export_scores(scorer_api_key, scorer_community.id)
+        assert response.status_code == 403
+
+    def test_unknown_scorer(self, scorer_api_key, scorer_community, scores):
+        response = export_scores(scorer_api_key, 123456)
+
+        assert response.status_code == 404
+
+    def test_without_read_scores_permission(
+        self, scorer_api_key_no_permissions, scorer_community, scores
+    ):
+        response = export_scores(scorer_api_key_no_permissions, scorer_community.id)
+
+        assert response.status_code == 403
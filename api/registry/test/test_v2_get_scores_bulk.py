@@ -0,0 +1,138 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db(
+    transaction=True, databases=["default", "read_replica_0"]
+)
+
+UNKNOWN_ADDRESS = "0x4e9b3a4f3a3a9e2bbb8e1df2e59b50c8e7f2f1a0"
+
+
+def get_scores(api_key, scorer_id, addresses):
+    return Client().post(
+        f"/registry/v2/stamps/{scorer_id}/scores",
+        json.dumps({"addresses": addresses}),
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Token {api_key}",
+    )
+
+
+@pytest.fixture(name="scores")
+def fixture_scores(scorer_community):
+    addresses = [f"0x{idx:040x}" for idx in range(1, 4)]
+    for idx, address in enumerate(addresses):
+        passport = Passport.objects.create(address=address, community=scorer_community)
+        Score.objects.create(
+            passport=passport,
+            score=idx,
+            status=Score.Status.DONE,
+            last_score_timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            evidence={
+                "type": "ThresholdScoreCheck",
+                "success": True,
+                "rawScore": str(idx),
+                "threshold": "1",
+            },
+            stamp_scores={"Google": "1.0"},
+        )
+    return addresses
+
+
+class TestGetScoresBulk:
+    def test_scores_are_returned_in_order(
+        self, scorer_api_key, scorer_community, scores
+    ):
+        addresses = [scores[2], UNKNOWN_ADDRESS, scores[0].upper().replace("X", "x")]
+
+        response = get_scores(scorer_api_key, scorer_community.id, addresses)
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [result["address"] for result in results] == [
+            scores[2],
+            UNKNOWN_ADDRESS,
+            scores[0],
+        ]
+        assert [result["found"] for result in results] == [True, False, True]
+        assert results[0]["score"] == "2.000000000"
+        assert results[0]["status"] == "DONE"
+        assert results[0]["last_score_timestamp"] == "2024-01-01T00:00:00+00:00"
+        assert results[0]["evidence"]["rawScore"] == "2"
+        assert results[0]["stamp_scores"] == {"Google": "1.0"}
+        assert results[1]["score"] is None
+        assert results[1]["status"] is None
+        assert results[1]["error"] is None
+
+    def test_scores_are_read_in_one_query(
+        self, scorer_api_key, scorer_community, scores, settings
+    ):
+        settings.REGISTRY_API_READ_DB = "read_replica_0"
+
+        with CaptureQueriesContext(
+            connections["read_replica_0"]
+        ) as replica_queries, CaptureQueriesContext(
+            connections["default"]
+        ) as default_queries:
+            response = get_scores(scorer_api_key, scorer_community.id, scores)
+
+        assert response.status_code == 200
+        assert [result["found"] for result in response.json()] == [True] * 3
+        score_queries = [
+            query["sql"]
+            for query in replica_queries.captured_queries
+            + default_queries.captured_queries
+            if '"registry_score"' in query["sql"]
+        ]
+        assert len(score_queries) == 1
+        assert any(
+            query["sql"] in score_queries for query in replica_queries.captured_queries
+        )
+
+    def test_invalid_addresses_are_marked(self, scorer_api_key, scorer_community):
+        response = get_scores(scorer_api_key, scorer_community.id, ["0x123"])
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {
+                "address": "0x123",
+                "found": False,
+                "score": None,
+                "status": None,
+                "last_score_timestamp": None,
+                "expiration_date": None,
+                "evidence": None,
+                "error": "Invalid address.",
+                "stamp_scores": None,
+            }
+        ]
+
+    @override_settings(GET_SCORES_BULK_MAX_ADDRESSES=1)
+    def test_too_many_addresses(self, scorer_api_key, scorer_community, scores):
+        response = get_scores(scorer_api_key, scorer_community.id, scores)
+
+        assert response.status_code == 400
+
+    def test_no_addresses(self, scorer_api_key, scorer_community, scores):
+        response = get_scores(scorer_api_key, scorer_community.id, [])
+
+        assert response.status_code == 422
+
+    def test_unknown_scorer(self, scorer_api_key, scorer_community, scores):
+        response = get_scores(scorer_api_key, 123456, scores)
+
+        assert response.status_code == 404
+
+    def test_without_read_scores_permission(
+        self, scorer_api_key_no_permissions, scorer_community, scores
+    ):
+        response = get_scores(
+            scorer_api_key_no_permissions, scorer_community.id, scores
+        )
+
+        assert response.status_code == 403
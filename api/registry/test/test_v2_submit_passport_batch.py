@@ -0,0 +1,170 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from account.models import AccountAPIKeyAnalytics
+from django.core.cache.backends.redis import RedisCache
+from django.test import Client, override_settings
+from registry.models import Score
+from registry.test.test_passport_submission import mock_passport
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+ADDRESSES = [
+    "0x0636F974D29d947d4946b2091d769ec6D2d415DE",
+    "0x4e9b3a4f3a3a9e2bbb8e1df2e59b50c8e7f2f1a0",
+]
+
+
+def submit_batch(api_key, scorer_id, addresses):
+    return Client().post(
+        "/registry/v2/submit-passport/batch",
+        json.dumps({"scorer_id": str(scorer_id), "addresses": addresses}),
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Token {api_key}",
+    )
+
+
+def read_lines(response) -> list:
+    content = b"".join(response).decode("utf-8")
+    return [json.loads(line) for line in content.splitlines()]
+
+
+@pytest.fixture(name="rate_limit_window")
+def fixture_rate_limit_window(mocker):
+    """All the requests of the test in the same rate limit window"""
+    mocker.patch("django_ratelimit.core.time").time.return_value = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def scoring():
+    with patch("registry.atasks.aget_passport", return_value=mock_passport), patch(
+        "registry.atasks.validate_credential", return_value=[]
+    ):
+        yield
+
+
+class TestSubmitPassportBatch:
+    @override_settings(FF_API_ANALYTICS="on")
+    def test_scores_are_streamed(
+        self, scorer_api_key, scorer_community_with_binary_scorer
+    ):
+        response = submit_batch(
+            scorer_api_key,
+            scorer_community_with_binary_scorer.id,
+            ADDRESSES + ["0x123"],
+        )
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = {line["address"]: line for line in read_lines(response)}
+        assert set(lines) == {address.lower() for address in ADDRESSES} | {"0x123"}
+        for address in ADDRESSES:
+            assert lines[address.lower()]["status"] == "DONE"
+        assert lines["0x123"]["error"] == "Invalid address."
+        assert Score.objects.filter(status=Score.Status.DONE).count() == 2
+        # One analytics row for the batch
+        assert AccountAPIKeyAnalytics.objects.count() == 1
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_rate_limit_counts_addresses(
+        self, scorer_api_key, scorer_community_with_binary_scorer, rate_limit_window
+    ):
+        # The rate limit of the API key is 3 requests / 30 seconds
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES
+        )
+        assert response.status_code == 200
+        read_lines(response)
+
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES
+        )
+        assert response.status_code == 403
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_rate_limit_is_charged_at_once(
+        self,
+        scorer_api_key,
+        scorer_community_with_binary_scorer,
+        rate_limit_window,
+        mocker,
+    ):
+        incr = mocker.spy(RedisCache, "incr")
+
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES
+        )
+
+        assert response.status_code == 200
+        rate_limit_increments = [
+            call.kwargs.get("delta", 1)
+            for call in incr.call_args_list
+            if call.args[1].startswith("rl:")
+        ]
+        assert rate_limit_increments == [2]
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_batch_over_rate_limit(
+        self, scorer_api_key, scorer_community_with_binary_scorer, rate_limit_window
+    ):
+        addresses = [f"0x{idx:040x}" for idx in range(4)]
+
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, addresses
+        )
+
+        assert response.status_code == 403
+        assert Score.objects.count() == 0
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_rate_limit_counts_distinct_addresses(
+        self, scorer_api_key, scorer_community_with_binary_scorer, rate_limit_window
+    ):
+        # The rate limit of the API key is 3 requests / 30 seconds
+        response = submit_batch(
+            scorer_api_key,
+            scorer_community_with_binary_scorer.id,
+            ADDRESSES + [address.lower() for address in ADDRESSES],
+        )
+        assert response.status_code == 200
+        assert len(read_lines(response)) == 2
+
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES[:1]
+        )
+        assert response.status_code == 200
+
+    @override_settings(RATELIMIT_ENABLE=True, SUBMIT_PASSPORT_MAX_BATCH_SIZE=2)
+    def test_invalid_batches_are_not_counted(
+        self, scorer_api_key, scorer_community_with_binary_scorer, rate_limit_window
+    ):
+        for _ in range(2):
+            response = submit_batch(scorer_api_key, 123456, ADDRESSES)
+            assert response.status_code == 404
+
+            response = submit_batch(
+                scorer_api_key,
+                scorer_community_with_binary_scorer.id,
+                ADDRESSES + ["0x123"],
+            )
+            assert response.status_code == 400
+
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES
+        )
+        assert response.status_code == 200
+
+    @override_settings(SUBMIT_PASSPORT_MAX_BATCH_SIZE=1)
+    def test_batch_too_large(self, scorer_api_key, scorer_community_with_binary_scorer):
+        response = submit_batch(
+            scorer_api_key, scorer_community_with_binary_scorer.id, ADDRESSES
+        )
+
+        assert response.status_code == 400
+
+    def test_unknown_scorer(self, scorer_api_key, scorer_community_with_binary_scorer):
+        response = submit_batch(scorer_api_key, 123456, ADDRESSES)
+
+        assert response.status_code == 404
+        assert Score.objects.count() == 0
@@ -0,0 +1,140 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from account.models import AccountAPIKeyAnalytics
+from django.test import Client, override_settings
+from registry.atasks import avalidate_credentials
+from registry.models import Score
+from registry.test.test_passport_submission import mock_passport
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+ADDRESS = "0x0636F974D29d947d4946b2091d769ec6D2d415DE"
+
+
+def submit_passport(api_key, scorer_ids, address=ADDRESS):
+    return Client().post(
+        f"/registry/v2/stamps/{address}/score",
+        json.dumps({"scorer_ids": scorer_ids}),
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Token {api_key}",
+    )
+
+
+@pytest.fixture(name="scoring")
+def fixture_scoring():
+    with patch(
+        "registry.atasks.aget_passport", return_value=mock_passport
+    ) as aget_passport, patch(
+        "registry.atasks.validate_credential", return_value=[]
+    ), patch(
+        "registry.atasks.avalidate_credentials", wraps=avalidate_credentials
+    ) as avalidate:
+        yield aget_passport, avalidate
+
+
+class TestSubmitPassportToScorers:
+    @override_settings(FF_API_ANALYTICS="on")
+    def test_passport_is_loaded_and_verified_once(
+        self,
+        scorer_api_key,
+        scorer_community_with_binary_scorer,
+        scorer_community_with_weighted_scorer,
+        scoring,
+    ):
+        aget_passport, avalidate = scoring
+        scorer_ids = [
+            str(scorer_community_with_weighted_scorer.id),
+            str(scorer_community_with_binary_scorer.id),
+        ]
+
+        response = submit_passport(scorer_api_key, scorer_ids)
+
+        assert response.status_code == 200
+        scores = response.json()
+        assert [score["status"] for score in scores] == ["DONE", "DONE"]
+        assert [score["address"] for score in scores] == [ADDRESS.lower()] * 2
+        # In the order of the scorer ids
+        assert scores[0]["evidence"] is None
+        assert scores[1]["evidence"]["type"] == "ThresholdScoreCheck"
+        assert aget_passport.call_count == 1
+        assert avalidate.call_count == 1
+        assert Score.objects.filter(status=Score.Status.DONE).count() == 2
+        assert AccountAPIKeyAnalytics.objects.count() == 1
+
+    def test_scores_of_duplicate_scorer_ids(
+        self, scorer_api_key, scorer_community_with_binary_scorer, scoring
+    ):
+        scorer_id = str(scorer_community_with_binary_scorer.id)
+
+        response = submit_passport(scorer_api_key, [scorer_id, scorer_id])
+
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        assert Score.objects.count() == 1
+
+    def test_unknown_scorer(
+        self, scorer_api_key, scorer_community_with_binary_scorer, scoring
+    ):
+        aget_passport, _ = scoring
+
+        response = submit_passport(
+            scorer_api_key, [str(scorer_community_with_binary_scorer.id), "123456"]
+        )
+
+        assert response.status_code == 404
+        aget_passport.assert_not_called()
+        assert Score.objects.count() == 0
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    def test_rate_limit_counts_scorers(
+        self,
+        scorer_api_key,
+        scorer_community_with_binary_scorer,
+        scorer_community_with_weighted_scorer,
+        scoring,
+        mocker,
+    ):
+        # All the requests in the same rate limit window
+        mocker.patch("django_ratelimit.core.time").time.return_value = 1_700_000_000
+        scorer_ids = [
+            str(scorer_community_with_binary_scorer.id),
+            str(scorer_community_with_weighted_scorer.id),
+        ]
+
+        # The rate limit of the API key is 3 requests / 30 seconds
+        response = submit_passport(scorer_api_key, scorer_ids + scorer_ids[:1])
+        assert response.status_code == 200
+
+        response = submit_passport(scorer_api_key, scorer_ids)
+        assert response.status_code == 403
+
+    @override_settings(SUBMIT_PASSPORT_MAX_SCORERS=1)
+    def test_too_many_scorers(
+        self,
+        scorer_api_key,
+        scorer_community_with_binary_scorer,
+        scorer_community_with_weighted_scorer,
+        scoring,
+    ):
+        response = submit_passport(
+            scorer_api_key,
+            [
+                str(scorer_community_with_binary_scorer.id),
+                str(scorer_community_with_weighted_scorer.id),
+            ],
+        )
+
+        assert response.status_code == 422
+
+    def test_invalid_address(
+        self, scorer_api_key, scorer_community_with_binary_scorer, scoring
+    ):
+        response = submit_passport(
+            scorer_api_key,
+            [str(scorer_community_with_binary_scorer.id)],
+            address="0x123",
+        )
+
+        assert response.status_code == 400
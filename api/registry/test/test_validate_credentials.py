@@ -0,0 +1,182 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from ceramic_cache.models import CeramicCache, Revocation
+from django.conf import settings as django_settings
+from registry.atasks import avalidate_credentials
+from registry.models import Passport
+from registry.verification_cache import local_verified_credentials
+
+now = datetime.now(timezone.utc)
+address = "0x0000000000000000000000000000000000000001"
+
+
+def make_stamp(idx, expired=False, trusted=True):
+    return {
+        "provider": f"Provider{idx}",
+        "credential": {
+            "issuer": django_settings.TRUSTED_IAM_ISSUERS[0] if trusted else "did:x",
+            "expirationDate": (now + timedelta(days=-1 if expired else 1)).isoformat(),
+            "credentialSubject": {"hash": f"0x{idx}"},
+        },
+    }
+
+
+class TestValidateCredentials:
+    def test_verification_is_concurrent_bounded_and_ordered(self, settings):
+        settings.CREDENTIAL_VERIFICATION_CONCURRENCY = 3
+        stamps = [make_stamp(idx) for idx in range(12)]
+        stamps[4] = make_stamp(4, expired=True)
+        stamps[7] = make_stamp(7, trusted=False)
+
+        active = 0
+        max_active = 0
+
+        async def mock_validate(did, credential):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(random.random() / 100)
+            active -= 1
+            # Every 3rd stamp has an invalid signature
+            if credential["credentialSubject"]["hash"] in ("0x0", "0x3", "0x6", "0x9"):
+                return ["Stamp validation failed"]
+            return []
+
+        with patch(
+            "registry.atasks.validate_credential", side_effect=mock_validate
+        ) as mock_validate_credential:
+            with patch("registry.atasks.log.info") as mock_log:
+                validated = async_to_sync(avalidate_credentials)(
+                    Passport(address=address), {"stamps": stamps}
+                )
+
+        # The expired and untrusted stamps are not verified
+        assert mock_validate_credential.call_count == 10
+        assert max_active == 3
+        assert [s["provider"] for s in validated["stamps"]] == [
+            "Provider1",
+            "Provider2",
+            "Provider5",
+            "Provider8",
+            "Provider10",
+            "Provider11",
+        ]
+        # The invalid stamps are logged in their original order
+        assert [c.args[1]["provider"] for c in mock_log.call_args_list] == [
+            "Provider0",
+            "Provider3",
+            "Provider4",
+            "Provider6",
+            "Provider7",
+            "Provider9",
+        ]
+
+    def test_verification_error_is_raised(self):
+        async def mock_validate(did, credential):
+            raise Exception("didkit error")
+
+        with patch("registry.atasks.validate_credential", side_effect=mock_validate):
+            with pytest.raises(Exception, match="didkit error"):
+                async_to_sync(avalidate_credentials)(
+                    Passport(address=address), {"stamps": [make_stamp(1)]}
+                )
+
+
+def make_signed_stamp(idx):
+    stamp = make_stamp(idx)
+    stamp["credential"]["proof"] = {"proofValue": f"0xproof{idx}"}
+    return stamp
+
+
+def validate(stamps):
+    return async_to_sync(avalidate_credentials)(
+        Passport(address=address), {"stamps": stamps}
+    )
+
+
+class TestVerifiedCredentialCache:
+    @pytest.fixture(autouse=True)
+    def clear_local_cache(self):
+        local_verified_credentials.clear()
+
+    def test_verified_credential_is_not_verified_again(self):
+        stamps = [make_signed_stamp(1), make_signed_stamp(2)]
+
+        with patch(
+            "registry.atasks.validate_credential", return_value=[]
+        ) as mock_validate_credential:
+            assert len(validate(stamps)["stamps"]) == 2
+            assert mock_validate_credential.call_count == 2
+
+            assert len(validate(stamps)["stamps"]) == 2
+            assert mock_validate_credential.call_count == 2
+
+            # The shared cache is used when the local cache misses
+            local_verified_credentials.clear()
+            assert len(validate(stamps)["stamps"]) == 2
+            assert mock_validate_credential.call_count == 2
+
+    def test_failed_verification_is_not_cached(self):
+        stamps = [make_signed_stamp(3)]
+
+        with patch(
+            "registry.atasks.validate_credential",
+            return_value=["Stamp validation failed"],
+        ) as mock_validate_credential:
+            assert validate(stamps)["stamps"] == []
+            assert validate(stamps)["stamps"] == []
+            assert mock_validate_credential.call_count == 2
+
+    def test_tampered_credential_is_verified_again(self):
+        stamp = make_signed_stamp(4)
+        with patch("registry.atasks.validate_credential", return_value=[]):
+            validate([stamp])
+
+        # Same proof, but a different hash
+        tampered_stamp = make_signed_stamp(4)
+        tampered_stamp["credential"]["credentialSubject"]["hash"] = "0xtampered"
+        with patch(
+            "registry.atasks.validate_credential",
+            return_value=["Stamp validation failed"],
+        ) as mock_validate_credential:
+            assert validate([tampered_stamp])["stamps"] == []
+            assert mock_validate_credential.call_count == 1
+
+    @pytest.mark.django_db
+    def test_revocation_purges_cache(self):
+        stamp = make_signed_stamp(5)
+        with patch("registry.atasks.validate_credential", return_value=[]):
+            validate([stamp])
+
+        Revocation.objects.create(
+            proof_value="0xproof5",
+            ceramic_cache=CeramicCache.objects.create(
+                address=address,
+                provider=stamp["provider"],
+                stamp=stamp["credential"],
+                proof_value="0xproof5",
+            ),
+        )
+
+        with patch(
+            "registry.atasks.validate_credential", return_value=[]
+        ) as mock_validate_credential:
+            validate([stamp])
+            assert mock_validate_credential.call_count == 1
+
+
+class TestValidateCredentialsCopies:
+    def test_validated_stamps_are_not_copied(self):
+        passport_data = {"stamps": [make_stamp(1), make_stamp(2, expired=True)]}
+
+        with patch("registry.atasks.validate_credential", return_value=[]):
+            validated = validate(passport_data["stamps"])
+
+        assert validated["stamps"][0] is passport_data["stamps"][0]
+        # The input is left untouched
+        assert len(passport_data["stamps"]) == 2
@@ -7,7 +7,7 @@ from urllib.parse import urlencode
 import api_logging as logging
 import didkit
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import BooleanField, Expression, F, Q, Value
 from django.forms.models import model_to_dict
 from django.shortcuts import render
 from django.urls import reverse_lazy
@@ -154,13 +154,34 @@ def get_utc_time():
     return datetime.now(timezone.utc)
 
 
+def get_cursor_page(query, cursor, limit):
+    """
+    Return the records of the page of `query` (filtered & ordered with
+    `get_cursor_query_condition`), and whether there are a next and a previous page.
+
+    One record more than the `limit` is fetched to know if there is a page after this
+    one, in the direction of the cursor. In the other direction there is at least the
+    record of the cursor, so there is a page only if there is a cursor.
+    """
+    records = list(query[: limit + 1])
+    has_more = len(records) > limit
+    records = records[:limit]
+
+    if not records:
+        return records, False, False
+
+    if cursor and cursor["d"] == "prev":
+        records.reverse()
+        return records, True, has_more
+
+    return records, has_more, bool(cursor)
+
+
 def get_cursor_tokens_for_results(
-    base_query, domain, scores, sort_fields, limit, http_query_args, endpoint
+    domain, scores, has_next, has_prev, sort_fields, limit, http_query_args, endpoint
 ):
     prev_url = None
     next_url = None
-    has_more_scores = None
-    has_prev_scores = None
 
     if scores:
         prev_values = model_to_dict(scores[0])
@@ -177,19 +198,13 @@ def get_cursor_tokens_for_results(
             next_cursor[field_name] = next_values[field_name]
             prev_cursor[field_name] = prev_values[field_name]
 
-        next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-        prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
-
-        has_more_scores = base_query.filter(next_filter_cond).exists()
-        has_prev_scores = base_query.filter(prev_filter_cond).exists()
-
     next_url = (
         f"""{domain}{reverse_lazy_with_query(
             f"registry_v2:{endpoint}",
             args=http_query_args,
             query_kwargs={"token": encode_cursor(**next_cursor), "limit": limit},
         )}"""
-        if has_more_scores
+        if has_next
         else None
     )
 
@@ -199,7 +214,7 @@ def get_cursor_tokens_for_results(
             args=http_query_args,
             query_kwargs={"token": encode_cursor(**prev_cursor), "limit": limit},
         )}"""
-        if has_prev_scores
+        if has_prev
         else None
     )
 
@@ -209,19 +224,58 @@ def get_cursor_tokens_for_results(
     }
 
 
+class RowValueComparison(Expression):
+    """
+    The comparison of the row value of the fields with the values, e.g.
+    `(last_score_timestamp, id) > (%s, %s)`. The values are converted like the
+    values of their fields.
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, fields, operator, values):
+        super().__init__()
+        self.fields = [F(field) for field in fields]
+        self.operator = operator
+        self.values = values
+
+    def get_source_expressions(self):
+        return self.fields
+
+    def set_source_expressions(self, exprs):
+        self.fields = exprs
+
+    def as_sql(self, compiler, connection):
+        fields_sql, values_sql, params = [], [], []
+        for field in self.fields:
+            sql, field_params = compiler.compile(field)
+            fields_sql.append(sql)
+            params.extend(field_params)
+        for field, value in zip(self.fields, self.values):
+            sql, value_params = compiler.compile(
+                Value(value, output_field=field.output_field)
+            )
+            values_sql.append(sql)
+            params.extend(value_params)
+        return (
+            f"({', '.join(fields_sql)}) {self.operator} ({', '.join(values_sql)})",
+            params,
+        )
+
+
 def get_cursor_query_condition(cursor, sort_fields):
     """
     This function will decode a cursor and return a query condition and ordering condition.
-    The last values for all 3 sort fields are expected to be present in the cursor.
+    The last values for all the sort fields are expected to be present in the cursor.
 
     Assuming the the sort fields are a, b and c the query condition constructed will be the equivalent of this SQL WHERE clause:
 
-    WHERE (a > cursor_a)
-    OR (a = cursor_a AND b > cursor_b)
-    OR (a = cursor_a AND b = cursor_b AND c > cursor_c)
+    WHERE (a, b, c) > (cursor_a, cursor_b, cursor_c)
 
     This will take into account that values a, b and c can have duplicates, but that the combination of these 3 is always unique,
     and cand be used as an key for paginating when the records are sorted by these values.
+    Unlike the equivalent `a > cursor_a OR (a = cursor_a AND b > cursor_b) OR ...`, this row value comparison
+    can be answered with a range scan of an index on (a, b, c).
 
     The field_ordering will be the same for all fields, and is only influenced by the direction of the pagination.
     """
@@ -229,40 +283,11 @@ def get_cursor_query_condition(cursor, sort_fields):
         return (Q(), [f"-{field}" for field in sort_fields])
 
     is_next = cursor["d"] == "next"
-    filter_condition = Q()
-
-    if is_next:
-        for i in range(len(sort_fields)):
-            condition_for_or = Q()
-            for j in range(i + 1):
-                if i == j:
-                    cursor_value = cursor.get(sort_fields[j], None)
-                    if cursor_value is not None:
-                        condition_for_or &= Q(
-                            **{f"{sort_fields[j]}__gt": cursor[sort_fields[j]]}
-                        )
-                else:
-                    condition_for_or &= Q(
-                        **{f"{sort_fields[j]}__gte": cursor[sort_fields[j]]}
-                    )
-
-            filter_condition |= condition_for_or
-    else:
-        for i in range(len(sort_fields)):
-            condition_for_or = Q()
-            for j in range(i + 1):
-                if i == j:
-                    cursor_value = cursor.get(sort_fields[j], None)
-                    if cursor_value is not None:
-                        condition_for_or &= Q(
-                            **{f"{sort_fields[j]}__lt": cursor[sort_fields[j]]}
-                        )
-                else:
-                    condition_for_or &= Q(
-                        **{f"{sort_fields[j]}__lte": cursor[sort_fields[j]]}
-                    )
-
-            filter_condition |= condition_for_or
+    filter_condition = RowValueComparison(
+        sort_fields,
+        ">" if is_next else "<",
+        [cursor[field] for field in sort_fields],
+    )
 
     field_ordering = [f"{'-' if not is_next else ''}{field}" for field in sort_fields]
 
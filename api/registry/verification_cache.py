@@ -0,0 +1,154 @@
+"""
+Cache of the credentials that have been successfully verified.
+
+Issued credentials are immutable, so once a credential has been verified for a
+DID, it stays valid until it expires (or is revoked). This allows skipping the
+didkit verification when the same stamp is submitted again, rescored on read,
+or scored by an alternate scorer.
+
+The entries are keyed by the proof value of the credential and the DID, and hold
+a digest of the full credential, so that a credential that has been tampered
+with but still carries the proof of a verified credential is not considered
+verified.
+
+There are 2 tiers:
+ - a process-local LRU, whose entries expire after at most
+   `VERIFIED_CREDENTIAL_LOCAL_TTL` seconds
+ - the shared cache (redis), whose entries expire with the credential
+
+Both are purged when a `Revocation` is created (see `ceramic_cache.signals`).
+The local tier of other workers is only bounded by its TTL, but revoked stamps
+are excluded when loading the passport anyway.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+VERIFIED_CREDENTIAL_KEY_PREFIX = "verified_credential"
+
+
+def verified_credential_key(did: str, proof_value: str) -> str:
+    digest = hashlib.sha256(f"{did}:{proof_value}".encode("utf-8")).hexdigest()
+    return f"{VERIFIED_CREDENTIAL_KEY_PREFIX}:{digest}"
+
+
+def credential_digest(credential: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(credential, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class ExpiringLRUCache:
+    """A small thread-safe LRU, where each entry has its own expiration time"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: str, timeout: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_verified_credentials = ExpiringLRUCache(settings.VERIFIED_CREDENTIAL_CACHE_SIZE)
+
+
+def _get_proof_value(credential: dict) -> Optional[str]:
+    proof = credential.get("proof")
+    return proof.get("proofValue") if isinstance(proof, dict) else None
+
+
+def _get_ttl(credential: dict) -> int:
+    """Number of seconds until the credential expires"""
+    try:
+        expiration_date = datetime.fromisoformat(credential["expirationDate"])
+    except (KeyError, TypeError, ValueError):
+        return 0
+    return int((expiration_date - datetime.now(timezone.utc)).total_seconds())
+
+
+async def ais_credential_verified(did: str, credential: dict) -> bool:
+    """Check if the credential has already been successfully verified for the DID"""
+    proof_value = _get_proof_value(credential)
+    if not proof_value:
+        return False
+
+    key = verified_credential_key(did, proof_value)
+    digest = credential_digest(credential)
+    if local_verified_credentials.get(key) == digest:
+        return True
+
+    try:
+        cached_digest = await cache.aget(key)
+    except Exception:
+        log.error("Failed to read the verified credential cache", exc_info=True)
+        return False
+
+    if cached_digest != digest:
+        return False
+
+    ttl = _get_ttl(credential)
+    if ttl > 0:
+        local_verified_credentials.put(
+            key, digest, min(ttl, settings.VERIFIED_CREDENTIAL_LOCAL_TTL)
+        )
+    return True
+
+
+async def aremember_verified_credential(did: str, credential: dict):
+    """Remember that the credential has been successfully verified, until it expires"""
+    proof_value = _get_proof_value(credential)
+    ttl = _get_ttl(credential)
+    if not proof_value or ttl <= 0:
+        return
+
+    key = verified_credential_key(did, proof_value)
+    digest = credential_digest(credential)
+    local_verified_credentials.put(
+        key, digest, min(ttl, settings.VERIFIED_CREDENTIAL_LOCAL_TTL)
+    )
+    try:
+        await cache.aset(key, digest, ttl)
+    except Exception:
+        log.error("Failed to write the verified credential cache", exc_info=True)
+
+
+def forget_verified_credential(did: str, proof_value: str):
+    key = verified_credential_key(did, proof_value)
+    local_verified_credentials.delete(key)
+    cache.delete(key)
@@ -170,22 +170,29 @@ pa_schema_map = {
 }
 
 
+@contextmanager
+def parquet_writer(output_file, schema):
+    """Writer of batches of rows (dicts) to a Parquet file with the given schema"""
+    with pq.ParquetWriter(output_file, schema) as writer:
+
+        class WriterWrappe:
+            def __init__(self, writer):
+                self.writer = writer
+
+            def write_batch(self, data):
+                batch = pa.RecordBatch.from_pylist(data, schema=schema)
+                self.writer.write_batch(batch)
+
+        yield WriterWrappe(writer)
+
+
 @contextmanager
 def writer_context_manager(model):
     table_name = model._meta.db_table
     output_file = f"{table_name}.parquet"
     schema = get_pa_schema(model)
     try:
-        with pq.ParquetWriter(output_file, schema) as writer:
-
-            class WriterWrappe:
-                def __init__(self, writer):
-                    self.writer = writer
-
-                def write_batch(self, data):
-                    batch = pa.RecordBatch.from_pylist(data, schema=schema)
-                    self.writer.write_batch(batch)
-
-            yield WriterWrappe(writer)
+        with parquet_writer(output_file, schema) as writer:
+            yield writer
     finally:
         pass
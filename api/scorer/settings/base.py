@@ -113,6 +113,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "social_django.middleware.SocialAuthExceptionMiddleware",
+    "registry.instrumentation.server_timing_middleware",
     # "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
@@ -1,2 +1,8 @@
 """ Specify any feature flags here """
 from .env import env
+
+# Verify the stamps when they are written to the ceramic cache: off | inline | background
+FF_CERAMIC_CACHE_VERIFY_ON_WRITE = env("FF_CERAMIC_CACHE_VERIFY_ON_WRITE", default="off")
+
+# Time the stages of the scoring, see `registry.instrumentation`: on | off
+FF_STAGE_TIMING = env("FF_STAGE_TIMING", default="off")
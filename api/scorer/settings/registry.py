@@ -1,3 +1,57 @@
 from .env import env
 
 REGISTRY_API_READ_DB = env("REGISTRY_API_READ_DB", default="default")
+
+# Max. number of compiled weight tables (one per scorer & community) kept in each worker
+WEIGHT_TABLE_CACHE_SIZE = env.int("WEIGHT_TABLE_CACHE_SIZE", default=1000)
+
+# Max. number of scorers a passport can be submitted to at once
+SUBMIT_PASSPORT_MAX_SCORERS = env.int("SUBMIT_PASSPORT_MAX_SCORERS", default=20)
+
+# Max. number of addresses submitted in one batch, and scored concurrently
+SUBMIT_PASSPORT_MAX_BATCH_SIZE = env.int("SUBMIT_PASSPORT_MAX_BATCH_SIZE", default=1000)
+SUBMIT_PASSPORT_BATCH_CONCURRENCY = env.int(
+    "SUBMIT_PASSPORT_BATCH_CONCURRENCY", default=20
+)
+
+# Max. number of addresses whose scores are looked up at once
+GET_SCORES_BULK_MAX_ADDRESSES = env.int("GET_SCORES_BULK_MAX_ADDRESSES", default=1000)
+
+# Number of scores read from the DB, and encoded, at once when exporting the scores
+SCORE_EXPORT_CHUNK_SIZE = env.int("SCORE_EXPORT_CHUNK_SIZE", default=2000)
+
+# Max. number of stamp signatures verified concurrently when scoring a passport
+CREDENTIAL_VERIFICATION_CONCURRENCY = env.int(
+    "CREDENTIAL_VERIFICATION_CONCURRENCY", default=10
+)
+
+# Max. number of verified credentials remembered in each worker, and for how long (in seconds)
+VERIFIED_CREDENTIAL_CACHE_SIZE = env.int(
+    "VERIFIED_CREDENTIAL_CACHE_SIZE", default=10000
+)
+VERIFIED_CREDENTIAL_LOCAL_TTL = env.int("VERIFIED_CREDENTIAL_LOCAL_TTL", default=300)
+
+# Size (in bits per hash link of the community, between a min. and a max. number of
+# bits) and number of hash functions of the Bloom filter of the stamp hashes claimed
+# in each community (the defaults are ~0.1% false positives)
+HASH_FILTER_BITS_PER_HASH = env.int("HASH_FILTER_BITS_PER_HASH", default=16)
+HASH_FILTER_MIN_BITS = env.int("HASH_FILTER_MIN_BITS", default=2**13)
+HASH_FILTER_MAX_BITS = env.int("HASH_FILTER_MAX_BITS", default=2**27)
+HASH_FILTER_NUM_HASHES = env.int("HASH_FILTER_NUM_HASHES", default=5)
+
+# Refresh of the expiring scores (see `registry.score_refresh`): the scores expiring
+# within the window or expired within the lookback (in seconds) are rescored, at
+# most SCORE_REFRESH_RATE_LIMIT per community and per minute
+SCORE_REFRESH_WINDOW = env.int("SCORE_REFRESH_WINDOW", default=3600)
+SCORE_REFRESH_LOOKBACK = env.int("SCORE_REFRESH_LOOKBACK", default=86400)
+SCORE_REFRESH_RATE_LIMIT = env.int("SCORE_REFRESH_RATE_LIMIT", default=600)
+SCORE_REFRESH_BATCH_SIZE = env.int("SCORE_REFRESH_BATCH_SIZE", default=100)
+SCORE_REFRESH_CONCURRENCY = env.int("SCORE_REFRESH_CONCURRENCY", default=10)
+
+# Single-flight scoring (see `registry.single_flight`): lease held by the request
+# scoring a passport, and how long the concurrent requests wait for it (in seconds)
+SCORE_SINGLE_FLIGHT_LEASE = env.int("SCORE_SINGLE_FLIGHT_LEASE", default=30)
+SCORE_SINGLE_FLIGHT_WAIT = env.int("SCORE_SINGLE_FLIGHT_WAIT", default=30)
+SCORE_SINGLE_FLIGHT_POLL_INTERVAL = env.float(
+    "SCORE_SINGLE_FLIGHT_POLL_INTERVAL", default=0.1
+)
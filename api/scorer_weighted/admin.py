@@ -1,6 +1,11 @@
 from django.contrib import admin
 from scorer.scorer_admin import ScorerModelAdmin
-from scorer_weighted.models import BinaryWeightedScorer, RescoreRequest, WeightedScorer
+from scorer_weighted.models import (
+    BinaryWeightedScorer,
+    RescoreRange,
+    RescoreRequest,
+    WeightedScorer,
+)
 from django_ace import AceWidget
 from django import forms
 
@@ -71,3 +76,24 @@ class RescoreRequestAdmin(admin.ModelAdmin):
     ]
     search_fields = ["id"]
     ordering = ["-created_at"]
+
+
+@admin.register(RescoreRange)
+class RescoreRangeAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "rescore_request",
+        "community",
+        "status",
+        "start_id",
+        "end_id",
+        "last_id",
+        "num_passports_processed",
+        "worker",
+        "elapsed_seconds",
+        "updated_at",
+    ]
+    list_filter = ["status"]
+    raw_id_fields = ["rescore_request", "community"]
+    search_fields = ["rescore_request__id", "community__id", "worker"]
+    ordering = ["-id"]
@@ -0,0 +1,303 @@
+"""
+Vectorized scoring for batches of passports.
+
+This is the scoring kernel shared by all the weighted scoring paths (see
+`scorer_weighted.computation`). Instead of walking every stamp with `Decimal`
+arithmetic, the stamps of a batch of passports are turned into columnar arrays
+(passport index, provider index, expiration) and the weights are applied with
+NumPy grouped reductions.
+
+Weights are applied as fixed point integers, so the sums are exact and the
+results are identical to the ones produced by the per-stamp loop, including the
+exponent of the resulting `Decimal` and the `earned_points` of duplicate
+providers.
+"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import api_logging as logging
+
+log = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Weights with more decimal places than this are scored by the per-stamp loop
+MAX_FIXED_POINT_PLACES = 12
+# Upper bound for the fixed point sum of all weights, keeps np.int64 from overflowing
+MAX_FIXED_POINT_SUM = 2**62
+
+# A stamp as seen by the scoring kernel: (provider, expiration date), the
+# expiration date being a datetime or an ISO string (the credential expirationDate)
+StampRow = Tuple[str, Union[datetime, str]]
+
+
+class CompiledWeights:
+    """
+    The weights of a scorer converted to fixed point integers, indexed by provider.
+
+    `scaled[i] / 10**places` is exactly the weight of `providers[i]` and
+    `exponents[i]` is the exponent of its `Decimal` representation, which is
+    needed to reproduce the exponent of a `Decimal` sum.
+    """
+
+    __slots__ = (
+        "places",
+        "providers",
+        "provider_index",
+        "scaled",
+        "exponents",
+        "decimals",
+    )
+
+    def __init__(
+        self,
+        places: int,
+        providers: List[str],
+        scaled: List[int],
+        exponents: List[int],
+        decimals: List[Decimal],
+    ):
+        self.places = places
+        self.providers = providers
+        self.provider_index = {provider: idx for idx, provider in enumerate(providers)}
+        self.scaled = scaled
+        self.exponents = exponents
+        self.decimals = decimals
+
+    @classmethod
+    def compile(cls, weights: dict) -> Optional["CompiledWeights"]:
+        """
+        Compile the weights, or return None if they can not be represented exactly
+        as fixed point integers (for example weights stored as binary floats).
+        """
+        providers = list(weights.keys())
+        decimals = [Decimal(weights[provider]) for provider in providers]
+
+        if not all(d.is_finite() for d in decimals):
+            return None
+
+        exponents = [d.as_tuple().exponent for d in decimals]
+        places = max([0] + [-e for e in exponents])
+        if places > MAX_FIXED_POINT_PLACES:
+            return None
+
+        scaled = [int(d.scaleb(places)) for d in decimals]
+        if sum(abs(s) for s in scaled) >= MAX_FIXED_POINT_SUM:
+            return None
+
+        return cls(
+            places=places,
+            providers=providers,
+            scaled=scaled,
+            exponents=exponents,
+            decimals=decimals,
+        )
+
+    def copy(self) -> "CompiledWeights":
+        return CompiledWeights(
+            places=self.places,
+            providers=list(self.providers),
+            scaled=list(self.scaled),
+            exponents=list(self.exponents),
+            decimals=list(self.decimals),
+        )
+
+    def get_or_add_provider(self, provider: str) -> int:
+        """
+        Return the index of the provider. Providers that have no weight are
+        added with a weight of 0, like `weights.get(provider, 0)` would do.
+        """
+        idx = self.provider_index.get(provider)
+        if idx is None:
+            idx = len(self.providers)
+            self.provider_index[provider] = idx
+            self.providers.append(provider)
+            self.scaled.append(0)
+            self.exponents.append(0)
+            self.decimals.append(Decimal(0))
+        return idx
+
+
+def _parse_expiration_date(expiration_date: Union[datetime, str]) -> datetime:
+    if isinstance(expiration_date, datetime):
+        return expiration_date
+    return datetime.fromisoformat(expiration_date)
+
+
+def _to_epoch_microseconds(expiration_date: datetime) -> int:
+    return (expiration_date - EPOCH) // ONE_MICROSECOND
+
+
+def _score_passports_per_stamp(
+    weights: dict,
+    passport_ids: List[int],
+    stamps: Dict[int, List[StampRow]],
+    earned_points_type: Callable[[Decimal], object] = str,
+) -> List[dict]:
+    """
+    Score the passports stamp by stamp. This is used for weights that can not be
+    compiled to fixed point integers.
+    """
+    ret: List[dict] = []
+    for passport_id in passport_ids:
+        sum_of_weights: Decimal = Decimal(0)
+        scored_providers = set()
+        earned_points = {}
+        earliest_expiration_date = None
+        for provider, expiration_date_value in stamps.get(passport_id, []):
+            if provider not in scored_providers:
+                weight = Decimal(weights.get(provider, 0))
+                sum_of_weights += weight
+                scored_providers.add(provider)
+                earned_points[provider] = earned_points_type(weight)
+                expiration_date = _parse_expiration_date(expiration_date_value)
+                # Compute the earliest expiration date for the stamps used to calculate the score
+                # as this will be the expiration date of the score
+                if (
+                    not earliest_expiration_date
+                    or expiration_date < earliest_expiration_date
+                ):
+                    earliest_expiration_date = expiration_date
+            else:
+                earned_points[provider] = earned_points_type(Decimal(0))
+        ret.append(
+            {
+                "sum_of_weights": sum_of_weights,
+                "earned_points": earned_points,
+                "expiration_date": earliest_expiration_date,
+            }
+        )
+    return ret
+
+
+def batch_calculate_weighted_score(
+    weights: dict,
+    passport_ids: List[int],
+    stamps: Dict[int, List[StampRow]],
+    earned_points_type: Callable[[Decimal], object] = str,
+    compiled: Optional[CompiledWeights] = None,
+) -> List[dict]:
+    """
+    Calculate the weighted score for a batch of passports.
+
+    Args:
+        weights (dict): The weights by provider, including any customization weights.
+        passport_ids (List[int]): The passports to score.
+        stamps (Dict[int, List[StampRow]]): The (provider, expiration date) of the stamps, by passport ID.
+        earned_points_type: Converts the earned points of a provider to the type stored in `earned_points`.
+        compiled (CompiledWeights): The already compiled `weights`, if available (see `weight_table`).
+
+    Returns:
+        A list with one dict per passport ID (in the same order), containing the
+        `sum_of_weights`, `earned_points` and `expiration_date`.
+    """
+    if compiled is None:
+        compiled = CompiledWeights.compile(weights)
+    else:
+        # Providers without a weight get added while building the columns,
+        # so the compiled weights that were passed in are left untouched
+        compiled = compiled.copy()
+
+    if compiled is None:
+        log.debug("weights can not be compiled, falling back to per-stamp scoring")
+        return _score_passports_per_stamp(
+            weights, passport_ids, stamps, earned_points_type
+        )
+
+    # Build the columns for this batch, one row per stamp
+    row_passport = []
+    row_provider = []
+    row_expiration = []
+    for passport_pos, passport_id in enumerate(passport_ids):
+        for provider, expiration_date_value in stamps.get(passport_id, []):
+            row_passport.append(passport_pos)
+            row_provider.append(compiled.get_or_add_provider(provider))
+            row_expiration.append(expiration_date_value)
+
+    num_passports = len(passport_ids)
+    num_providers = len(compiled.providers)
+    passport_col = np.array(row_passport, dtype=np.int64)
+    provider_col = np.array(row_provider, dtype=np.int64)
+
+    # Only the first stamp of each provider is scored. np.unique returns the first
+    # row of each (passport, provider) pair, which we restore to stamp order.
+    _, first_rows, counts = np.unique(
+        passport_col * num_providers + provider_col,
+        return_index=True,
+        return_counts=True,
+    )
+    order = np.argsort(first_rows)
+    scored_rows = first_rows[order]
+    is_duplicate = counts[order] > 1
+    scored_passports = passport_col[scored_rows]
+    scored_providers = provider_col[scored_rows]
+
+    scaled = np.array(compiled.scaled, dtype=np.int64)
+    exponents = np.array(compiled.exponents, dtype=np.int64)
+
+    sums = np.zeros(num_passports, dtype=np.int64)
+    np.add.at(sums, scored_passports, scaled[scored_providers])
+
+    # The exponent of a Decimal sum is the smallest exponent of its terms,
+    # starting with the exponent of Decimal(0)
+    sum_exponents = np.zeros(num_passports, dtype=np.int64)
+    np.minimum.at(sum_exponents, scored_passports, exponents[scored_providers])
+
+    # The expiration date is the earliest expiration of the scored stamps,
+    # the first one wins if there is a tie
+    expiration_dates = [
+        _parse_expiration_date(row_expiration[row]) for row in scored_rows.tolist()
+    ]
+    if any(d.tzinfo is None for d in expiration_dates):
+        log.debug("naive expiration dates found, falling back to per-stamp scoring")
+        return _score_passports_per_stamp(
+            weights, passport_ids, stamps, earned_points_type
+        )
+
+    earliest_expiration_dates = [None] * num_passports
+    if expiration_dates:
+        epochs = np.array(
+            [_to_epoch_microseconds(d) for d in expiration_dates], dtype=np.int64
+        )
+        by_expiration = np.lexsort(
+            (np.arange(len(scored_rows)), epochs, scored_passports)
+        )
+        passports_with_stamps, group_starts = np.unique(
+            scored_passports[by_expiration], return_index=True
+        )
+        for passport_pos, start in zip(
+            passports_with_stamps.tolist(), group_starts.tolist()
+        ):
+            earliest_expiration_dates[passport_pos] = expiration_dates[
+                by_expiration[start]
+            ]
+
+    zero_points = earned_points_type(Decimal(0))
+    provider_points = [earned_points_type(d) for d in compiled.decimals]
+    earned_points: List[dict] = [{} for _ in range(num_passports)]
+    for passport_pos, provider_idx, duplicate in zip(
+        scored_passports.tolist(), scored_providers.tolist(), is_duplicate.tolist()
+    ):
+        earned_points[passport_pos][compiled.providers[provider_idx]] = (
+            zero_points if duplicate else provider_points[provider_idx]
+        )
+
+    ret: List[dict] = []
+    for passport_pos, (fixed_point_sum, exponent) in enumerate(
+        zip(sums.tolist(), sum_exponents.tolist())
+    ):
+        ret.append(
+            {
+                "sum_of_weights": Decimal(
+                    fixed_point_sum // 10 ** (compiled.places + exponent)
+                ).scaleb(exponent),
+                "earned_points": earned_points[passport_pos],
+                "expiration_date": earliest_expiration_dates[passport_pos],
+            }
+        )
+    return ret
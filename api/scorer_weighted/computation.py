@@ -1,23 +1,91 @@
-from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 
 import api_logging as logging
+from django.db.models import Case, QuerySet, When
+from django.db.models.fields.json import KT
 from registry.models import Stamp
+from scorer_weighted.batch_computation import StampRow, batch_calculate_weighted_score
 from scorer_weighted.models import WeightedScorer
-from account.models import Customization
-from datetime import datetime
+from scorer_weighted.weight_table import (
+    WeightTable,
+    aget_weight_table,
+    get_weight_table,
+)
 
 log = logging.getLogger(__name__)
 
 
+def credential_expiration_date():
+    """
+    The expiration date read from the credential, only for the stamps saved before
+    the `expiration_date` column was added (see the
+    `backfill_stamp_expiration_and_issuer` command). The credential of the other
+    stamps is not read.
+    """
+    return Case(
+        When(expiration_date__isnull=True, then=KT("credential__expirationDate"))
+    )
+
+
+def get_stamp_expiration_date(stamp: Stamp):
+    """The expiration date of the stamp, as a datetime or an ISO string"""
+    if stamp.expiration_date is not None:
+        return stamp.expiration_date
+    if hasattr(stamp, "credential_expiration_date"):
+        return stamp.credential_expiration_date
+    return stamp.credential["expirationDate"]
+
+
+def scoring_stamps_query(passport_ids: List[int]) -> QuerySet[Stamp]:
+    """
+    Query returning the stamps of all the given passports, with only the columns
+    used for scoring (see `get_stamp_expiration_date`), not the full credential.
+    The stamps are sorted by id: the first stamp of a provider is the one that
+    counts, like in the SQL scoring engine (see `scorer_weighted.sql_computation`).
+    """
+    return (
+        Stamp.objects.filter(passport_id__in=passport_ids)
+        .order_by("id")
+        .only("id", "passport_id", "provider", "expiration_date")
+        .annotate(credential_expiration_date=credential_expiration_date())
+    )
+
+
+def _stamp_rows_query(passport_ids: List[int]):
+    """
+    Query returning (passport_id, provider, expiration_date, credential expirationDate)
+    for the stamps of all the given passports, sorted by id (see `scoring_stamps_query`).
+    Only the columns used for scoring are loaded, not the full credential.
+    """
+    return (
+        Stamp.objects.filter(passport_id__in=passport_ids)
+        .order_by("id")
+        .values_list(
+            "passport_id",
+            "provider",
+            "expiration_date",
+            credential_expiration_date(),
+        )
+    )
+
+
+def _group_stamp_rows(stamp_rows: Iterable[tuple]) -> Dict[int, List[StampRow]]:
+    stamps: Dict[int, List[StampRow]] = {}
+    for passport_id, provider, expiration_date, credential_date in stamp_rows:
+        stamps.setdefault(passport_id, []).append(
+            (provider, expiration_date or credential_date)
+        )
+    return stamps
+
+
 def calculate_weighted_score(
     scorer: WeightedScorer, passport_ids: List[int], community_id: int
 ) -> List[dict]:
     """
     Calculate the weighted score for the given list of passport IDs and a single scorer.
 
-    This function retrieves the weights for the scorer, filters the stamps associated
-    with each passport ID, and calculates the weighted score based on the weights of
+    This function retrieves the (cached) weights for the scorer, loads the stamps of all the
+    passports in one query, and calculates the weighted score based on the weights of
     the stamps. The weight of each stamp is determined by the scorer's weights dict.
 
     Args:
@@ -25,53 +93,18 @@ def calculate_weighted_score(
         passport_ids (List[int]): A list of passport IDs to calculate the weighted score for.
 
     Returns:
-        A list of Decimal values representing the weighted scores for the given passport IDs.
+        A list of dicts with the score data for the given passport IDs.
     """
-    from registry.models import Stamp
-
-    ret: List[dict] = []
     log.debug(
         "calculate_weighted_score for scorer %s and passports %s", scorer, passport_ids
     )
-    weights = scorer.weights
-
-    try:
-        customization = Customization.objects.get(scorer_id=community_id)
-        weights.update(customization.get_customization_dynamic_weights())
-    except Customization.DoesNotExist:
-        pass
-
-    for passport_id in passport_ids:
-        sum_of_weights: Decimal = Decimal(0)
-        scored_providers = []
-        earned_points = {}
-        earliest_expiration_date = None
-        for stamp in Stamp.objects.filter(passport_id=passport_id):
-            if stamp.provider not in scored_providers:
-                weight = Decimal(weights.get(stamp.provider, 0))
-                sum_of_weights += weight
-                scored_providers.append(stamp.provider)
-                earned_points[stamp.provider] = str(weight)
-                expiration_date = datetime.fromisoformat(
-                    stamp.credential["expirationDate"]
-                )
-                # Compute the earliest expiration date for the stamps used to calculate the score
-                # as this will be the expiration date of the score
-                if (
-                    not earliest_expiration_date
-                    or expiration_date < earliest_expiration_date
-                ):
-                    earliest_expiration_date = expiration_date
-            else:
-                earned_points[stamp.provider] = str(Decimal(0))
-        ret.append(
-            {
-                "sum_of_weights": sum_of_weights,
-                "earned_points": earned_points,
-                "expiration_date": earliest_expiration_date,
-            }
-        )
-    return ret
+    weight_table = get_weight_table(scorer, community_id)
+
+    stamps = _group_stamp_rows(_stamp_rows_query(passport_ids))
+
+    return batch_calculate_weighted_score(
+        weight_table.weights, passport_ids, stamps, compiled=weight_table.compiled
+    )
 
 
 def recalculate_weighted_score(
@@ -79,110 +112,73 @@ def recalculate_weighted_score(
     passport_ids: List[int],
     stamps: Dict[int, List[Stamp]],
     community_id: int,
+    weight_table: Optional[WeightTable] = None,
 ) -> List[dict]:
-    ret: List[dict] = []
-    weights = scorer.weights
-
-    try:
-        customization = Customization.objects.get(scorer_id=community_id)
-        weights.update(customization.get_customization_dynamic_weights())
-    except Customization.DoesNotExist:
-        pass
-
-    for passport_id in passport_ids:
-        stamp_list = stamps.get(passport_id, [])
-        sum_of_weights: Decimal = Decimal(0)
-        scored_providers = []
-        earned_points = {}
-        earliest_expiration_date = None
-        for stamp in stamp_list:
-            if stamp.provider not in scored_providers:
-                weight = Decimal(weights.get(stamp.provider, 0))
-                sum_of_weights += weight
-                scored_providers.append(stamp.provider)
-                earned_points[stamp.provider] = str(weight)
-                expiration_date = datetime.fromisoformat(
-                    stamp.credential["expirationDate"]
-                )
-                # Compute the earliest expiration date for the stamps used to calculate the score
-                # as this will be the expiration date of the score
-                if (
-                    not earliest_expiration_date
-                    or expiration_date < earliest_expiration_date
-                ):
-                    earliest_expiration_date = expiration_date
-            else:
-                earned_points[stamp.provider] = str(Decimal(0))
-        ret.append(
-            {
-                "sum_of_weights": sum_of_weights,
-                "earned_points": earned_points,
-                "expiration_date": earliest_expiration_date,
-            }
-        )
-    return ret
+    """
+    Calculate the weighted score for a batch of passports, for which the stamps have already been loaded.
+
+    The scores are computed with the vectorized batch engine (see `batch_calculate_weighted_score`).
+
+    Args:
+        scorer (WeightedScorer): The scorer to use for calculating the weighted score.
+        passport_ids (List[int]): A list of passport IDs to calculate the weighted score for.
+        stamps (Dict[int, List[Stamp]]): The stamps of the passports, by passport ID.
+        weight_table (WeightTable): The weight table of the scorer & community, if it has
+            already been read (see `get_weight_table`).
+
+    Returns:
+        A list of dicts with the score data for the given passport IDs.
+    """
+    if weight_table is None:
+        weight_table = get_weight_table(scorer, community_id)
+
+    stamp_rows = {
+        passport_id: [
+            (stamp.provider, get_stamp_expiration_date(stamp))
+            for stamp in passport_stamps
+        ]
+        for passport_id, passport_stamps in stamps.items()
+    }
+
+    return batch_calculate_weighted_score(
+        weight_table.weights, passport_ids, stamp_rows, compiled=weight_table.compiled
+    )
 
 
 async def acalculate_weighted_score(
-    scorer: WeightedScorer, passport_ids: List[int], community_id: int
+    scorer: WeightedScorer,
+    passport_ids: List[int],
+    community_id: int,
+    weight_table: Optional[WeightTable] = None,
 ) -> List[dict]:
     """
     Calculate the weighted score for the given list of passport IDs and a single scorer.
 
-    This function retrieves the weights for the scorer, filters the stamps associated
-    with each passport ID, and calculates the weighted score based on the weights of
+    This function retrieves the (cached) weights for the scorer, loads the stamps of all the
+    passports in one query, and calculates the weighted score based on the weights of
     the stamps. The weight of each stamp is determined by the scorer's weights dict.
 
     Args:
         scorer (WeightedScorer): The scorer to use for calculating the weighted score.
         passport_ids (List[int]): A list of passport IDs to calculate the weighted score for.
+        weight_table (WeightTable): The weight table of the scorer & community, if it has
+            already been read (see `aget_weight_table`).
 
     Returns:
-        A list of Decimal values representing the weighted scores for the given passport IDs.
+        A list of dicts with the score data for the given passport IDs.
     """
-    from registry.models import Stamp
-
-    ret: List[dict] = []
     log.debug(
         "calculate_weighted_score for scorer %s and passports %s", scorer, passport_ids
     )
-    weights = scorer.weights
-
-    try:
-        customization = await Customization.objects.aget(scorer_id=community_id)
-        weights.update(await customization.aget_customization_dynamic_weights())
-    except Customization.DoesNotExist:
-        pass
-
-    for passport_id in passport_ids:
-        sum_of_weights: Decimal = Decimal(0)
-        scored_providers = []
-        earned_points = {}
-        earliest_expiration_date = None
-        async for stamp in Stamp.objects.filter(passport_id=passport_id):
-            if stamp.provider not in scored_providers:
-                weight = Decimal(weights.get(stamp.provider, 0))
-                sum_of_weights += weight
-                scored_providers.append(stamp.provider)
-                earned_points[stamp.provider] = float(weight)
-                expiration_date = datetime.fromisoformat(
-                    stamp.credential["expirationDate"]
-                )
-                # Compute the earliest expiration date for the stamps used to calculate the score
-                # as this will be the expiration date of the score
-                if (
-                    not earliest_expiration_date
-                    or expiration_date < earliest_expiration_date
-                ):
-                    earliest_expiration_date = expiration_date
-            else:
-                earned_points[stamp.provider] = float(Decimal(0))
-
-        ret.append(
-            {
-                "sum_of_weights": sum_of_weights,
-                "earned_points": earned_points,
-                "expiration_date": earliest_expiration_date,
-            }
-        )
-    return ret
+    if weight_table is None:
+        weight_table = await aget_weight_table(scorer, community_id)
+
+    stamps = _group_stamp_rows([row async for row in _stamp_rows_query(passport_ids)])
+
+    return batch_calculate_weighted_score(
+        weight_table.weights,
+        passport_ids,
+        stamps,
+        earned_points_type=float,
+        compiled=weight_table.compiled,
+    )
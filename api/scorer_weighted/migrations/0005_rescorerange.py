@@ -0,0 +1,85 @@
+# Generated by Django 4.2.6 on 2026-10-18 22:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0033_accountapikey_analysis_rate_limit"),
+        ("scorer_weighted", "0004_rescorerequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RescoreRange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("SUCCESS", "Success"),
+                            ("FAILED", "Failed"),
+                        ],
+                        db_index=True,
+                        default="PENDING",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "start_id",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="The passport ids of the range are greater than this id",
+                    ),
+                ),
+                (
+                    "end_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="The last passport id of the range, or null for all the passports after start_id",
+                        null=True,
+                    ),
+                ),
+                (
+                    "last_id",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="The last passport id that has been rescored",
+                    ),
+                ),
+                ("num_passports_processed", models.IntegerField(default=0)),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("elapsed_seconds", models.FloatField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "community",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rescore_ranges",
+                        to="account.community",
+                    ),
+                ),
+                (
+                    "rescore_request",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ranges",
+                        to="scorer_weighted.rescorerequest",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scorer_weighted", "0005_rescorerange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rescorerange",
+            name="plan",
+            field=models.JSONField(
+                blank=True,
+                help_text="Only the passports affected by this weight change are rescored, or all of them if null (see `scorer_weighted.weight_diff.RescorePlan`)",
+                null=True,
+            ),
+        ),
+    ]
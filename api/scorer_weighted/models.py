@@ -94,6 +94,17 @@ class Scorer(models.Model):
 class WeightedScorer(Scorer):
     weights = models.JSONField(default=get_default_weights, blank=True, null=True)
 
+    def get_score_data(self, raw_score: dict) -> ScoreData:
+        """
+        Build the ScoreData from the raw score computed by the `scorer_weighted.computation` functions
+        """
+        return ScoreData(
+            score=raw_score["sum_of_weights"],
+            evidence=None,
+            points=raw_score["earned_points"],
+            expiration_date=raw_score["expiration_date"],
+        )
+
     def compute_score(self, passport_ids, community_id: int) -> List[ScoreData]:
         """
         Compute the weighted score for the passports identified by `ids`
@@ -102,50 +113,41 @@ class WeightedScorer(Scorer):
         from .computation import calculate_weighted_score
 
         return [
-            ScoreData(
-                score=s["sum_of_weights"], evidence=None, points=s["earned_points"]
-            )
+            self.get_score_data(s)
             for s in calculate_weighted_score(self, passport_ids, community_id)
         ]
 
     def recompute_score(
-        self, passport_ids, stamps, community_id: int
+        self, passport_ids, stamps, community_id: int, weight_table=None
     ) -> List[ScoreData]:
         """
-        Compute the weighted score for the passports identified by `ids`
+        Compute the weighted score for the passports identified by `ids`, with the
+        `weight_table` if it has already been read
         Note: the `ids` are not validated. The caller shall ensure that these are indeed proper IDs, from the correct community
         """
         from .computation import recalculate_weighted_score
 
         return [
-            ScoreData(
-                score=s["sum_of_weights"],
-                evidence=None,
-                points=s["earned_points"],
-                expiration_date=s["expiration_date"],
-            )
+            self.get_score_data(s)
             for s in recalculate_weighted_score(
-                self, passport_ids, stamps, community_id
+                self, passport_ids, stamps, community_id, weight_table
             )
         ]
 
-    async def acompute_score(self, passport_ids, community_id: int) -> List[ScoreData]:
+    async def acompute_score(
+        self, passport_ids, community_id: int, weight_table=None
+    ) -> List[ScoreData]:
         """
-        Compute the weighted score for the passports identified by `ids`
+        Compute the weighted score for the passports identified by `ids`, with the
+        `weight_table` if it has already been read
         Note: the `ids` are not validated. The caller shall ensure that these are indeed proper IDs, from the correct community
         """
         from .computation import acalculate_weighted_score
 
-        scores = await acalculate_weighted_score(self, passport_ids, community_id)
-        return [
-            ScoreData(
-                score=s["sum_of_weights"],
-                evidence=None,
-                points=s["earned_points"],
-                expiration_date=s["expiration_date"],
-            )
-            for s in scores
-        ]
+        scores = await acalculate_weighted_score(
+            self, passport_ids, community_id, weight_table
+        )
+        return [self.get_score_data(s) for s in scores]
 
     def __str__(self):
         return f"WeightedScorer #{self.id}"
@@ -159,6 +161,26 @@ class BinaryWeightedScorer(Scorer):
         default=get_default_threshold,
     )
 
+    def get_score_data(self, raw_score: dict) -> ScoreData:
+        """
+        Build the ScoreData from the raw score computed by the `scorer_weighted.computation` functions
+        """
+        binary_score = (
+            Decimal(1) if raw_score["sum_of_weights"] >= self.threshold else Decimal(0)
+        )
+        return ScoreData(
+            score=binary_score,
+            evidence=[
+                ThresholdScoreEvidence(
+                    threshold=Decimal(str(self.threshold)),
+                    rawScore=Decimal(raw_score["sum_of_weights"]),
+                    success=bool(binary_score),
+                )
+            ],
+            points=raw_score["earned_points"],
+            expiration_date=raw_score["expiration_date"],
+        )
+
     def compute_score(self, passport_ids, community_id: int) -> List[ScoreData]:
         """
         Compute the weighted score for the passports identified by `ids`
@@ -167,95 +189,37 @@ class BinaryWeightedScorer(Scorer):
         from .computation import calculate_weighted_score
 
         rawScores = calculate_weighted_score(self, passport_ids, community_id)
-        binaryScores = [
-            Decimal(1) if s["sum_of_weights"] >= self.threshold else Decimal(0)
-            for s in rawScores
-        ]
-
-        return list(
-            map(
-                lambda rawScore, binaryScore: ScoreData(
-                    score=binaryScore,
-                    evidence=[
-                        ThresholdScoreEvidence(
-                            threshold=Decimal(str(self.threshold)),
-                            rawScore=Decimal(rawScore["sum_of_weights"]),
-                            success=bool(binaryScore),
-                        )
-                    ],
-                    points=rawScore["earned_points"],
-                    expiration_date=rawScore["expiration_date"],
-                ),
-                rawScores,
-                binaryScores,
-            )
-        )
+        return [self.get_score_data(s) for s in rawScores]
 
     def recompute_score(
-        self, passport_ids, stamps, community_id: int
+        self, passport_ids, stamps, community_id: int, weight_table=None
     ) -> List[ScoreData]:
         """
-        Compute the weighted score for the passports identified by `ids`
+        Compute the weighted score for the passports identified by `ids`, with the
+        `weight_table` if it has already been read
         Note: the `ids` are not validated. The caller shall ensure that these are indeed proper IDs, from the correct community
         """
         from .computation import recalculate_weighted_score
 
-        rawScores = recalculate_weighted_score(self, passport_ids, stamps, community_id)
-        binaryScores = [
-            Decimal(1) if s["sum_of_weights"] >= self.threshold else Decimal(0)
-            for s in rawScores
-        ]
-
-        return list(
-            map(
-                lambda rawScore, binaryScore: ScoreData(
-                    score=binaryScore,
-                    evidence=[
-                        ThresholdScoreEvidence(
-                            threshold=Decimal(str(self.threshold)),
-                            rawScore=Decimal(rawScore["sum_of_weights"]),
-                            success=bool(binaryScore),
-                        )
-                    ],
-                    points=rawScore["earned_points"],
-                    expiration_date=rawScore["expiration_date"],
-                ),
-                rawScores,
-                binaryScores,
-            )
+        rawScores = recalculate_weighted_score(
+            self, passport_ids, stamps, community_id, weight_table
         )
+        return [self.get_score_data(s) for s in rawScores]
 
-    async def acompute_score(self, passport_ids, community_id: int) -> List[ScoreData]:
+    async def acompute_score(
+        self, passport_ids, community_id: int, weight_table=None
+    ) -> List[ScoreData]:
         """
-        Compute the weighted score for the passports identified by `ids`
+        Compute the weighted score for the passports identified by `ids`, with the
+        `weight_table` if it has already been read
         Note: the `ids` are not validated. The caller shall ensure that these are indeed proper IDs, from the correct community
         """
         from .computation import acalculate_weighted_score
 
-        rawScores = await acalculate_weighted_score(self, passport_ids, community_id)
-        binaryScores = [
-            Decimal(1) if s["sum_of_weights"] >= self.threshold else Decimal(0)
-            for s in rawScores
-        ]
-
-        return list(
-            map(
-                lambda rawScore, binaryScore: ScoreData(
-                    score=binaryScore,
-                    evidence=[
-                        ThresholdScoreEvidence(
-                            threshold=Decimal(str(self.threshold)),
-                            rawScore=Decimal(rawScore["sum_of_weights"]),
-                            success=bool(binaryScore),
-                        )
-                    ],
-                    points=rawScore["earned_points"],
-                    expiration_date=rawScore["expiration_date"],
-                ),
-                rawScores,
-                binaryScores,
-            )
+        rawScores = await acalculate_weighted_score(
+            self, passport_ids, community_id, weight_table
         )
+        return [self.get_score_data(s) for s in rawScores]
 
     def __str__(self):
         return f"BinaryWeightedScorer #{self.id}, threshold='{self.threshold}'"
@@ -281,3 +245,55 @@ class RescoreRequest(models.Model):
 
     def __str__(self):
         return f"RescoreRequest #{self.pk}, status='{self.status}', created_at='{self.created_at}'"
+
+
+class RescoreRange(models.Model):
+    """
+    A range of passport ids of a community to rescore, as part of a `RescoreRequest`.
+    The range is checkpointed after each batch, so that a failed rescore can be
+    resumed where it stopped.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        SUCCESS = "SUCCESS", "Success"
+        FAILED = "FAILED", "Failed"
+
+    rescore_request = models.ForeignKey(
+        RescoreRequest, related_name="ranges", on_delete=models.CASCADE
+    )
+    community = models.ForeignKey(
+        "account.Community", related_name="rescore_ranges", on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        choices=Status.choices,
+        default=Status.PENDING,
+        max_length=20,
+        db_index=True,
+    )
+
+    start_id = models.BigIntegerField(
+        default=0, help_text="The passport ids of the range are greater than this id"
+    )
+    end_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="The last passport id of the range, or null for all the passports after start_id",
+    )
+    last_id = models.BigIntegerField(
+        default=0, help_text="The last passport id that has been rescored"
+    )
+    num_passports_processed = models.IntegerField(default=0)
+    plan = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Only the passports affected by this weight change are rescored, or all of them if null (see `scorer_weighted.weight_diff.RescorePlan`)",
+    )
+
+    worker = models.CharField(max_length=100, blank=True, default="")
+    elapsed_seconds = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"RescoreRange #{self.pk}, community={self.community_id}, ids=({self.start_id}, {self.end_id}], status='{self.status}'"
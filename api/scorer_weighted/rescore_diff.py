@@ -0,0 +1,250 @@
+"""
+Dry run of a rescore: the difference between the current scores and the scores
+the new weights & threshold would give, without writing anything.
+
+The affected passports of each community (see `scorer_weighted.weight_diff`) are
+streamed in batches through the scoring engine, with an unsaved copy of the
+scorer holding the new weights, and only aggregated into a `RescoreDiff` per
+community. Its size depends on the number of histogram bins and providers, not
+on the number of passports, so that communities with tens of millions of
+passports can be diffed.
+"""
+
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+from registry.models import Passport, Score
+from scorer.export_utils import parquet_writer
+from scorer_weighted.computation import scoring_stamps_query
+from scorer_weighted.models import BinaryWeightedScorer, ScoreData, WeightedScorer
+from scorer_weighted.weight_diff import RescorePlan, format_threshold
+
+SUMMARY_SCHEMA = pa.schema(
+    [
+        ("community_id", pa.int64()),
+        ("num_passports", pa.int64()),
+        ("num_changed", pa.int64()),
+        ("num_increased", pa.int64()),
+        ("num_decreased", pa.int64()),
+        ("num_new", pa.int64()),
+        ("num_pass_gained", pa.int64()),
+        ("num_pass_lost", pa.int64()),
+    ]
+)
+
+HISTOGRAM_SCHEMA = pa.schema(
+    [
+        ("community_id", pa.int64()),
+        ("bin_start", pa.float64()),
+        ("old_count", pa.int64()),
+        ("new_count", pa.int64()),
+    ]
+)
+
+PROVIDERS_SCHEMA = pa.schema(
+    [
+        ("community_id", pa.int64()),
+        ("provider", pa.string()),
+        ("num_passports", pa.int64()),
+        ("points_delta", pa.float64()),
+    ]
+)
+
+
+def _to_decimal(value) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+class RescoreDiff:
+    """
+    Aggregates of the changes of the scores of a community. The histograms are of
+    the raw scores for binary scorers (the score being 0 or 1), and of the scores
+    otherwise.
+    """
+
+    def __init__(self, community_id: int, bin_width: Decimal = Decimal(1)):
+        self.community_id = community_id
+        self.bin_width = Decimal(str(bin_width))
+        self.num_passports = 0
+        self.num_changed = 0
+        self.num_increased = 0
+        self.num_decreased = 0
+        self.num_new = 0
+        self.num_pass_gained = 0
+        self.num_pass_lost = 0
+        self.old_histogram = Counter()
+        self.new_histogram = Counter()
+        # Number of changed passports whose points changed for each provider, and
+        # the sum of these changes
+        self.provider_passports = Counter()
+        self.provider_deltas: Dict[str, Decimal] = {}
+
+    def bin(self, value: Decimal) -> Decimal:
+        return (value // self.bin_width) * self.bin_width
+
+    def add(self, old_score: Optional[dict], new_score: ScoreData):
+        """
+        Add a passport, given the `score`, `evidence` and `stamp_scores` of its
+        current score (None if it has not been scored), and its new score
+        """
+        self.num_passports += 1
+        new_evidence = new_score.evidence[0] if new_score.evidence else None
+        new_value = _to_decimal(
+            new_evidence.rawScore if new_evidence else new_score.score
+        )
+        self.new_histogram[self.bin(new_value)] += 1
+
+        if old_score is None or old_score["score"] is None:
+            self.num_new += 1
+            self.num_changed += 1
+            old_value = None
+            old_points = {}
+        else:
+            old_evidence = old_score["evidence"]
+            old_value = _to_decimal(
+                old_evidence["rawScore"] if old_evidence else old_score["score"]
+            )
+            self.old_histogram[self.bin(old_value)] += 1
+            old_points = old_score["stamp_scores"] or {}
+
+            if new_value != old_value:
+                self.num_changed += 1
+                if new_value > old_value:
+                    self.num_increased += 1
+                else:
+                    self.num_decreased += 1
+
+            if old_evidence and new_evidence:
+                if new_evidence.success and not old_evidence["success"]:
+                    self.num_pass_gained += 1
+                elif old_evidence["success"] and not new_evidence.success:
+                    self.num_pass_lost += 1
+
+        if old_value is None or new_value != old_value:
+            new_points = new_score.stamp_scores or {}
+            for provider in set(old_points) | set(new_points):
+                delta = _to_decimal(new_points.get(provider)) - _to_decimal(
+                    old_points.get(provider)
+                )
+                if delta:
+                    self.provider_passports[provider] += 1
+                    self.provider_deltas[provider] = (
+                        self.provider_deltas.get(provider, Decimal(0)) + delta
+                    )
+
+    def summary_row(self) -> dict:
+        return {
+            "community_id": self.community_id,
+            "num_passports": self.num_passports,
+            "num_changed": self.num_changed,
+            "num_increased": self.num_increased,
+            "num_decreased": self.num_decreased,
+            "num_new": self.num_new,
+            "num_pass_gained": self.num_pass_gained,
+            "num_pass_lost": self.num_pass_lost,
+        }
+
+    def histogram_rows(self) -> List[dict]:
+        return [
+            {
+                "community_id": self.community_id,
+                "bin_start": float(bin_start),
+                "old_count": self.old_histogram[bin_start],
+                "new_count": self.new_histogram[bin_start],
+            }
+            for bin_start in sorted(set(self.old_histogram) | set(self.new_histogram))
+        ]
+
+    def top_providers(self, limit: int) -> List[dict]:
+        """The providers whose points changed for the most passports"""
+        return [
+            {
+                "community_id": self.community_id,
+                "provider": provider,
+                "num_passports": num_passports,
+                "points_delta": float(self.provider_deltas[provider]),
+            }
+            for provider, num_passports in sorted(
+                self.provider_passports.items(), key=lambda item: (-item[1], item[0])
+            )[:limit]
+        ]
+
+
+def get_new_scorer(scorer, weights: dict, threshold):
+    """
+    An unsaved copy of the scorer with the new weights (and threshold), which is
+    not cached by `get_weight_table`
+    """
+    if isinstance(scorer, BinaryWeightedScorer):
+        return BinaryWeightedScorer(
+            weights=weights, threshold=Decimal(format_threshold(threshold))
+        )
+    return WeightedScorer(weights=weights)
+
+
+def diff_community_scores(
+    community,
+    plan: RescorePlan,
+    weights: dict,
+    threshold,
+    batch_size: int,
+    bin_width: Decimal = Decimal(1),
+    using: str = "default",
+) -> RescoreDiff:
+    """
+    Score the passports of the community affected by the plan with the new weights
+    & threshold, batch by batch, and aggregate the changes. Nothing is written.
+    """
+    scorer = get_new_scorer(community.get_scorer(), weights, threshold)
+    diff = RescoreDiff(community.id, bin_width)
+    last_id = 0
+    while True:
+        passport_ids = list(
+            Passport.objects.using(using)
+            .filter(community_id=community.id, id__gt=last_id)
+            .filter(plan.affected_passports_filter(community.id))
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not passport_ids:
+            return diff
+        last_id = passport_ids[-1]
+
+        old_scores = {
+            score["passport_id"]: score
+            for score in Score.objects.using(using)
+            .filter(passport_id__in=passport_ids)
+            .values("passport_id", "score", "evidence", "stamp_scores")
+        }
+        stamps = {}
+        for stamp in scoring_stamps_query(passport_ids).using(using):
+            stamps.setdefault(stamp.passport_id, []).append(stamp)
+
+        new_scores = scorer.recompute_score(passport_ids, stamps, community.id)
+        for passport_id, new_score in zip(passport_ids, new_scores):
+            diff.add(old_scores.get(passport_id), new_score)
+
+
+def write_rescore_diffs(output_prefix: str, diffs, top_providers: int = 10):
+    """
+    Write the diffs (an iterable, consumed one community at a time) to the
+    `<output_prefix>_summary`, `_histograms` and `_providers` Parquet files, and
+    return the summary rows
+    """
+    summaries = []
+    with parquet_writer(
+        f"{output_prefix}_summary.parquet", SUMMARY_SCHEMA
+    ) as summary_writer, parquet_writer(
+        f"{output_prefix}_histograms.parquet", HISTOGRAM_SCHEMA
+    ) as histogram_writer, parquet_writer(
+        f"{output_prefix}_providers.parquet", PROVIDERS_SCHEMA
+    ) as providers_writer:
+        for diff in diffs:
+            summary = diff.summary_row()
+            summary_writer.write_batch([summary])
+            histogram_writer.write_batch(diff.histogram_rows())
+            providers_writer.write_batch(diff.top_providers(top_providers))
+            summaries.append(summary)
+    return summaries
@@ -0,0 +1,49 @@
+"""
+Invalidate the cached weight tables (see `scorer_weighted.weight_table`) whenever
+one of the models the weights are derived from changes. The versions are bumped
+again when the transaction of the change commits (see `bump_weights_version`).
+"""
+
+from account.models import AddressList, AllowList, Community, Customization
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from scorer_weighted.models import BinaryWeightedScorer, Scorer, WeightedScorer
+from scorer_weighted.weight_table import bump_weights_version
+
+
+@receiver(post_save, sender=Scorer)
+@receiver(post_save, sender=WeightedScorer)
+@receiver(post_save, sender=BinaryWeightedScorer)
+@receiver(post_delete, sender=WeightedScorer)
+@receiver(post_delete, sender=BinaryWeightedScorer)
+def scorer_weights_changed(sender, instance, **kwargs):
+    bump_weights_version(scorer_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Community)
+def community_scorer_changed(sender, instance, **kwargs):
+    bump_weights_version(community_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Customization)
+@receiver(post_delete, sender=Customization)
+def customization_changed(sender, instance, **kwargs):
+    bump_weights_version(community_ids=[instance.scorer_id])
+
+
+@receiver(post_save, sender=AllowList)
+@receiver(post_delete, sender=AllowList)
+def allow_list_changed(sender, instance, **kwargs):
+    community_ids = Customization.objects.filter(
+        pk=instance.customization_id
+    ).values_list("scorer_id", flat=True)
+    bump_weights_version(community_ids=community_ids)
+
+
+@receiver(post_save, sender=AddressList)
+def address_list_changed(sender, instance, **kwargs):
+    # The name of the address list is part of the weight key (`AllowList#<name>`)
+    community_ids = AllowList.objects.filter(address_list=instance).values_list(
+        "customization__scorer_id", flat=True
+    )
+    bump_weights_version(community_ids=community_ids)
@@ -0,0 +1,195 @@
+"""
+Set-based scoring of a whole range of passports inside the DB.
+
+For full-population rescoring, `recalculate_weighted_score` needs every stamp
+(and its credential) to be loaded into Python. This engine instead joins the
+stamps against a temporary table holding the weights of the scorer, and writes
+the scores back with one `UPDATE ... FROM` for the passports of the range (plus
+one `INSERT ... SELECT` for the passports that have not been scored yet).
+
+The results are the same as the ones of `recalculate_weighted_score`:
+ - only the first stamp (lowest id) of each provider is scored, providers without
+   weight score 0
+ - the `earned_points` of a provider with duplicate stamps is 0
+ - the expiration date is the earliest expiration of the scored stamps, read from
+   the credential only for the stamps whose `expiration_date` is not filled yet
+
+The SQL targets PostgreSQL, where the weights are `numeric` and the sums are
+exact. The SQLite dialect (used by the tests) sums the weights as floating point
+numbers, so it is only exact for weights like 0.5 or 1.
+"""
+
+from decimal import Decimal
+
+import api_logging as logging
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from registry.models import Passport, Score, Stamp
+from registry.utils import get_utc_time
+from scorer_weighted.models import BinaryWeightedScorer
+from scorer_weighted.weight_table import get_weight_table
+
+log = logging.getLogger(__name__)
+
+WEIGHTS_TABLE = "rescore_weights"
+
+
+def _dialect() -> dict:
+    """The vendor specific SQL snippets"""
+    if connection.vendor == "postgresql":
+        return {
+            "expiration_date": "COALESCE(stamp.expiration_date, (stamp.credential->>'expirationDate')::timestamptz)",
+            "stamp_scores": "COALESCE(jsonb_object_agg(providers.provider, providers.points) FILTER (WHERE providers.provider IS NOT NULL), '{}'::jsonb)",
+            "evidence": "jsonb_build_object('type', 'ThresholdScoreCheck', 'success', ps.raw_score >= CAST(%s AS NUMERIC), 'rawScore', ps.raw_score::text, 'threshold', %s::text)",
+        }
+    return {
+        "expiration_date": "COALESCE(stamp.expiration_date, strftime('%%Y-%%m-%%d %%H:%%M:%%f', json_extract(stamp.credential, '$.expirationDate')))",
+        "stamp_scores": "COALESCE(json_group_object(providers.provider, providers.points) FILTER (WHERE providers.provider IS NOT NULL), json_object())",
+        "evidence": "json_object('type', 'ThresholdScoreCheck', 'success', json(CASE WHEN ps.raw_score >= CAST(%s AS NUMERIC) THEN 'true' ELSE 'false' END), 'rawScore', CAST(ps.raw_score AS TEXT), 'threshold', %s)",
+    }
+
+
+def _rowcount(cursor) -> int:
+    """The number of rows written by the last statement"""
+    if cursor.rowcount >= 0:
+        return cursor.rowcount
+    # sqlite3 does not report the row count of statements starting with `WITH`
+    cursor.execute("SELECT changes()")
+    return cursor.fetchone()[0]
+
+
+def _create_weights_table(cursor, weights: dict):
+    cursor.execute(f"DROP TABLE IF EXISTS {WEIGHTS_TABLE}")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {WEIGHTS_TABLE} (provider VARCHAR(256) PRIMARY KEY, weight NUMERIC NOT NULL, points TEXT NOT NULL)"
+    )
+    if weights:
+        cursor.executemany(
+            f"INSERT INTO {WEIGHTS_TABLE} (provider, weight, points) VALUES (%s, %s, %s)",
+            [
+                (provider, Decimal(weight), str(Decimal(weight)))
+                for provider, weight in weights.items()
+            ],
+        )
+
+
+def _passport_scores_cte(passport_ids_sql: str, dialect: dict) -> str:
+    """
+    The `passport_scores` (passport_id, raw_score, stamp_scores, expiration_date)
+    of the passports selected by `passport_ids_sql`
+    """
+    qn = connection.ops.quote_name
+    stamp_table = qn(Stamp._meta.db_table)
+    passport_table = qn(Passport._meta.db_table)
+    return f"""
+        WITH stamp_providers AS (
+            SELECT passport_id, provider, COUNT(*) AS num_stamps, MIN(id) AS first_id
+            FROM {stamp_table}
+            WHERE passport_id IN ({passport_ids_sql})
+            GROUP BY passport_id, provider
+        ),
+        providers AS (
+            SELECT
+                stamp_providers.passport_id,
+                stamp_providers.provider,
+                COALESCE(weights.weight, 0) AS weight,
+                CASE
+                    WHEN stamp_providers.num_stamps > 1 THEN '0'
+                    ELSE COALESCE(weights.points, '0')
+                END AS points,
+                {dialect["expiration_date"]} AS expiration_date
+            FROM stamp_providers
+            JOIN {stamp_table} stamp ON stamp.id = stamp_providers.first_id
+            LEFT JOIN {WEIGHTS_TABLE} weights ON weights.provider = stamp_providers.provider
+        ),
+        passport_scores AS (
+            SELECT
+                passport.id AS passport_id,
+                COALESCE(SUM(providers.weight), 0) AS raw_score,
+                {dialect["stamp_scores"]} AS stamp_scores,
+                MIN(providers.expiration_date) AS expiration_date
+            FROM {passport_table} passport
+            LEFT JOIN providers ON providers.passport_id = passport.id
+            WHERE passport.id IN ({passport_ids_sql})
+            GROUP BY passport.id
+        )
+    """
+
+
+def sql_rescore_passports(scorer, community_id: int, passports: QuerySet) -> int:
+    """
+    Score the passports of the queryset with the scorer, and write their scores,
+    in the DB. Returns the number of scores written.
+    """
+    weight_table = get_weight_table(scorer, community_id)
+    dialect = _dialect()
+    passport_ids_sql, passport_ids_params = (
+        passports.order_by().values("id").query.sql_with_params()
+    )
+
+    if isinstance(scorer, BinaryWeightedScorer):
+        threshold = Decimal(str(scorer.threshold))
+        score_sql = "CASE WHEN ps.raw_score >= CAST(%s AS NUMERIC) THEN 1 ELSE 0 END"
+        score_params = [threshold]
+        evidence_sql = dialect["evidence"]
+        evidence_params = [threshold, str(threshold)]
+    else:
+        score_sql = "ps.raw_score"
+        score_params = []
+        evidence_sql = "NULL"
+        evidence_params = []
+
+    meta = Score._meta
+    qn = connection.ops.quote_name
+    score_table = qn(meta.db_table)
+    last_score_timestamp = meta.get_field("last_score_timestamp").get_db_prep_value(
+        get_utc_time(), connection
+    )
+    cte = _passport_scores_cte(passport_ids_sql, dialect)
+    # The passport ids query is used twice in the CTE
+    cte_params = list(passport_ids_params) * 2
+    value_params = score_params + evidence_params + [Score.Status.DONE]
+    value_params += [last_score_timestamp, weight_table.version]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_weights_table(cursor, weight_table.weights)
+
+        cursor.execute(
+            f"""
+            {cte}
+            UPDATE {score_table}
+            SET
+                score = {score_sql},
+                evidence = {evidence_sql},
+                status = %s,
+                last_score_timestamp = %s,
+                error = NULL,
+                stamp_scores = ps.stamp_scores,
+                expiration_date = ps.expiration_date,
+                weights_version = %s,
+                fingerprint = NULL
+            FROM passport_scores ps
+            WHERE {score_table}.passport_id = ps.passport_id
+            """,
+            cte_params + value_params,
+        )
+        num_scores = _rowcount(cursor)
+
+        cursor.execute(
+            f"""
+            {cte}
+            INSERT INTO {score_table} (passport_id, score, evidence, status, last_score_timestamp, error, stamp_scores, expiration_date, weights_version, fingerprint)
+            SELECT ps.passport_id, {score_sql}, {evidence_sql}, %s, %s, NULL, ps.stamp_scores, ps.expiration_date, %s, NULL
+            FROM passport_scores ps
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {score_table} WHERE {score_table}.passport_id = ps.passport_id
+            )
+            """,
+            cte_params + value_params,
+        )
+        num_scores += _rowcount(cursor)
+
+        cursor.execute(f"DROP TABLE {WEIGHTS_TABLE}")
+
+    log.debug("Scored %s passports of community %s in SQL", num_scores, community_id)
+    return num_scores
@@ -3,5 +3,6 @@ from scorer.test.conftest import (
     passport_holder_addresses,
     scorer_account,
     scorer_community_with_binary_scorer,
+    scorer_community_with_weighted_scorer,
     scorer_user,
 )
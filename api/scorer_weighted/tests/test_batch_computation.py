@@ -0,0 +1,149 @@
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from registry.models import Passport, Stamp
+from scorer_weighted.batch_computation import (
+    CompiledWeights,
+    _score_passports_per_stamp,
+    batch_calculate_weighted_score,
+)
+from scorer_weighted.models import BinaryWeightedScorer, WeightedScorer
+
+now = datetime.now(timezone.utc)
+
+weights = {
+    "Google": "0.525",
+    "Ens": "0.408",
+    "Discord": "0.516",
+    "githubContributionActivityGte#30": "2.020",
+    "CoinbaseDualVerification": "16.042",
+    "Twitter": "1",
+    "Linkedin": "0",
+}
+
+
+def make_stamp(provider, expiration_date):
+    return (provider, expiration_date.isoformat())
+
+
+def generate_batch(seed, num_passports=200):
+    rnd = random.Random(seed)
+    providers = list(weights.keys()) + ["UnknownProvider"]
+    stamps = {}
+    for passport_id in range(num_passports):
+        # Some passports have no stamps, some have duplicate providers
+        stamps[passport_id] = [
+            make_stamp(
+                rnd.choice(providers),
+                now + timedelta(days=rnd.randint(-5, 90), seconds=rnd.randint(0, 3)),
+            )
+            for _ in range(rnd.randint(0, 12))
+        ]
+    return list(range(num_passports)), stamps
+
+
+def assert_same_scores(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        # Compare the string representation, so the exponent must match as well
+        assert str(a["sum_of_weights"]) == str(e["sum_of_weights"])
+        assert list(a["earned_points"].items()) == list(e["earned_points"].items())
+        assert a["expiration_date"] == e["expiration_date"]
+
+
+class TestBatchCalculateWeightedScore:
+    @pytest.mark.parametrize("seed", [0, 1, 2, 3])
+    def test_same_result_as_per_stamp_scoring(self, seed):
+        passport_ids, stamps = generate_batch(seed)
+
+        assert_same_scores(
+            batch_calculate_weighted_score(weights, passport_ids, stamps),
+            _score_passports_per_stamp(weights, passport_ids, stamps),
+        )
+
+    def test_duplicate_provider_earns_no_points(self):
+        stamps = {
+            1: [
+                make_stamp("Google", now + timedelta(days=3)),
+                make_stamp("Ens", now + timedelta(days=2)),
+                make_stamp("Google", now + timedelta(days=1)),
+            ]
+        }
+
+        [score] = batch_calculate_weighted_score(weights, [1], stamps)
+
+        assert score["sum_of_weights"] == Decimal("0.933")
+        assert score["earned_points"] == {"Google": "0", "Ens": "0.408"}
+        # The duplicate stamp is not taken into account for the expiration date
+        assert score["expiration_date"] == now + timedelta(days=2)
+
+    def test_empty_batch(self):
+        assert batch_calculate_weighted_score(weights, [], {}) == []
+        assert batch_calculate_weighted_score(weights, [1], {}) == [
+            {
+                "sum_of_weights": Decimal(0),
+                "earned_points": {},
+                "expiration_date": None,
+            }
+        ]
+
+    def test_float_weights_fall_back_to_per_stamp_scoring(self):
+        float_weights = {"Google": 0.525, "Ens": 0.408}
+        passport_ids, stamps = generate_batch(5, num_passports=20)
+
+        assert CompiledWeights.compile(float_weights) is None
+        assert_same_scores(
+            batch_calculate_weighted_score(float_weights, passport_ids, stamps),
+            _score_passports_per_stamp(float_weights, passport_ids, stamps),
+        )
+
+
+@pytest.mark.django_db
+class TestRecomputeScore:
+    def test_recompute_score_uses_batch(
+        self, passport_holder_addresses, scorer_community_with_binary_scorer
+    ):
+        passports = [
+            Passport.objects.create(
+                address=passport_holder_addresses[idx]["address"],
+                community=scorer_community_with_binary_scorer,
+            )
+            for idx in range(2)
+        ]
+        stamps = {
+            passports[0].id: [
+                Stamp(
+                    passport=passports[0],
+                    provider="Google",
+                    hash="0x01",
+                    credential={"expirationDate": now.isoformat()},
+                ),
+                Stamp(
+                    passport=passports[0],
+                    provider="Ens",
+                    hash="0x02",
+                    credential={"expirationDate": now.isoformat()},
+                ),
+            ]
+        }
+        passport_ids = [p.id for p in passports]
+
+        weighted_scorer = WeightedScorer.objects.create(weights=dict(weights))
+        binary_scorer = BinaryWeightedScorer.objects.create(
+            weights=dict(weights), threshold=Decimal("0.9")
+        )
+
+        weighted_scores = weighted_scorer.recompute_score(
+            passport_ids, stamps, scorer_community_with_binary_scorer.id
+        )
+        binary_scores = binary_scorer.recompute_score(
+            passport_ids, stamps, scorer_community_with_binary_scorer.id
+        )
+
+        assert [s.score for s in weighted_scores] == [Decimal("0.933"), Decimal(0)]
+        assert [s.expiration_date for s in weighted_scores] == [now, None]
+        assert [s.score for s in binary_scores] == [Decimal(1), Decimal(0)]
+        assert binary_scores[0].evidence[0].as_dict()["rawScore"] == "0.933"
+        assert binary_scores[0].stamp_scores == {"Google": "0.525", "Ens": "0.408"}
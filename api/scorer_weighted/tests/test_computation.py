@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from registry.models import Passport, Stamp
+from scorer_weighted.computation import (
+    _stamp_rows_query,
+    acalculate_weighted_score,
+    calculate_weighted_score,
+    scoring_stamps_query,
+)
+from scorer_weighted.models import WeightedScorer
+
+pytestmark = pytest.mark.django_db
+
+now = datetime.now(timezone.utc)
+
+
+@pytest.fixture(name="passports_with_stamps")
+def fixture_passports_with_stamps(
+    passport_holder_addresses, scorer_community_with_binary_scorer
+):
+    passports = []
+    for idx, holder in enumerate(passport_holder_addresses[:4]):
+        passport = Passport.objects.create(
+            address=holder["address"],
+            community=scorer_community_with_binary_scorer,
+        )
+        for provider_idx, provider in enumerate(["Google", "Ens", "Google"][: idx + 1]):
+            Stamp.objects.create(
+                passport=passport,
+                provider=provider,
+                hash=f"0x{idx}{provider_idx}",
+                credential={
+                    "expirationDate": (now + timedelta(days=provider_idx)).isoformat(),
+                    "proof": {"proofValue": "x" * 1000},
+                },
+            )
+        passports.append(passport)
+    return passports
+
+
+class TestCalculateWeightedScore:
+    @pytest.mark.parametrize("num_passports", [1, 4])
+    def test_async_scoring_uses_single_stamp_query(
+        self,
+        passports_with_stamps,
+        scorer_community_with_binary_scorer,
+        django_assert_num_queries,
+        num_passports,
+    ):
+        scorer = WeightedScorer.objects.create(weights={"Google": "1", "Ens": "2"})
+        passport_ids = [p.id for p in passports_with_stamps[:num_passports]]
+
+        # Warm up the weight table cache
+        async_to_sync(acalculate_weighted_score)(
+            scorer, passport_ids, scorer_community_with_binary_scorer.id
+        )
+
+        # 1 query for the stamps of all passports
+        with django_assert_num_queries(1):
+            scores = async_to_sync(acalculate_weighted_score)(
+                scorer, passport_ids, scorer_community_with_binary_scorer.id
+            )
+
+        assert len(scores) == num_passports
+
+    def test_sync_and_async_scoring_agree(
+        self, passports_with_stamps, scorer_community_with_binary_scorer
+    ):
+        scorer = WeightedScorer.objects.create(weights={"Google": "1", "Ens": "2"})
+        passport_ids = [p.id for p in passports_with_stamps]
+        community_id = scorer_community_with_binary_scorer.id
+
+        sync_scores = calculate_weighted_score(scorer, passport_ids, community_id)
+        async_scores = async_to_sync(acalculate_weighted_score)(
+            scorer, passport_ids, community_id
+        )
+
+        assert [s["sum_of_weights"] for s in sync_scores] == [
+            Decimal(1),
+            Decimal(3),
+            Decimal(3),
+            Decimal(3),
+        ]
+        assert [s["sum_of_weights"] for s in async_scores] == [
+            s["sum_of_weights"] for s in sync_scores
+        ]
+        assert [s["expiration_date"] for s in async_scores] == [
+            s["expiration_date"] for s in sync_scores
+        ]
+        # The async path stores the earned points as floats
+        assert async_scores[2]["earned_points"] == {"Google": 0.0, "Ens": 2.0}
+        assert sync_scores[2]["earned_points"] == {"Google": "0", "Ens": "2"}
+
+    def test_stamps_are_loaded_in_id_order(self, passports_with_stamps):
+        passport_ids = [p.id for p in passports_with_stamps]
+
+        # The first stamp of each provider counts, like in the SQL engine (MIN(id))
+        for query in [
+            scoring_stamps_query(passport_ids),
+            _stamp_rows_query(passport_ids),
+        ]:
+            assert query.query.order_by == ("id",)
+        assert [stamp.id for stamp in scoring_stamps_query(passport_ids)] == sorted(
+            Stamp.objects.values_list("id", flat=True)
+        )
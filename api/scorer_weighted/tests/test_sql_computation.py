@@ -0,0 +1,168 @@
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from registry.management.commands.recalculate_scores import rescore_passports
+from registry.models import Passport, Score, Stamp
+from scorer_weighted.models import BinaryWeightedScorer
+from scorer_weighted.sql_computation import sql_rescore_passports
+from scorer_weighted.weight_table import get_weight_table
+
+pytestmark = pytest.mark.django_db
+
+now = datetime.now(timezone.utc).replace(microsecond=0)
+
+# The SQLite dialect sums floats, these weights are exactly representable
+weights = {
+    "Google": "0.5",
+    "Ens": "1.5",
+    "Discord": "2",
+    "Twitter": "1",
+    "Linkedin": "0",
+    "CoinbaseDualVerification": "16.5",
+}
+
+
+def generate_passports(community, seed, num_passports=100):
+    rnd = random.Random(seed)
+    providers = list(weights.keys()) + ["UnknownProvider"]
+    offsets = [
+        timezone.utc,
+        timezone(timedelta(hours=2)),
+        timezone(-timedelta(hours=5)),
+    ]
+    passports = Passport.objects.bulk_create(
+        [
+            Passport(address=f"0x{seed:08x}{idx:032x}", community=community)
+            for idx in range(num_passports)
+        ]
+    )
+    stamps = []
+    for passport in passports:
+        # Some passports have no stamps, some have duplicate providers
+        for _ in range(rnd.randint(0, 10)):
+            expiration_date = (
+                now + timedelta(days=rnd.randint(-5, 90), seconds=rnd.randint(0, 3))
+            ).astimezone(rnd.choice(offsets))
+            stamps.append(
+                Stamp(
+                    passport=passport,
+                    provider=rnd.choice(providers),
+                    hash=f"hash{len(stamps)}",
+                    credential={"expirationDate": expiration_date.isoformat()},
+                    # Some stamps have not been backfilled yet
+                    expiration_date=expiration_date if rnd.random() < 0.5 else None,
+                )
+            )
+    Stamp.objects.bulk_create(stamps)
+    return passports
+
+
+def get_scores():
+    return {
+        score["passport_id"]: score
+        for score in Score.objects.values(
+            "passport_id",
+            "score",
+            "status",
+            "error",
+            "evidence",
+            "stamp_scores",
+            "expiration_date",
+            "weights_version",
+            "fingerprint",
+        )
+    }
+
+
+@pytest.fixture(
+    params=[
+        "scorer_community_with_binary_scorer",
+        "scorer_community_with_weighted_scorer",
+    ]
+)
+def community(request):
+    """A community scored with the `weights`, by a binary or a weighted scorer"""
+    community = request.getfixturevalue(request.param)
+    scorer = community.get_scorer()
+    scorer.weights = weights
+    if isinstance(scorer, BinaryWeightedScorer):
+        scorer.threshold = Decimal("4.5")
+    scorer.save()
+    return community
+
+
+class TestSqlRescorePassports:
+    @pytest.mark.parametrize("seed", [0, 1])
+    def test_same_result_as_python_engine(self, community, seed):
+        passports = generate_passports(community, seed)
+        scorer = community.get_scorer()
+
+        rescore_passports(
+            scorer,
+            community,
+            list(
+                Passport.objects.filter(community=community).prefetch_related("score")
+            ),
+        )
+        expected = get_scores()
+        # Some scores are updated, the others are created
+        Score.objects.filter(passport__in=passports[::2]).delete()
+        Score.objects.update(
+            score=None,
+            evidence=None,
+            stamp_scores=None,
+            expiration_date=None,
+            weights_version=None,
+            fingerprint="outdated",
+        )
+
+        num_scores = sql_rescore_passports(
+            scorer, community.id, Passport.objects.filter(community=community)
+        )
+
+        assert num_scores == len(passports)
+        assert get_scores() == expected
+
+    def test_only_selected_passports_are_scored(self, community):
+        passports = generate_passports(community, 2, num_passports=10)
+
+        sql_rescore_passports(
+            community.get_scorer(),
+            community.id,
+            Passport.objects.filter(id__in=[p.id for p in passports[:3]]),
+        )
+
+        assert set(get_scores()) == {p.id for p in passports[:3]}
+
+    def test_recalculate_scores_with_sql_engine(self, community):
+        generate_passports(community, 3, num_passports=20)
+        call_command("recalculate_scores")
+        expected = get_scores()
+        Score.objects.all().delete()
+
+        call_command("recalculate_scores", "--engine", "sql", "--range-size", "7")
+
+        # Each run of the command bumps the weights version
+        scores = get_scores()
+        for score in list(scores.values()) + list(expected.values()):
+            del score["weights_version"]
+        assert scores == expected
+
+    @pytest.mark.parametrize("engine", ["python", "sql"])
+    def test_weights_version_is_stored(self, community, engine):
+        passports = generate_passports(community, 4, num_passports=10)
+        # Some scores are updated, the others are created
+        Score.objects.bulk_create(
+            [Score(passport=p, fingerprint="outdated") for p in passports[::2]]
+        )
+
+        call_command("recalculate_scores", "--engine", engine)
+
+        version = get_weight_table(community.get_scorer(), community.id).version
+        assert version is not None
+        assert {
+            (s["weights_version"], s["fingerprint"]) for s in get_scores().values()
+        } == {(version, None)}
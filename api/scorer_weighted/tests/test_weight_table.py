@@ -0,0 +1,116 @@
+import pytest
+from account.models import AddressList, AllowList, Customization
+from asgiref.sync import async_to_sync
+from scorer_weighted.weight_table import (
+    aget_weight_table,
+    bump_weights_version,
+    get_weight_table,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name="scorer")
+def fixture_scorer(scorer_community_with_binary_scorer):
+    scorer = scorer_community_with_binary_scorer.get_scorer()
+    scorer.weights = {"Google": "1", "Ens": "2"}
+    scorer.save()
+    return scorer
+
+
+class TestWeightTable:
+    def test_warm_table_needs_no_queries(
+        self, scorer, scorer_community_with_binary_scorer, django_assert_num_queries
+    ):
+        community_id = scorer_community_with_binary_scorer.id
+
+        with django_assert_num_queries(1):
+            table = get_weight_table(scorer, community_id)
+
+        with django_assert_num_queries(0):
+            assert get_weight_table(scorer, community_id) is table
+            assert async_to_sync(aget_weight_table)(scorer, community_id) is table
+
+        assert table.weights == {"Google": "1", "Ens": "2"}
+
+    def test_saving_scorer_invalidates_table(
+        self,
+        scorer,
+        scorer_community_with_binary_scorer,
+        django_capture_on_commit_callbacks,
+    ):
+        community_id = scorer_community_with_binary_scorer.id
+        table = get_weight_table(scorer, community_id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            scorer.weights = {"Google": "3"}
+            scorer.save()
+            # Rebuilt before the change is committed
+            uncommitted_table = get_weight_table(scorer, community_id)
+            assert uncommitted_table is not table
+
+        # Invalidated again once committed
+        assert get_weight_table(scorer, community_id) is not uncommitted_table
+
+        new_table = get_weight_table(scorer, community_id)
+        assert new_table is not table
+        assert new_table.weights == {"Google": "3"}
+
+    def test_allow_list_changes_invalidate_table(
+        self,
+        scorer,
+        scorer_community_with_binary_scorer,
+        django_capture_on_commit_callbacks,
+    ):
+        community_id = scorer_community_with_binary_scorer.id
+        assert "AllowList#test" not in get_weight_table(scorer, community_id).weights
+
+        with django_capture_on_commit_callbacks(execute=True):
+            customization = Customization.objects.create(
+                path="test", scorer=scorer_community_with_binary_scorer
+            )
+            address_list = AddressList.objects.create(name="test")
+            AllowList.objects.create(
+                address_list=address_list, customization=customization, weight=5
+            )
+
+        table = get_weight_table(scorer, community_id)
+        assert table.weights["AllowList#test"] == "5.0000"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            address_list.name = "renamed"
+            address_list.save()
+
+        table = get_weight_table(scorer, community_id)
+        assert "AllowList#test" not in table.weights
+        assert "AllowList#renamed" in table.weights
+
+    def test_bump_weights_version_invalidates_table(
+        self,
+        scorer,
+        scorer_community_with_binary_scorer,
+        django_capture_on_commit_callbacks,
+    ):
+        community_id = scorer_community_with_binary_scorer.id
+        table = get_weight_table(scorer, community_id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            bump_weights_version(community_ids=[community_id])
+
+        assert get_weight_table(scorer, community_id) is not table
+
+    def test_bump_weights_version_logs_cache_errors(
+        self, scorer, mocker, django_capture_on_commit_callbacks
+    ):
+        mocker.patch(
+            "scorer_weighted.weight_table.cache.set_many",
+            side_effect=ConnectionError("Redis down"),
+        )
+        log_error = mocker.patch("scorer_weighted.weight_table.log.error")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            scorer.weights = {"Google": "3"}
+            scorer.save()
+
+        # Both the bump on save & on commit failed
+        assert log_error.call_count == 2
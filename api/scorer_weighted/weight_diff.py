@@ -0,0 +1,181 @@
+"""
+Impact analysis of a change of the weights & threshold of the scorers.
+
+When new weights are pushed to the scorers (see the `recalculate_scores` command),
+only some passports can get a different score:
+ - the passports holding a stamp of a provider whose weight has changed
+ - for binary scorers, the passports whose raw score lies between the old and the
+   new threshold (the others pass or fail like before, only the threshold in the
+   evidence of their score needs to be updated)
+ - the passports that have not been scored yet, or whose last scoring failed or
+   did not finish (status ERROR or PROCESSING), like a full rescore would
+
+A `RescorePlan` describes these passports for one community, so that only they
+are rescored.
+"""
+
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db import connection
+from django.db.models import (
+    DecimalField,
+    F,
+    Func,
+    JSONField,
+    Q,
+    QuerySet,
+    TextField,
+    Value,
+)
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+from registry.models import Passport, Score, Stamp
+from scorer_weighted.models import THRESHOLD_DECIMAL_PLACES, BinaryWeightedScorer
+
+
+def format_threshold(threshold) -> str:
+    """The threshold as it is written in the evidence of the scores"""
+    return str(
+        Decimal(str(threshold)).quantize(Decimal(10) ** -THRESHOLD_DECIMAL_PLACES)
+    )
+
+
+class RescorePlan:
+    """The passports of a community that need to be rescored after a weight change"""
+
+    __slots__ = ("changed_providers", "old_threshold", "new_threshold")
+
+    def __init__(
+        self,
+        changed_providers: List[str],
+        old_threshold: Optional[Decimal] = None,
+        new_threshold: Optional[Decimal] = None,
+    ):
+        self.changed_providers = changed_providers
+        self.old_threshold = old_threshold
+        self.new_threshold = new_threshold
+
+    def __repr__(self):
+        return f"RescorePlan(changed_providers={self.changed_providers}, threshold={self.old_threshold} -> {self.new_threshold})"
+
+    @property
+    def threshold_changed(self) -> bool:
+        return self.old_threshold != self.new_threshold
+
+    def as_dict(self) -> dict:
+        return {
+            "changed_providers": self.changed_providers,
+            "old_threshold": (
+                str(self.old_threshold) if self.old_threshold is not None else None
+            ),
+            "new_threshold": (
+                str(self.new_threshold) if self.new_threshold is not None else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RescorePlan":
+        return cls(
+            data["changed_providers"],
+            Decimal(data["old_threshold"]) if data["old_threshold"] else None,
+            Decimal(data["new_threshold"]) if data["new_threshold"] else None,
+        )
+
+    def affected_passports_filter(self, community_id: int) -> Q:
+        """The filter selecting the passports of the community to rescore"""
+        q = Q(score__isnull=True) | Q(
+            score__status__in=[Score.Status.ERROR, Score.Status.PROCESSING]
+        )
+        if self.changed_providers:
+            q |= Q(
+                id__in=Stamp.objects.filter(
+                    provider__in=self.changed_providers,
+                    passport__community_id=community_id,
+                ).values("passport_id")
+            )
+        if self.threshold_changed:
+            low, high = sorted([self.old_threshold, self.new_threshold])
+            q |= Q(
+                id__in=Score.objects.filter(passport__community_id=community_id)
+                .annotate(
+                    raw_score=Cast(
+                        KT("evidence__rawScore"),
+                        DecimalField(max_digits=18, decimal_places=9),
+                    )
+                )
+                .filter(raw_score__gte=low, raw_score__lte=high)
+                .values("passport_id")
+            )
+        return q
+
+    def affected_passports(self, community_id: int) -> QuerySet[Passport]:
+        return Passport.objects.filter(community_id=community_id).filter(
+            self.affected_passports_filter(community_id)
+        )
+
+    def update_evidence_threshold(self, community_id: int) -> int:
+        """
+        Write the new threshold in the evidence of all the scores of the community,
+        in a single statement (the affected passports are then rescored)
+        """
+        if not self.threshold_changed:
+            return 0
+        threshold = format_threshold(self.new_threshold)
+        if connection.vendor == "postgresql":
+            evidence = Func(
+                F("evidence"),
+                Value("{threshold}"),
+                Func(
+                    Cast(Value(threshold), TextField()),
+                    function="to_jsonb",
+                    output_field=JSONField(),
+                ),
+                function="jsonb_set",
+                output_field=JSONField(),
+            )
+        else:
+            evidence = Func(
+                F("evidence"),
+                Value("$.threshold"),
+                Value(threshold),
+                function="json_set",
+                output_field=JSONField(),
+            )
+        return Score.objects.filter(
+            passport__community_id=community_id, evidence__isnull=False
+        ).update(evidence=evidence)
+
+
+def diff_weights(old_weights: dict, new_weights: dict) -> List[str]:
+    """The providers whose weight is different (or only set in one of the weights)"""
+    old_weights = old_weights or {}
+    new_weights = new_weights or {}
+    return sorted(
+        provider
+        for provider in set(old_weights) | set(new_weights)
+        if provider not in old_weights
+        or provider not in new_weights
+        or Decimal(str(old_weights[provider])) != Decimal(str(new_weights[provider]))
+    )
+
+
+def plan_weight_changes(
+    communities, new_weights: dict, new_threshold
+) -> Dict[int, RescorePlan]:
+    """
+    Compare the current weights & threshold of the scorer of each community to the
+    new ones, and return the rescore plan of each community
+    """
+    plans = {}
+    for community in communities:
+        scorer = community.get_scorer()
+        old_threshold = None
+        threshold = None
+        if isinstance(scorer, BinaryWeightedScorer):
+            old_threshold = Decimal(format_threshold(scorer.threshold))
+            threshold = Decimal(format_threshold(new_threshold))
+        plans[community.id] = RescorePlan(
+            diff_weights(scorer.weights, new_weights), old_threshold, threshold
+        )
+    return plans
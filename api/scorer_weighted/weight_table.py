@@ -0,0 +1,216 @@
+"""
+Process-local cache of the weights used to score the passports of a community.
+
+Scoring a passport needs the weights of the scorer merged with the dynamic
+weights of the community customization (allow lists). Loading these on every
+request costs several queries, so the merged and compiled weights are kept in an
+LRU inside each worker (or Lambda container).
+
+The entries are versioned: a version key per scorer and per community is kept in
+the shared cache (redis) and bumped by the `post_save` / `post_delete` signals of
+the models the weights are derived from (see `scorer_weighted.signals`). A worker
+only reuses an entry if the versions it was built with are still the current
+ones, so a warm worker only needs a single cache lookup and no DB queries.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import api_logging as logging
+from account.models import AllowList
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from scorer_weighted.batch_computation import CompiledWeights
+
+log = logging.getLogger(__name__)
+
+WEIGHTS_VERSION_KEY_PREFIX = "weights_version"
+
+
+def scorer_version_key(scorer_id: int) -> str:
+    return f"{WEIGHTS_VERSION_KEY_PREFIX}:scorer:{scorer_id}"
+
+
+def community_version_key(community_id: int) -> str:
+    return f"{WEIGHTS_VERSION_KEY_PREFIX}:community:{community_id}"
+
+
+class WeightTable:
+    """The weights for scoring a community, with the customization weights merged in"""
+
+    __slots__ = ("version", "weights", "compiled")
+
+    def __init__(
+        self, version: Optional[str], weights: dict, compiled: Optional[CompiledWeights]
+    ):
+        self.version = version
+        self.weights = weights
+        self.compiled = compiled
+
+    def __repr__(self):
+        return f"WeightTable(version={self.version}, weights={self.weights})"
+
+
+class WeightTableCache:
+    """A small thread-safe LRU of weight tables, keyed by (scorer_id, community_id)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[WeightTable]:
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+            return table
+
+    def put(self, key, table: WeightTable):
+        with self._lock:
+            self._entries[key] = table
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+weight_tables = WeightTableCache(settings.WEIGHT_TABLE_CACHE_SIZE)
+
+
+def bump_weights_version(
+    scorer_ids: Iterable[int] = (), community_ids: Iterable[int] = ()
+):
+    """
+    Invalidate the weight tables of the given scorers and communities in all the workers.
+
+    The versions are bumped right away, and again once the current transaction
+    commits: in between, a worker could rebuild a table from the old weights and
+    cache it under the first new version. A failure of the cache is logged, not
+    raised to the caller (which has already saved its changes).
+    """
+    keys = [scorer_version_key(i) for i in scorer_ids]
+    keys += [community_version_key(i) for i in community_ids]
+    if not keys:
+        return
+
+    def set_versions():
+        new_version = uuid.uuid4().hex
+        try:
+            cache.set_many({key: new_version for key in keys}, timeout=None)
+        except Exception:
+            log.error("Failed to bump the weights versions %s", keys, exc_info=True)
+
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+def _version_keys(scorer_id: int, community_id: int) -> List[str]:
+    return [scorer_version_key(scorer_id), community_version_key(community_id)]
+
+
+def _join_versions(keys: List[str], versions: dict) -> Optional[str]:
+    if not all(versions.get(key) for key in keys):
+        return None
+    return ":".join(versions[key] for key in keys)
+
+
+def _get_version(scorer_id: int, community_id: int) -> Optional[str]:
+    """
+    Return the current version of the weights of the scorer & community. Missing
+    version keys are initialized, so that a flushed cache can never bring back a
+    version that has been used before.
+    """
+    keys = _version_keys(scorer_id, community_id)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if not versions.get(key)]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    return _join_versions(keys, versions)
+
+
+async def _aget_version(scorer_id: int, community_id: int) -> Optional[str]:
+    keys = _version_keys(scorer_id, community_id)
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if not versions.get(key)]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        versions.update(await cache.aget_many(missing))
+    return _join_versions(keys, versions)
+
+
+def _allow_list_weights_query(community_id: int):
+    return AllowList.objects.filter(customization__scorer_id=community_id).values_list(
+        "address_list__name", "weight"
+    )
+
+
+def _build_weight_table(version: Optional[str], scorer, allow_lists) -> WeightTable:
+    weights = dict(scorer.weights or {})
+    for address_list_name, weight in allow_lists:
+        weights[f"AllowList#{address_list_name}"] = str(weight)
+    return WeightTable(version, weights, CompiledWeights.compile(weights))
+
+
+def get_weight_table(scorer, community_id: int) -> WeightTable:
+    """
+    Return the weights for scoring the community with the given scorer, loading
+    them from the DB only if the cached version is outdated.
+
+    The `version` of the returned table is None if it could not be determined,
+    in which case the table is not cached.
+    """
+    version = None
+    if scorer.pk is not None:
+        try:
+            version = _get_version(scorer.pk, community_id)
+        except Exception:
+            log.error("Failed to read the weights version", exc_info=True)
+
+    if version is not None:
+        table = weight_tables.get((scorer.pk, community_id))
+        if table is not None and table.version == version:
+            return table
+
+    table = _build_weight_table(
+        version, scorer, _allow_list_weights_query(community_id)
+    )
+    if version is not None:
+        weight_tables.put((scorer.pk, community_id), table)
+    return table
+
+
+async def aget_weight_table(scorer, community_id: int) -> WeightTable:
+    """
+    Return the weights for scoring the community with the given scorer, loading
+    them from the DB only if the cached version is outdated.
+
+    The `version` of the returned table is None if it could not be determined,
+    in which case the table is not cached.
+    """
+    version = None
+    if scorer.pk is not None:
+        try:
+            version = await _aget_version(scorer.pk, community_id)
+        except Exception:
+            log.error("Failed to read the weights version", exc_info=True)
+
+    if version is not None:
+        table = weight_tables.get((scorer.pk, community_id))
+        if table is not None and table.version == version:
+            return table
+
+    allow_lists = [row async for row in _allow_list_weights_query(community_id)]
+    table = _build_weight_table(version, scorer, allow_lists)
+    if version is not None:
+        weight_tables.put((scorer.pk, community_id), table)
+    return table
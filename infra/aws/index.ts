@@ -1484,6 +1484,22 @@ export const coinbaseRevocationCheck = createScheduledTask({
   scorerSecretManagerArn: scorerSecret.arn,
 });
 
+export const expiringScoresRefresh = createScheduledTask({
+  name: "refresh-expiring-scores",
+  config: {
+    ...baseScorerServiceConfig,
+    securityGroup: secgrp,
+    command: ["python", "manage.py", "refresh_expiring_scores"].join(" "),
+    scheduleExpression: "cron(*/15 * ? * * *)", // Run the task every 15 min
+    alertTopic: pagerdutyTopic,
+  },
+  environment: apiEnvironment,
+  secrets: apiSecrets,
+  alarmPeriodSeconds: 3600, // 1h max period
+  enableInvocationAlerts: true,
+  scorerSecretManagerArn: scorerSecret.arn,
+});
+
 const exportVals = createScoreExportBucketAndDomain(
   publicDataDomain,
   publicDataDomain,